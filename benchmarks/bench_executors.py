@@ -0,0 +1,53 @@
+"""
+Compares the executors of `pype.buffered` on a CPU bound pipeline.
+
+    PYTHONPATH=. python benchmarks/bench_executors.py [items] [stages]
+
+Every stage runs `stages.crunch` with the executor being measured,
+the pipeline is run once per executor and the throughput is printed.
+Executors that aren't available on this Python fall back to threads,
+which is shown in the last column.
+"""
+import sys
+import time
+
+import pype
+from pype import executors
+
+import stages
+
+
+def run(executor, items, stage_count):
+    pipes = [stages.numbers]
+    buffered_stages = []
+    for _ in range(stage_count):
+        stage = pype.buffered(8, 64, executor=executor)(stages.crunch)
+        buffered_stages.append(stage)
+        pipes.append(stage)
+
+    start = time.perf_counter()
+    last = None
+    for index, pipe in enumerate(pipes):
+        last = pipe(last, count=items) if index == 0 else pipe(last)
+    produced = sum(1 for _ in last)
+    seconds = time.perf_counter() - start
+
+    fallbacks = sum(stage.metrics.get("thread_fallbacks") for stage in buffered_stages)
+    return produced, seconds, fallbacks
+
+
+def main(argv):
+    items = int(argv[1]) if len(argv) > 1 else 2000
+    stage_count = int(argv[2]) if len(argv) > 2 else 4
+
+    print("{:<12s} {:>10s} {:>14s} {:>10s}".format(
+        "executor", "seconds", "items/sec", "fallbacks"))
+
+    for executor in sorted(executors.executors):
+        produced, seconds, fallbacks = run(executor, items, stage_count)
+        print("{:<12s} {:>10.3f} {:>14.1f} {:>10d}".format(
+            executor, seconds, produced / seconds, fallbacks))
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -0,0 +1,20 @@
+"""
+Pipes used by the benchmarks, kept in their own module so executors
+that run them in another interpreter can import them by name.
+"""
+
+
+def numbers(pipe, count=2000):
+    for n in range(count):
+        yield n
+
+
+def crunch(pipe, rounds=2000):
+    """
+    CPU bound work per item.
+    """
+    for n in pipe:
+        total = n
+        for i in range(rounds):
+            total = (total * 31 + i) % 1000003
+        yield total
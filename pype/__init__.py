@@ -1,13 +1,50 @@
-from __future__ import absolute_import
-
-from .base import ConfigurationError, PipeError, Generic
-from .engine import pipeline
-from .core import output, input, config, state, io
-from .util import buffered
+from .base import ConfigurationError, PipeError, ItemTimeout, Generic
+from .engine import pipeline, Pipeline
+from .core import output, input, config, state, io, deterministic, per_item, \
+                  codec, map, filter, flat_map
 
 
 generic = Generic()
 
-__all__ = ['pipeline', 'output', 'input', 'config', 'buffered',
-           'generic', 'state', 'io', 'ConfigurationError',
-           'PipeError']
\ No newline at end of file
+# `map` and `filter` are left out, a star import would shadow the builtins.
+__all__ = ['pipeline', 'Pipeline', 'output', 'input', 'config', 'buffered',
+           'generic', 'state', 'io', 'deterministic', 'per_item', 'codec',
+           'flat_map', 'rate_limit', 'sort', 'group_by',
+           'dedup', 'parallel',
+           'ConfigurationError', 'PipeError', 'ItemTimeout']
+
+
+# Attributes that are only imported on first access, these pull in
+# modules (threading, queue, ...) that short-lived programs building
+# a small pipeline should not have to pay for.
+_lazy_attributes = {
+    'buffered': 'util',
+    'rate_limit': 'ratelimit',
+    'sort': 'external',
+    'group_by': 'external',
+    'dedup': 'distinct',
+    'parallel': 'sources',
+}
+
+
+def __getattr__(name):
+    import importlib
+
+    try:
+        module = _lazy_attributes[name]
+    except KeyError:
+        pass
+    else:
+        value = getattr(importlib.import_module('.' + module, __name__), name)
+        globals()[name] = value
+        return value
+
+    # Submodules such as `pype.incremental` can be reached as attributes.
+    if not name.startswith('_'):
+        try:
+            return importlib.import_module('.' + name, __name__)
+        except ModuleNotFoundError as err:
+            if err.name != '.'.join((__name__, name)):
+                raise
+
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
@@ -0,0 +1,298 @@
+"""
+Automatic placement of buffering.
+
+`tune` runs a pipeline on a sample of its input, measures how much
+time every pipe takes per item and how much of that is spent waiting
+(on I/O, locks, sleeping) instead of computing, and recommends which
+pipes to run `buffered`, with which executor and sizes:
+
+    tuning = autotune.tune(source, parse, enrich, sample=10000, config=config)
+    print(tuning.explain())
+
+    config = tuning.save(config)
+    with open("pipeline.json", "w") as f:
+        json.dump(config, f)
+
+The tuning is stored in the configuration under "pype.tuning", and
+`pype.pipeline`, which takes the configuration as keyword arguments,
+applies a tuning found in it:
+
+    for item in pype.pipeline(source, parse, enrich, **config):
+        ...
+
+Pipes that mostly wait are buffered on a thread, pipes that mostly
+compute and handle items independently (`per_item`) are buffered on a
+process so they run in parallel with the rest. Chunk sizes are picked
+so a chunk takes about `chunk_time` seconds of the pipe producing it.
+If the source is splittable (see `pype.sources`) an executor and a
+number of workers for `sources.parallel` are recommended as well.
+"""
+import itertools
+import os
+
+from . import base
+from . import core
+from . import engine
+
+
+# The configuration key a tuning is stored under.
+CONFIG_KEY = "pype.tuning"
+
+# The most workers recommended for `sources.parallel`.
+MAX_WORKERS = 64
+
+
+class Tuning(object):
+    """
+    Recommended buffering of a pipeline.
+
+    `stages`: Dictionary of pipe name to a dictionary with the
+              "buffersize", "chunksize" and "executor" to buffer it with.
+    `workers`: Recommended workers for `sources.parallel`, or None.
+    `executor`: Recommended executor for `sources.parallel`, or None.
+    `measurements`: Dictionary of pipe name to a dictionary with the
+                    measured "items", "cost" per item in seconds and the
+                    "waiting" fraction of it.
+    """
+    def __init__(self, stages=None, workers=None, measurements=None, executor=None):
+        super(Tuning, self).__init__()
+
+        self.stages = stages or {}
+        self.workers = workers
+        self.measurements = measurements or {}
+        self.executor = executor
+
+    def to_dict(self):
+        return {
+            "stages": self.stages,
+            "workers": self.workers,
+            "executor": self.executor,
+            "measurements": self.measurements,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data.get("stages"), data.get("workers"), data.get("measurements"),
+                   data.get("executor"))
+
+    def save(self, config):
+        """
+        Returns a copy of `config` with this tuning stored in it.
+        """
+        config = dict(config)
+        config[CONFIG_KEY] = self.to_dict()
+        return config
+
+    @classmethod
+    def load(cls, config):
+        """
+        Returns the tuning stored in `config`, or None if there is none.
+        """
+        data = config.get(CONFIG_KEY)
+        if data is None:
+            return None
+        return cls.from_dict(data)
+
+    def explain(self):
+        """
+        Returns a human readable description of the measurements and
+        recommendations.
+        """
+        lines = ["{:<24s} {:>10s} {:>12s} {:>8s}  {:s}".format(
+            "pipe", "items", "cost/item", "waiting", "recommendation")]
+
+        for name, measured in self.measurements.items():
+            recommended = self.stages.get(name)
+            if recommended is None:
+                advice = "-"
+            else:
+                advice = "buffered({buffersize:d}, {chunksize:d}, executor={executor!r})".format(
+                    **recommended)
+
+            lines.append("{:<24s} {:>10d} {:>12.3g} {:>7.0%}  {:s}".format(
+                name, measured["items"], measured["cost"], measured["waiting"], advice))
+
+        if self.workers is not None:
+            lines.append("")
+            lines.append("parallel workers for the source: {:d} on {:s}".format(
+                self.workers, self.executor))
+
+        return "\n".join(lines)
+
+    def __repr__(self):
+        return "Tuning(stages={!r}, workers={!r})".format(self.stages, self.workers)
+
+
+def measure(pipes, config, sample=None):
+    """
+    Runs the pipeline of `pipes` on at most `sample` items of the first
+    pipe and returns a dictionary of pipe name to a dictionary with the
+    amount of "items" it received, the "cost" per item in seconds and
+    the "waiting" fraction of the cost.
+    """
+    stages = engine.resolve_pipeline(pipes)
+
+    meters = []
+    last = None
+    for stage in stages:
+        last = engine.call_pipe(stage, last, config)
+
+        if stage is pipes[0] and sample is not None:
+            last = itertools.islice(last, sample)
+
+        meter = [0, 0.0, 0.0]
+        last = metered(last, meter)
+        meters.append((stage, meter))
+
+    core.consume(last)
+
+    measured = {}
+    received = None
+    previous_wall, previous_cpu = 0.0, 0.0
+    for stage, (items, wall, cpu) in meters:
+        own_wall = max(wall - previous_wall, 0.0)
+        own_cpu = min(max(cpu - previous_cpu, 0.0), own_wall)
+
+        if stage in pipes:
+            count = items if received is None else received
+            measured[stage.__name__] = {
+                "items": count,
+                "cost": own_wall / count if count else 0.0,
+                "waiting": 1.0 - own_cpu / own_wall if own_wall else 0.0,
+            }
+
+        received = items
+        previous_wall, previous_cpu = wall, cpu
+
+    return measured
+
+
+def metered(iterator, meter):
+    """
+    Passes through `iterator` while adding the amount of items, wall
+    time and thread CPU time spent waiting on it to `meter`.
+    """
+    import time
+
+    wall, cpu = time.perf_counter, time.thread_time
+    next_item = iter(iterator).__next__
+
+    while True:
+        start_wall, start_cpu = wall(), cpu()
+        try:
+            item = next_item()
+        except StopIteration:
+            return
+        finally:
+            meter[1] += wall() - start_wall
+            meter[2] += cpu() - start_cpu
+
+        meter[0] += 1
+        yield item
+
+
+def tune(*pipes, sample=10000, share=0.1, waiting=0.5, chunk_time=0.001,
+         buffersize=8, config=None):
+    """
+    Measures the pipeline of `pipes` configured with the dictionary
+    `config` (see `pype.config`) on `sample` items of the first pipe,
+    and returns a recommended `Tuning`.
+
+    :param share: Pipes taking less than this fraction of the total
+                  time are left alone.
+    :param waiting: Pipes waiting at least this fraction of their time
+                    are buffered on a thread, others on a process.
+    :param chunk_time: Seconds of work a chunk should take to produce.
+    :param buffersize: Chunks buffered per buffered pipe.
+    """
+    measured = measure(pipes, dict(config or {}), sample)
+    total = sum(stage["cost"] * stage["items"] for stage in measured.values())
+
+    stages = {}
+    for index, pipe in enumerate(pipes):
+        stage = measured[pipe.__name__]
+        spent = stage["cost"] * stage["items"]
+
+        if pipe.buffered or not total or spent / total < share:
+            continue
+
+        if stage["waiting"] >= waiting:
+            executor = "thread"
+        elif pipe.per_item and index > 0:
+            executor = "process"
+        else:
+            # Computing on a thread only helps if the pipe waits.
+            continue
+
+        chunksize = int(chunk_time / stage["cost"]) if stage["cost"] else 4096
+        stages[pipe.__name__] = {
+            "buffersize": buffersize,
+            "chunksize": min(max(chunksize, 1), 4096),
+            "executor": executor,
+        }
+
+    workers = parallel_executor = None
+    if getattr(pipes[0], "splits", None) is not None and total:
+        splits = len(pipes[0].splits(MAX_WORKERS))
+        parallel_executor, workers = parallel_workers(measured, total, waiting, splits)
+
+    return Tuning(stages, workers, measured, parallel_executor)
+
+
+def parallel_workers(measured, total, waiting, splits=MAX_WORKERS):
+    """
+    Returns the executor and amount of workers to recommend for
+    `sources.parallel`, every split runs all pipes and there are no
+    more workers than `splits`.
+
+    Workers on threads share a core, so there are as many as it takes
+    to fill the time spent waiting with computing. Workers on processes
+    are recommended when the pipes mostly compute, one for every core.
+    """
+    computing = sum(stage["cost"] * stage["items"] * (1.0 - stage["waiting"])
+                    for stage in measured.values())
+    limit = max(min(splits, MAX_WORKERS), 1)
+
+    if 1.0 - computing / total >= waiting:
+        workers = int(round(total / computing)) if computing else limit
+        return "thread", min(max(workers, 1), limit)
+    return "process", min(os.cpu_count() or 1, limit)
+
+
+def apply(pipes, tuning):
+    """
+    Returns `pipes` with the buffering of `tuning` applied, pipes are
+    matched by name.
+    """
+    applied = []
+    for pipe in pipes:
+        engine.initialize_pipe_variables(pipe)
+        recommended = tuning.stages.get(pipe.__name__)
+
+        if recommended is None or pipe.buffered:
+            applied.append(pipe)
+        else:
+            applied.append(buffer_pipe(pipe, **recommended))
+
+    return applied
+
+
+def buffer_pipe(pipe, buffersize, chunksize, executor):
+    """
+    Returns `pipe` wrapped in `buffered`, keeping it configurable if
+    it is a `config` pipe.
+    """
+    from . import util
+
+    buffering = util.buffered(buffersize, chunksize, executor=executor)
+
+    if not isinstance(pipe, core.config):
+        return buffering(pipe)
+
+    copy = pipe.copy()
+    copy.function = buffering(pipe.function)
+    base.copy_pipe_variables(copy.function, copy)
+    for attribute in ("buffersize", "chunksize", "executor", "overload"):
+        setattr(copy, attribute, getattr(copy.function, attribute))
+    copy.__name__ = pipe.__name__
+    return copy
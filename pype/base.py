@@ -43,6 +43,14 @@ class PipeError(Error):
     pass
 
 
+class ItemTimeout(Error):
+    """
+    Exception raised when a pipe took longer than the timeout of its
+    error policy on a single item.
+    """
+    pass
+
+
 # All the attributes (and their defaults) used by `pype` on functions.
 default_pipe_variables = {
     'output_name': Default(),
@@ -51,6 +59,12 @@ default_pipe_variables = {
     'input_type' : None,
     'pass_state' : False,
     'buffered'   : False,
+    'deterministic': False,
+    'per_item'   : False,
+    'codec'      : None,
+    'metrics'    : None,
+    'annotations': None,
+    'verify_input': None,
 }
 
 
@@ -1,12 +1,9 @@
-from __future__ import absolute_import
+import builtins
+import itertools
 
 from . import base
 from . import util
 
-import functools
-import collections
-import inspect
-
 
 def io(name, type=None):
     """
@@ -59,15 +56,134 @@ def state(function):
     this piece of data.
     """
     function.pass_state = True
+    if hasattr(function, "item_arguments"):
+        # Made by `map` and friends, the function now gets the state too.
+        function.item_arguments = 2
+    return function
+
+
+def deterministic(function):
+    """
+    Specifies that the decorated generator always produces the
+    same output for the same input, and has no side effects that
+    matter to the rest of the pipeline.
+
+    Together with `per_item` this allows the output of the pipe
+    to be cached, see `pype.incremental`.
+    """
+    function.deterministic = True
     return function
 
 
+def per_item(function):
+    """
+    Specifies that the decorated generator handles each item of
+    `pipe` independently of the items before and after it.
+
+    This means the pipe can be called with any subset of its
+    input and will produce the matching subset of its output.
+    """
+    function.per_item = True
+    return function
+
+
+def codec(codec):
+    """
+    Specifies the codec used to move the output of the decorated
+    generator between processes, see `pype.transport`.
+
+    The codec is checked against the pipe at pipeline creation.
+    """
+    def codec_decorator(function):
+        function.codec = codec
+        return function
+    return codec_decorator
+
+
+def map(function):
+    """
+    Turns a function of a single item into a pipe, the output is the
+    result of `function(item)` for each item.
+
+    With `state` the function is called as `function(state, item)`
+    and returns a (state, result) tuple.
+
+    Items are passed through `builtins.map` instead of a generator,
+    which avoids resuming a generator frame for every item. Any
+    further arguments of `function` can be set with `config`.
+    """
+    def map(pipe, **options):
+        call = _bind_options(function, options)
+        if map.pass_state:
+            return itertools.starmap(call, pipe)
+        return builtins.map(call, pipe)
+    return _item_pipe(function, map)
+
+
+def filter(function):
+    """
+    Turns a predicate of a single item into a pipe, the output is
+    every item for which `function(item)` is true.
+
+    With `state` the function is called as `function(state, item)`
+    and the (state, item) tuple is passed on.
+    """
+    def filter(pipe, **options):
+        call = _bind_options(function, options)
+        if filter.pass_state:
+            return builtins.filter(lambda stated: call(*stated), pipe)
+        return builtins.filter(call, pipe)
+    return _item_pipe(function, filter)
+
+
+def flat_map(function):
+    """
+    Turns a function of a single item into a pipe, the output is
+    every element of the iterable returned by `function(item)`.
+
+    With `state` the function is called as `function(state, item)`
+    and returns an iterable of (state, result) tuples.
+    """
+    def flat_map(pipe, **options):
+        call = _bind_options(function, options)
+        if flat_map.pass_state:
+            return itertools.chain.from_iterable(itertools.starmap(call, pipe))
+        return itertools.chain.from_iterable(builtins.map(call, pipe))
+    return _item_pipe(function, flat_map)
+
+
+def _bind_options(function, options):
+    if not options:
+        return function
+
+    import functools
+    return functools.partial(function, **options)
+
+
+def _item_pipe(function, pipe):
+    """
+    Sets up `pipe` as the pipe made from the per item `function`.
+    """
+    import functools
+
+    functools.update_wrapper(pipe, function)
+    base.copy_pipe_variables(function, pipe)
+    pipe.per_item = True
+    # `config` reads the arguments of `function`, the first of which
+    # is the item, or the state and the item.
+    pipe.redirected_configuration = function
+    pipe.item_arguments = 2 if pipe.pass_state else 1
+    return pipe
+
+
 def consume(generator):
     """
     Consumes a generator fully. Returns no result.
 
     Any exceptions are propagated.
     """
+    import collections
+
     d = collections.deque(maxlen=0)
     d.extend(generator)
 
@@ -95,6 +211,10 @@ class State(dict):
         c.update(kwargs)
         return type(self)(c)
 
+    def __reduce__(self):
+        # The default dict pickling sets items after creation.
+        return type(self), (dict(self),)
+
     def raise_type_error(self, *args, **kwargs):
         raise TypeError("State object can't be mutated")
 
@@ -165,8 +285,20 @@ class config(object):
                               value associated with them.
 
         `without`: An iterator of argument names to skip over and not export as configurable.
+
+        `resources`: A dictionary of argument names to `pype.resources.resource`
+                     declarations. Arguments without a configured value get a pool
+                     of the resource, shared by all pipelines in the same
+                     `pype.resources.Scope`.
+
+    Functions that only build a pipeline take the configuration as keyword
+    arguments: `pype.pipeline`, `pype.push.pipeline` and `Plan.pipeline` of
+    `pype.planner`. Functions that have options of their own take it as a
+    `config` dictionary instead, so configuration keys never collide with
+    their options: `Scheduler.submit`, `sources.parallel` and `autotune.tune`.
     """
-    def __init__(self, name=None, redirect=None, only_with_defaults=False, without=None):
+    def __init__(self, name=None, redirect=None, only_with_defaults=False, without=None,
+                 resources=None):
         super(config, self).__init__()
 
         if callable(name):
@@ -176,6 +308,7 @@ class config(object):
         self.redirect = redirect
         self.only_with_defaults = only_with_defaults
         self.without  = without
+        self.resources = resources or {}
 
         self.function = None
         self.config   = {}
@@ -194,6 +327,7 @@ class config(object):
                       redirect=self.redirect,
             only_with_defaults=self.only_with_defaults,
                        without=self.without,
+                     resources=self.resources,
         )
         c.function           = self.function
         c.config             = self.config.copy()
@@ -215,13 +349,17 @@ class config(object):
         # Keep function we wrapped around.
         self.function = function
 
+        import functools
+
         # Copy any settings that were already set before we got here.
         functools.update_wrapper(self, function)
         base.copy_pipe_variables(function, self)
 
         # Original configuration redirect, the redirect is recursive
-        # so we keep this around as original
-        function.redirected_configuration = self.redirect
+        # so we keep this around as original. Pipes made by `map` and
+        # friends already redirect to the function they were made of.
+        if self.redirect or not getattr(function, "redirected_configuration", None):
+            function.redirected_configuration = self.redirect
 
         to_read_config = function
 
@@ -232,8 +370,9 @@ class config(object):
         possible_arguments = self._extract_arguments(to_read_config)
 
         if not self.redirect:
-            # Remove the first argument since it `should` be the previous pipe always
-            possible_arguments = possible_arguments[1:]
+            # Remove the first argument since it `should` be the previous pipe always,
+            # pipes made by `map` and friends tell how many item arguments there are.
+            possible_arguments = possible_arguments[getattr(function, "item_arguments", 1):]
 
         if self.only_with_defaults:
             # Remove any arguments that don't have a default value
@@ -265,6 +404,24 @@ class config(object):
         # Now call our wrapped function
         return self.function(pipe, **options)
 
+    def bind(self, config):
+        """
+        Resolves the arguments of the wrapped function from `config`
+        once, and returns a function that only takes the `pipe`
+        argument.
+        """
+        config = dict(config)
+        config.update(self.config)
+
+        options = self.get_arguments(config)
+        function = self.function
+
+        def bound(pipe):
+            return function(pipe, **options)
+
+        bound.__name__ = getattr(self, "__name__", "bound")
+        return bound
+
     @staticmethod
     def _clean(name):
         """
@@ -289,7 +446,9 @@ class config(object):
         This function currently ignores *args and **kwargs type
         arguments.
         """
-        argspec = inspect.getargspec(function)
+        import inspect
+
+        argspec = inspect.getfullargspec(function)
 
         options = []
 
@@ -325,6 +484,11 @@ class config(object):
         for name, default in self.possible_arguments:
             if name in config:
                 arguments[self._clean(name)] = config[name]
+            elif self._clean(name) in self.resources:
+                from . import resources
+
+                resource = self.resources[self._clean(name)]
+                arguments[self._clean(name)] = resources.current().get(resource)
             elif default is not NoDefaultValue:
                 arguments[self._clean(name)] = default
             else:
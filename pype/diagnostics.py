@@ -0,0 +1,287 @@
+"""
+Memory diagnostics of pipelines.
+
+`MemoryProfiler` runs a pipeline to completion while tracing memory
+allocations with `tracemalloc`, and reports per stage how much memory
+is allocated per item and how much memory allocated by the stage is
+still alive as more items pass through. Stages whose retained memory
+keeps growing with the amount of items are flagged as leaking.
+
+    report = diagnostics.MemoryProfiler(interval=1000).run(source, parse)
+    with open("memory.json", "w") as f:
+        f.write(report.to_json())
+
+Reports of different runs, such as of two releases, can be compared
+with `compare`.
+
+Tracing memory slows a pipeline down considerably, this is meant for
+diagnosing a pipeline and not for production use.
+"""
+import dis
+import gc
+import json
+import tracemalloc
+
+from . import core
+from . import engine
+
+
+class MemoryProfiler(object):
+    """
+    Profiles memory use of a pipeline per stage.
+
+    `interval`: Amount of items between snapshots.
+    `frames`: Amount of frames traced per allocation, allocations are
+              attributed to a stage if any of these frames is in it.
+    `leak_threshold`: Growth in retained bytes per item above which a
+                      stage is flagged.
+    """
+    def __init__(self, interval=1000, frames=16, leak_threshold=8.0):
+        super(MemoryProfiler, self).__init__()
+
+        self.interval = interval
+        self.frames = frames
+        self.leak_threshold = leak_threshold
+
+    def run(self, *pipes, **config):
+        """
+        Runs the pipeline of `pipes` with `config` to completion and
+        returns a `MemoryReport`.
+        """
+        stages = engine.resolve_pipeline(pipes)
+
+        started = not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start(self.frames)
+
+        try:
+            return self._run(pipes, stages, config)
+        finally:
+            if started:
+                tracemalloc.stop()
+
+    def _run(self, pipes, stages, config):
+        probes = []
+        last = None
+        for stage in stages:
+            last = engine.call_pipe(stage, last, config)
+
+            probe = Probe(stage, stage not in pipes)
+            last = probe.wrap(last)
+            probes.append(probe)
+
+        items = 0
+        state_objects = []
+        for _ in last:
+            items += 1
+
+            if items % self.interval == 0:
+                self._sample(items, probes, state_objects)
+
+        self._sample(items, probes, state_objects)
+
+        return MemoryReport(items, probes, state_objects, self.leak_threshold)
+
+    def _sample(self, items, probes, state_objects):
+        snapshot = tracemalloc.take_snapshot()
+
+        ranges = {}
+        for probe in probes:
+            if probe.code is not None:
+                filename, first, last = probe.code
+                ranges.setdefault(filename, []).append((first, last, probe))
+
+        retained = {probe: 0 for probe in probes}
+        for statistic in snapshot.statistics("traceback"):
+            probe = allocated_by(statistic.traceback, ranges)
+            if probe is not None:
+                retained[probe] += statistic.size
+
+        for probe in probes:
+            queued = None
+            if getattr(probe.stage, "buffered", False) and probe.stage.metrics is not None:
+                queued = probe.stage.metrics.get("queued", None)
+
+            probe.samples.append((items, retained[probe], queued))
+
+        live = sum(1 for obj in gc.get_objects() if isinstance(obj, core.State))
+        state_objects.append((items, live))
+
+
+class Probe(object):
+    """
+    Wraps the output of a single stage to measure allocations made
+    while the stage produces items.
+    """
+    def __init__(self, stage, inserted):
+        super(Probe, self).__init__()
+
+        self.stage = stage
+        self.name = stage.__name__
+        self.inserted = inserted
+        self.items = 0
+        # Net allocated bytes while waiting on this stage, this includes
+        # the stages before it.
+        self.allocated = 0
+        # (items, retained bytes, queued chunks) at each snapshot.
+        self.samples = []
+
+        self.code = code_range(stage)
+
+    def wrap(self, iterator):
+        get_traced_memory = tracemalloc.get_traced_memory
+        next_item = iter(iterator).__next__
+
+        while True:
+            before = get_traced_memory()[0]
+            try:
+                item = next_item()
+            except StopIteration:
+                return
+            finally:
+                self.allocated += get_traced_memory()[0] - before
+
+            self.items += 1
+            yield item
+
+
+def allocated_by(traceback, ranges):
+    """
+    Returns the probe of the innermost stage in `traceback`, `ranges`
+    maps filenames to a list of (first line, last line, probe).
+
+    Returns None if no stage is in the traceback.
+    """
+    # Stages call the stages before them, so the most recent frame
+    # that is part of a stage is the one that allocated.
+    for frame in reversed(traceback):
+        for first, last, probe in ranges.get(frame.filename, ()):
+            if first <= frame.lineno <= last:
+                return probe
+    return None
+
+
+def code_range(stage):
+    """
+    Returns a tuple of (filename, first line, last line) of the code
+    of `stage`, or None if it has no code.
+    """
+    function = getattr(stage, "function", stage)
+    while hasattr(function, "__wrapped__"):
+        function = function.__wrapped__
+
+    code = getattr(function, "__code__", None)
+    if code is None:
+        return None
+
+    lines = [line for _, line in dis.findlinestarts(code) if line is not None]
+    return code.co_filename, code.co_firstlineno, max(lines or [code.co_firstlineno])
+
+
+def growth(samples):
+    """
+    Returns the least squares slope of retained bytes per item over
+    `samples`.
+    """
+    points = [(items, retained) for items, retained, _ in samples]
+    if len(points) < 2:
+        return 0.0
+
+    mean_x = sum(x for x, _ in points) / len(points)
+    mean_y = sum(y for _, y in points) / len(points)
+
+    variance = sum((x - mean_x) ** 2 for x, _ in points)
+    if not variance:
+        return 0.0
+
+    return sum((x - mean_x) * (y - mean_y) for x, y in points) / variance
+
+
+class MemoryReport(object):
+    """
+    The result of `MemoryProfiler.run`.
+
+    `items`: Amount of items the pipeline produced.
+    `stages`: A list with a dictionary for every stage.
+    `state_objects`: (items, live State objects) at each snapshot.
+    """
+    def __init__(self, items, probes, state_objects, leak_threshold):
+        super(MemoryReport, self).__init__()
+
+        self.items = items
+        self.state_objects = state_objects
+        self.stages = []
+
+        previous_allocated = 0
+        for index, probe in enumerate(probes):
+            allocated = probe.allocated - previous_allocated
+            previous_allocated = probe.allocated
+
+            slope = growth(probe.samples)
+
+            self.stages.append({
+                "index": index,
+                "name": probe.name,
+                "inserted": probe.inserted,
+                "items": probe.items,
+                "allocated_per_item": allocated / probe.items if probe.items else 0.0,
+                "retained": probe.samples[-1][1] if probe.samples else 0,
+                "growth_per_item": slope,
+                "leaking": slope > leak_threshold,
+                "samples": [list(sample) for sample in probe.samples],
+            })
+
+    @property
+    def leaking(self):
+        """
+        Names of the stages flagged as leaking.
+        """
+        return [stage["name"] for stage in self.stages if stage["leaking"]]
+
+    def to_dict(self):
+        return {
+            "items": self.items,
+            "stages": self.stages,
+            "state_objects": [list(sample) for sample in self.state_objects],
+        }
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), indent=2, sort_keys=True)
+
+    @classmethod
+    def from_json(cls, data):
+        """
+        Loads a report saved with `to_json`.
+        """
+        data = json.loads(data)
+
+        report = cls.__new__(cls)
+        report.items = data["items"]
+        report.stages = data["stages"]
+        report.state_objects = [tuple(sample) for sample in data["state_objects"]]
+        return report
+
+
+def compare(old, new):
+    """
+    Compares two `MemoryReport`s of the same pipeline. Returns a list
+    with a dictionary for each stage present in both, holding the
+    change in allocated bytes per item, retained bytes and growth.
+    """
+    old_stages = {(stage["index"], stage["name"]): stage for stage in old.stages}
+
+    differences = []
+    for stage in new.stages:
+        previous = old_stages.get((stage["index"], stage["name"]))
+        if previous is None:
+            continue
+
+        differences.append({
+            "index": stage["index"],
+            "name": stage["name"],
+            "allocated_per_item": stage["allocated_per_item"] - previous["allocated_per_item"],
+            "retained": stage["retained"] - previous["retained"],
+            "growth_per_item": stage["growth_per_item"] - previous["growth_per_item"],
+        })
+
+    return differences
@@ -0,0 +1,301 @@
+"""
+Deduplication and distinct counting with bounded memory.
+
+Keys are hashed to 64 bit digests of their pickled form, see
+`hash64`, stored in `array`s or `bytearray`s:
+
+`dedup` drops items whose key is among the last `window` distinct keys
+it let through, or let through within the last `ttl` seconds. Only the
+hashes are kept, a new key is wrongly dropped when its hash collides
+with one of the kept hashes, which happens at a rate of about
+`window` / 2 ** 64 per item.
+
+`bloom_dedup` drops items whose key is probably seen before using a
+Bloom filter sized for `capacity` keys at `error_rate` false
+positives, new items are wrongly dropped at about that rate.
+
+`count_distinct` passes items through while estimating the amount of
+distinct keys with HyperLogLog, the estimate is the "distinct" gauge
+in the `metrics` of the pipe.
+
+Keys should be values that pickle the same when equal, such as
+strings, bytes, integers and tuples of those.
+"""
+import array
+
+from . import metrics
+from .base import Generic
+from .util import key_hash as hash64
+
+
+MASK = 0xFFFFFFFFFFFFFFFF
+
+
+class HashWindow(object):
+    """
+    A set of the hashes of the last `size` keys added, optionally also
+    forgetting hashes older than `ttl` seconds.
+
+    Hashes are kept in a ring buffer, an `array` of 64 bit integers,
+    and found through an open addressing table of positions in the
+    ring.
+    """
+    def __init__(self, size, ttl=None):
+        super(HashWindow, self).__init__()
+
+        capacity = 1
+        while capacity < size * 2:
+            capacity *= 2
+
+        self.size = size
+        self.ttl = ttl
+        self.mask = capacity - 1
+        # Ring position plus one, zero marks empty slots.
+        self.table = array.array('I', bytes(4 * capacity))
+        self.ring = array.array('Q', bytes(8 * size))
+        self.times = array.array('d', bytes(8 * size)) if ttl is not None else None
+        self.start = 0
+        self.count = 0
+
+    def add(self, h):
+        """
+        Adds hash `h`, returns True if it was already present.
+        """
+        if self.ttl is not None:
+            import time
+            now = time.monotonic()
+            self._expire(now - self.ttl)
+
+        table, mask, ring = self.table, self.mask, self.ring
+        index = h & mask
+        while table[index]:
+            if ring[table[index] - 1] == h:
+                return True
+            index = (index + 1) & mask
+
+        if self.count == self.size:
+            self._remove_oldest()
+            # Removing shifts entries, find the free slot again.
+            index = h & mask
+            while table[index]:
+                index = (index + 1) & mask
+
+        position = (self.start + self.count) % self.size
+        table[index] = position + 1
+        ring[position] = h
+        if self.times is not None:
+            self.times[position] = now
+        self.count += 1
+        return False
+
+    def _expire(self, before):
+        times = self.times
+        while self.count and times[self.start] < before:
+            self._remove_oldest()
+
+    def _remove_oldest(self):
+        self._delete(self.start)
+        self.start = (self.start + 1) % self.size
+        self.count -= 1
+
+    def _delete(self, position):
+        table, mask, ring = self.table, self.mask, self.ring
+
+        index = ring[position] & mask
+        while table[index] != position + 1:
+            index = (index + 1) & mask
+
+        # Shift later entries of the probe sequence back into the hole.
+        following = index
+        while True:
+            following = (following + 1) & mask
+            entry = table[following]
+            if not entry:
+                break
+
+            home = ring[entry - 1] & mask
+            if index <= following:
+                stays = index < home <= following
+            else:
+                stays = home > index or home <= following
+            if stays:
+                continue
+
+            table[index] = entry
+            index = following
+
+        table[index] = 0
+
+    def __len__(self):
+        return self.count
+
+
+class BloomFilter(object):
+    """
+    A Bloom filter in a `bytearray`, sized for `capacity` hashes with a
+    false positive rate of `error_rate`.
+    """
+    def __init__(self, capacity, error_rate=0.001):
+        super(BloomFilter, self).__init__()
+
+        import math
+
+        self.bits = max(8, int(math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)))
+        self.hashes = max(1, int(round(self.bits / capacity * math.log(2))))
+        self.buffer = bytearray((self.bits + 7) // 8)
+
+    def add(self, h):
+        """
+        Adds hash `h`, returns True if it was probably already present.
+        """
+        buffer, bits = self.buffer, self.bits
+
+        # Double hashing, derives all bit positions from two halves.
+        first, second = h & 0xFFFFFFFF, (h >> 32) | 1
+
+        present = True
+        for i in range(self.hashes):
+            bit = (first + i * second) % bits
+            byte, mask = bit >> 3, 1 << (bit & 7)
+            if not buffer[byte] & mask:
+                present = False
+                buffer[byte] |= mask
+
+        return present
+
+
+class HyperLogLog(object):
+    """
+    Estimates the amount of distinct hashes added, with a standard
+    error of about 1.04 / sqrt(2 ** `precision`). Registers are kept
+    in a `bytearray` of 2 ** `precision` bytes.
+    """
+    def __init__(self, precision=14):
+        super(HyperLogLog, self).__init__()
+
+        if not 4 <= precision <= 18:
+            raise ValueError("precision must be between 4 and 18")
+
+        self.precision = precision
+        self.registers = bytearray(1 << precision)
+
+    def add(self, h):
+        precision = self.precision
+        index = h >> (64 - precision)
+        rest = (h << precision) & MASK
+        rank = 64 - rest.bit_length() + 1 if rest else 64 - precision + 1
+
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def count(self):
+        """
+        Returns the estimated amount of distinct hashes.
+        """
+        import math
+
+        registers = self.registers
+        m = len(registers)
+
+        if m >= 128:
+            alpha = 0.7213 / (1 + 1.079 / m)
+        else:
+            alpha = {16: 0.673, 32: 0.697, 64: 0.709}[m]
+
+        estimate = alpha * m * m / sum(2.0 ** -register for register in registers)
+
+        zeros = registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            # Linear counting is more accurate for small counts.
+            estimate = m * math.log(m / zeros)
+
+        return int(round(estimate))
+
+
+def key_getter(key):
+    if key is None:
+        return lambda item: item
+    return key
+
+
+def dedup(key=None, window=1000000, ttl=None):
+    """
+    Returns a pipe that drops items whose `key` is among the last
+    `window` distinct keys it let through, and was let through within
+    the last `ttl` seconds if given. `key` defaults to the item itself.
+
+    Dropped items are counted as "duplicates" in the `metrics` of
+    the pipe.
+    """
+    dedup_metrics = metrics.Metrics()
+
+    def dedup(pipe):
+        seen = HashWindow(window, ttl)
+        dedup_metrics.gauge("tracked", seen.__len__)
+        return filter_seen(pipe, lambda key: seen.add(hash64(key)),
+                           key_getter(key), dedup_metrics)
+
+    return distinct_pipe(dedup, dedup_metrics)
+
+
+def bloom_dedup(key=None, capacity=1000000, error_rate=0.001):
+    """
+    Returns a pipe that drops items whose `key` was probably seen
+    before, see `BloomFilter`. `key` defaults to the item itself.
+
+    Dropped items are counted as "duplicates" in the `metrics` of
+    the pipe.
+    """
+    dedup_metrics = metrics.Metrics()
+
+    def bloom_dedup(pipe):
+        seen = BloomFilter(capacity, error_rate)
+        return filter_seen(pipe, lambda key: seen.add(hash64(key)),
+                           key_getter(key), dedup_metrics)
+
+    return distinct_pipe(bloom_dedup, dedup_metrics)
+
+
+def filter_seen(pipe, add, get_key, dedup_metrics, flush=1024):
+    duplicates = 0
+    try:
+        for item in pipe:
+            if add(get_key(item)):
+                duplicates += 1
+                if duplicates >= flush:
+                    dedup_metrics.add("duplicates", duplicates)
+                    duplicates = 0
+                continue
+            yield item
+    finally:
+        dedup_metrics.add("duplicates", duplicates)
+
+
+def count_distinct(key=None, precision=14):
+    """
+    Returns a pipe that passes items through while estimating the
+    amount of distinct `key`s, see `HyperLogLog`. The estimate is the
+    "distinct" gauge in the `metrics` of the pipe.
+    """
+    count_metrics = metrics.Metrics()
+
+    def count_distinct(pipe):
+        counter = HyperLogLog(precision)
+        count_metrics.gauge("distinct", counter.count)
+
+        add, get_key = counter.add, key_getter(key)
+        for item in pipe:
+            add(hash64(get_key(item)))
+            yield item
+
+    count_distinct.per_item = True
+    return distinct_pipe(count_distinct, count_metrics)
+
+
+def distinct_pipe(pipe, pipe_metrics):
+    pipe.input_name = Generic()
+    pipe.input_type = Generic()
+    pipe.output_name = Generic()
+    pipe.output_type = Generic()
+    pipe.metrics = pipe_metrics
+    return pipe
@@ -1,34 +1,233 @@
-from __future__ import absolute_import
-
-import functools
-
 from . import core
-from .base import default_pipe_variables, PipeError, Generic
+from .schema import Schema
+from .base import default_pipe_variables, PipeError, Generic, Default
 
 
 def pipeline(*pipeline, **config):
-    for pipe in pipeline:
+    """
+    Creates a `Pipeline` of the pipes given, configured with `config`.
+    """
+    return Pipeline(pipeline, config)
+
+
+class Pipeline(object):
+    """
+    A connected pipeline, iterating over it gives the output of the
+    last pipe.
+
+    `pipes`: The pipes as given.
+    `stages`: The pipes that are actually called, this includes pipes
+              inserted for state handling.
+    `config`: The configuration the pipes were connected with.
+
+    With `counters` every stage counts the items it produced and the
+    time spent producing them, this adds a little overhead per item
+    for every stage. With a `tracing.Tracer` as `tracer` a sample of
+    items is followed through the pipeline to record their latency.
+
+    A tuning made by `pype.autotune` stored in `config` is applied to
+    the pipes first.
+    """
+    def __init__(self, pipes, config=None, counters=False, tracer=None):
+        super(Pipeline, self).__init__()
+
+        self.config = dict(config or {})
+
+        if "pype.tuning" in self.config:
+            from . import autotune
+            pipes = autotune.apply(pipes, autotune.Tuning.load(self.config))
+
+        self.pipes = tuple(pipes)
+        self.stages = resolve_pipeline(self.pipes)
+        self.counters = None
+        self.tracer = tracer
+        # Buffered pipes make new metrics for every call, these are
+        # replaced by the ones made for this pipeline when connecting.
+        self.stage_metrics = [getattr(stage, "metrics", None) for stage in self.stages]
+
+        if counters:
+            from . import metrics
+            self.counters = [metrics.Metrics() for _ in self.stages]
+
+        self.iterator = iter(self._connect())
+
+    def _connect(self):
+        if self.tracer is not None:
+            from . import tracing
+            return tracing.traced(self.pipes, self.stages, self._call, self.tracer,
+                                  self.counters)
+
+        if self.counters is not None:
+            from . import metrics
+
+        last = None
+        for index, stage in enumerate(self.stages):
+            last = self._call(index, stage, last)
+            if self.counters is not None:
+                last = metrics.metered(last, self.counters[index], flush=128)
+        return last
+
+    def _call(self, index, stage, previous):
+        """
+        Calls `stage` at `index` with `previous`, keeping the metrics
+        a buffered stage made for the call.
+        """
+        if not getattr(stage, "buffered", False):
+            return call_pipe(stage, previous, self.config)
+
+        from . import metrics
+
+        with metrics.collect() as created:
+            output = call_pipe(stage, previous, self.config)
+
+        if created:
+            self.stage_metrics[index] = created[0]
+        return output
+
+    def __iter__(self):
+        return self.iterator
+
+    def __next__(self):
+        return next(self.iterator)
+
+    def close(self):
+        """
+        Stops the pipeline, closing the generator of the last pipe.
+        """
+        close = getattr(self.iterator, "close", None)
+        if close is not None:
+            close()
+
+    def describe(self):
+        """
+        Returns a list with a dictionary describing each stage.
+        """
+        return [describe_stage(index, stage, stage not in self.pipes)
+                for index, stage in enumerate(self.stages)]
+
+    def snapshot(self):
+        """
+        Returns a dictionary of the stages with their current metrics
+        and counters, suitable for encoding as JSON.
+        """
+        stages = self.describe()
+        for index, description in enumerate(stages):
+            stage_metrics = self.stage_metrics[index]
+            if stage_metrics is not None:
+                description["metrics"] = stage_metrics.snapshot()
+            if self.counters is not None:
+                description["counters"] = self.counters[index].snapshot()
+
+        snapshot = {"stages": stages}
+        if self.tracer is not None:
+            snapshot["tracing"] = self.tracer.snapshot()
+        return snapshot
+
+    def __repr__(self):
+        return "Pipeline({:s})".format(" -> ".join(stage.__name__ for stage in self.stages))
+
+
+def describe_stage(index, stage, inserted):
+    """
+    Returns a dictionary describing `stage`, values are converted to
+    strings where needed to be encodable as JSON.
+    """
+    description = {
+        "index": index,
+        "name": getattr(stage, "__name__", repr(stage)),
+        "inserted": inserted,
+    }
+
+    for attribute in ("input_name", "input_type", "output_name", "output_type"):
+        description[attribute] = describe_value(getattr(stage, attribute, None))
+
+    for attribute in ("pass_state", "per_item", "deterministic"):
+        description[attribute] = bool(getattr(stage, attribute, False))
+
+    if getattr(stage, "buffered", False):
+        description["buffered"] = {
+            attribute: getattr(stage, attribute, None) for attribute in
+            ("buffersize", "chunksize", "executor", "overload")
+        }
+
+    if isinstance(stage, core.config):
+        # Only the names, values can hold credentials.
+        description["config"] = [name for name, _ in stage.possible_arguments]
+
+    return description
+
+
+def describe_value(value):
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    if isinstance(value, Generic):
+        return "generic"
+    if isinstance(value, Default):
+        return None
+    if isinstance(value, tuple):
+        return [describe_value(v) for v in value]
+    return getattr(value, "__name__", None) or str(value)
+
+
+def resolve_pipeline(pipes):
+    """
+    Prepares the pipes given for connecting. Returns the list of
+    pipes to call in order, this includes any pipes inserted for
+    state handling.
+
+    raises `PipeError` if the pipes are incompatible.
+    """
+    for pipe in pipes:
         initialize_pipe_variables(pipe)
 
-    verify_pipe_types(pipeline)
+    verify_pipe_types(pipes)
+    verify_pipe_codecs(pipes)
+
+    return initialize_pipeline_state_handling(pipes)
 
-    pipeline = initialize_pipeline_state_handling(pipeline)
 
+def connect_pipeline(pipes, config):
+    """
+    Connects already resolved `pipes` to each other, returns the
+    iterator of the last pipe.
+    """
     last = None
-    for pipe in pipeline:
-        if isinstance(pipe, core.config):
-            last = pipe(last, **config)
-        else:
-            last = pipe(last)
+    for pipe in pipes:
+        last = call_pipe(pipe, last, config)
 
     return last
 
 
+def call_pipe(pipe, previous, config):
+    """
+    Calls `pipe` with `previous` as its input, passes `config` along
+    if the pipe is configurable.
+    """
+    if isinstance(pipe, core.config):
+        return pipe(previous, **config)
+    return pipe(previous)
+
+
+def bind_pipe(pipe, config):
+    """
+    Returns a function that calls `pipe` with only the previous pipe
+    as argument, the configuration of `pipe` is resolved from `config`
+    once instead of on every call.
+    """
+    if isinstance(pipe, core.config):
+        return pipe.bind(config)
+    return pipe
+
+
 def verify_pipe_types(pipes):
     """
     Verifies that all pipes have the correct input/output type according
     to their neighbours in the pipeline.
 
+    A `Schema` input type accepts any output schema that has all of
+    its fields with compatible types. Pipes with a `verify_input`
+    function get to check the pipe before them as well.
+
     raises `PipeError` if an incompatiblity is found.
     """
     attributes_to_check = (
@@ -43,18 +242,37 @@ def verify_pipe_types(pipes):
             out_attr_value = getattr(previous_pipe, out_attr)
             in_attr_value = getattr(pipe, in_attr)
 
+            if isinstance(in_attr_value, Schema) and in_attr_value.accepts(out_attr_value):
+                continue
+
             if (out_attr_value != in_attr_value and
                     not isinstance(out_attr_value, Generic) and
                     not isinstance(in_attr_value, Generic)):
                 raise PipeError(
                     "Incompatible output/input found: "
-                    "(output: {:s} from {:s}) (input: {:s} to {:s})",
+                    "(output: {!s} from {:s}) (input: {!s} to {:s})",
                     out_attr_value, previous_pipe.__name__,
                     in_attr_value, pipe.__name__)
 
+        verify_input = getattr(pipe, "verify_input", None)
+        if verify_input is not None:
+            verify_input(previous_pipe)
+
         previous_pipe = pipe
 
 
+def verify_pipe_codecs(pipes):
+    """
+    Verifies that the codec declared on each pipe can be used for
+    the output of that pipe.
+
+    raises `PipeError` if an incompatibility is found.
+    """
+    for pipe in pipes:
+        if pipe.codec is not None:
+            pipe.codec.bind(pipe)
+
+
 def initialize_pipe_variables(pipe):
     """
     Sets all possible attributes on a pipe function to their
@@ -93,10 +311,12 @@ def initialize_pipeline_state_handling(pipes):
         # the original
         return pipes
 
+    rest = list(pipe_iter)
+
     no_state = False
     # finish the rest of the pipes normally.
-    for pipe in pipe_iter:
-        if (pipe.pass_state or pipe.buffered) and no_state:
+    for index, pipe in enumerate(rest):
+        if pipe.pass_state and no_state:
             # There is no state, but we want state.
             append(add)
             append(pipe)
@@ -105,7 +325,13 @@ def initialize_pipeline_state_handling(pipes):
 
             # Create new pair because we used the last one.
             remove, add = _create_state_pair()
-        elif not (pipe.pass_state or pipe.buffered) and not no_state:
+        elif (pipe.buffered and not pipe.pass_state and not no_state and
+                any(later.pass_state for later in rest[index + 1:])):
+            # There is state and we want it back later, but the pipe runs
+            # on its own thread, so the state has to be removed and added
+            # there or it would be attached to the wrong items.
+            append(_buffered_with_state(pipe))
+        elif not pipe.pass_state and not no_state:
             # There is state, and we don't want any.
             append(remove)
             append(pipe)
@@ -117,6 +343,35 @@ def initialize_pipeline_state_handling(pipes):
     return stated_pipes
 
 
+def _buffered_with_state(pipe):
+    """
+    Returns a copy of buffered `pipe` that removes the state from its
+    input and adds it back to its output in the buffering thread.
+    """
+    from . import util, base
+
+    if isinstance(pipe, core.config):
+        copy = pipe.copy()
+        copy.function = _buffered_with_state(pipe.function)
+        base.copy_pipe_variables(pipe, copy)
+        copy.__name__ = pipe.__name__
+        return copy
+
+    remove, add = _create_state_pair()
+    function = pipe.__wrapped__
+
+    def buffered_with_state(previous, *args, **kwargs):
+        return add(function(remove(previous), *args, **kwargs))
+
+    stated = util.buffered(pipe.buffersize, pipe.chunksize, executor=pipe.executor,
+                           overload=pipe.overload, threshold=pipe.threshold,
+                           sample_rate=pipe.sample_rate, spool_size=pipe.spool_size,
+                           spool_directory=pipe.spool_directory)(buffered_with_state)
+    base.copy_pipe_variables(pipe, stated)
+    stated.__name__ = pipe.__name__
+    return stated
+
+
 def _create_state_pair():
     """
     Creates a pair of functions that respectively remove a
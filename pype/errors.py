@@ -0,0 +1,289 @@
+"""
+Error policies for pipes.
+
+An exception raised inside a pipe ends the generator of that pipe and
+with it the whole pipeline. An error policy runs the pipe once per
+item instead, so a failing item can be retried, and when it keeps
+failing be handed to a dead letter store while the stream continues:
+
+    dead = errors.DeadLetters()
+
+    @pype.config()
+    @errors.policy(retries=3, backoff=0.1, timeout=5.0, dead_letter=dead)
+    @pype.io("url")
+    def fetch(pipe, pool):
+        ...
+
+    for state, item, error in dead:
+        ...
+
+The decorated pipe has to handle every item independently (see
+`pype.per_item`). Apply `policy` below `pype.config`, the configuration
+is read from the arguments of the decorated pipe.
+
+Retries wait in the thread running the pipe, so the stream stops while
+an item waits for its next attempt. The waits of a single item add up
+to at most `max_total_backoff` seconds, buffer the pipe on a thread to
+keep the rest of the pipeline going in the meantime.
+
+Pipes running in a process (`buffered(..., executor="process")`) need
+a dead letter store that works across processes, such as
+`DeadLetterFile`.
+
+Error counts are kept in the `metrics` of the decorated pipe as
+"errors", "retries", "timeouts" and "dead_letters".
+"""
+import pickle
+import threading
+
+from . import base
+from . import metrics
+
+
+def policy(retries=0, backoff=0.1, max_backoff=30.0, max_total_backoff=60.0,
+           retry_on=(Exception,), timeout=None, dead_letter=None):
+    """
+    Applies an error policy to the decorated pipe.
+
+    :param retries: Amount of times an item is retried after failing.
+    :param backoff: Seconds to wait before the first retry, doubled
+                    for every retry after it.
+    :param max_backoff: Maximum seconds to wait before a retry.
+    :param max_total_backoff: Maximum seconds an item waits for retries
+                              in total, an item that would wait longer
+                              fails without further retries.
+    :param retry_on: Exception classes that are retried, others fail
+                     the item directly.
+    :param timeout: Seconds a single item may take, None for no limit.
+                    Items that take longer fail with `ItemTimeout`.
+    :param dead_letter: Where failed items go, anything with an
+                        `add(state, item, error)` method. If None the
+                        error is raised as usual.
+    """
+    import functools
+
+    def policy(function):
+        stage_metrics = metrics.Metrics()
+
+        @functools.wraps(function)
+        def policy(previous, *args, **kwargs):
+            import time
+
+            if timeout is None:
+                run = run_directly
+            else:
+                run = TimedRunner(timeout, stage_metrics)
+
+            stated = policy.pass_state
+
+            try:
+                for item in previous:
+                    attempt = 0
+                    waited = 0.0
+                    while True:
+                        try:
+                            outputs = run(function, item, args, kwargs)
+                            break
+                        except Exception as error:
+                            stage_metrics.add("errors")
+
+                            delay = min(backoff * 2 ** attempt, max_backoff)
+                            if (attempt < retries and isinstance(error, retry_on) and
+                                    waited + delay <= max_total_backoff):
+                                attempt += 1
+                                waited += delay
+                                stage_metrics.add("retries")
+                                time.sleep(delay)
+                                continue
+
+                            if dead_letter is None:
+                                raise
+
+                            state, data = item if stated else (None, item)
+                            dead_letter.add(state, data, error)
+                            stage_metrics.add("dead_letters")
+
+                            outputs = ()
+                            break
+
+                    for output in outputs:
+                        yield output
+            finally:
+                if timeout is not None:
+                    run.close()
+
+        base.copy_pipe_variables(function, policy)
+        # `config` reads the arguments of `function`, not of the wrapper.
+        policy.redirected_configuration = function
+        policy.per_item = True
+        policy.metrics = stage_metrics
+        return policy
+    return policy
+
+
+def run_directly(function, item, args, kwargs):
+    """
+    Runs `function` with only `item` as input, returns a list of its
+    output.
+    """
+    return list(function(iter((item,)), *args, **kwargs))
+
+
+class TimedRunner(object):
+    """
+    Runs items on a worker thread and waits at most `timeout` seconds
+    for each. A worker stuck on an item is abandoned and replaced.
+    """
+    def __init__(self, timeout, stage_metrics):
+        super(TimedRunner, self).__init__()
+
+        self.timeout = timeout
+        self.metrics = stage_metrics
+        self.worker = None
+
+    def __call__(self, function, item, args, kwargs):
+        if self.worker is None:
+            self.worker = Worker()
+
+        result = self.worker.run(self.timeout, run_directly, function, item, args, kwargs)
+
+        if result is None:
+            self.metrics.add("timeouts")
+            self.worker.close()
+            self.worker = None
+            raise base.ItemTimeout("Item took longer than {:g} seconds", self.timeout)
+
+        outputs, error = result
+        if error is not None:
+            raise error
+        return outputs
+
+    def close(self):
+        if self.worker is not None:
+            self.worker.close()
+            self.worker = None
+
+
+class Worker(object):
+    """
+    A daemon thread that runs one call at a time.
+    """
+    def __init__(self):
+        super(Worker, self).__init__()
+
+        import queue
+
+        self.calls = queue.Queue()
+        self.results = queue.Queue()
+
+        thread = threading.Thread(target=self._work)
+        thread.daemon = True
+        thread.start()
+
+    def _work(self):
+        while True:
+            call = self.calls.get()
+            if call is None:
+                return
+
+            function, args = call
+            try:
+                self.results.put((function(*args), None))
+            except Exception as error:
+                self.results.put((None, error))
+
+    def run(self, timeout, function, *args):
+        """
+        Runs `function(*args)` on the worker, returns a tuple of
+        (result, exception) or None if it didn't finish within
+        `timeout` seconds.
+        """
+        import queue
+
+        self.calls.put((function, args))
+        try:
+            return self.results.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.calls.put(None)
+
+
+class DeadLetters(object):
+    """
+    In memory store of failed items. Iterating gives tuples of
+    (state, item, error) in the order the items failed.
+    """
+    def __init__(self):
+        super(DeadLetters, self).__init__()
+
+        self.lock = threading.Lock()
+        self.letters = []
+
+    def add(self, state, item, error):
+        with self.lock:
+            self.letters.append((state, item, error))
+
+    def items(self):
+        """
+        Returns the failed items in a form that can be passed to the
+        pipe again, (state, item) tuples for items that had state.
+        """
+        with self.lock:
+            return [item if state is None else (state, item)
+                    for state, item, _ in self.letters]
+
+    def clear(self):
+        with self.lock:
+            del self.letters[:]
+
+    def __iter__(self):
+        with self.lock:
+            return iter(list(self.letters))
+
+    def __len__(self):
+        return len(self.letters)
+
+
+class DeadLetterFile(object):
+    """
+    Store of failed items appended to the file `filename`, safe to use
+    from several processes at once. Iterating reads back tuples of
+    (state, item, error), errors are stored as their string form if
+    they can't be pickled.
+    """
+    def __init__(self, filename):
+        super(DeadLetterFile, self).__init__()
+        self.filename = filename
+
+    def add(self, state, item, error):
+        import os
+        import struct
+
+        try:
+            record = pickle.dumps((state, item, error))
+        except Exception:
+            record = pickle.dumps((state, item, repr(error)))
+
+        # A single write with O_APPEND keeps records of several
+        # processes from interleaving.
+        fd = os.open(self.filename, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, struct.pack("<I", len(record)) + record)
+        finally:
+            os.close(fd)
+
+    def __iter__(self):
+        import struct
+
+        try:
+            with open(self.filename, "rb") as f:
+                while True:
+                    header = f.read(4)
+                    if len(header) < 4:
+                        return
+                    size, = struct.unpack("<I", header)
+                    yield pickle.loads(f.read(size))
+        except FileNotFoundError:
+            return
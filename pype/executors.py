@@ -0,0 +1,733 @@
+"""
+Executors used by `pype.buffered` to run a generator away from the
+consuming side of the pipeline.
+
+Each executor is a function taking the buffered pipe, the function
+it wraps and the arguments it was called with, and returning an
+iterator over the output of the function.
+"""
+import os
+import pickle
+import struct
+import traceback
+
+from .base import ConfigurationError, PipeError
+
+
+def get(name):
+    """
+    Returns the executor registered as `name`.
+
+    raises `ConfigurationError` if there is no such executor.
+    """
+    try:
+        return executors[name]
+    except KeyError:
+        raise ConfigurationError("Unknown executor {!r}, expected one of: {:s}",
+                                 name, ", ".join(sorted(executors)))
+
+
+class Run(object):
+    """
+    The settings of a buffered `pipe` for a single call, with the
+    `metrics` of that call. Other attributes are those of the pipe.
+    """
+    def __init__(self, pipe, metrics):
+        self.pipe = pipe
+        self.metrics = metrics
+
+    def __getattr__(self, name):
+        return getattr(self.pipe, name)
+
+
+def threaded(pipe, function, args, kwargs):
+    """
+    Runs `function` in a new thread. Output is moved to the consumer
+    through a queue of `pipe.buffersize` chunks of `pipe.chunksize`.
+
+    What happens when the queue is full is decided by `pipe.overload`,
+    see `overload_policies`.
+    """
+    import queue
+    from . import util
+
+    buffersize, chunksize = pipe.buffersize, pipe.chunksize
+
+    if pipe.overload == "spill":
+        queue_buffer = SpillQueue(buffersize, pipe.spool_size, pipe.spool_directory,
+                                  pipe.metrics)
+    else:
+        queue_buffer = queue.Queue(maxsize=buffersize)
+    put = overload_policies[pipe.overload](pipe, queue_buffer)
+
+    if pipe.metrics is not None:
+        pipe.metrics.gauge("queued", queue_buffer.qsize)
+
+    # Create ourself a sentinal to use as StopIteration indicator.
+    exit = object()
+
+    def threaded_generator(function, *args, **kwargs):
+        # Preallocating is slightly faster than resizing
+        chunk = [exit] * chunksize
+        index = 0
+
+        try:
+            iterator = function(*args, **kwargs)
+            if pipe.overload == "sample":
+                iterator = sampled(pipe, queue_buffer, iterator)
+
+            for x in iterator:
+                chunk[index] = x
+
+                index += 1
+
+                if index >= chunksize:
+                    put(chunk[:])
+                    index = 0
+        except BaseException as error:
+            # Hand the exception to the consumer, it would wait forever
+            # on the queue otherwise.
+            queue_buffer.put(chunk[:index])
+            queue_buffer.put(Raised(error))
+            return
+
+        queue_buffer.put(chunk[:index])
+        queue_buffer.put(exit)
+
+    util.run(threaded_generator, function, *args, **kwargs)
+
+    while True:
+        chunk = queue_buffer.get()
+
+        # The method to detect the sentinal below is faster
+        # than putting an 'if' statement in the for loop
+        # below.
+        if chunk is exit:
+            break
+        elif chunk.__class__ is Raised:
+            raise chunk.error
+
+        for x in chunk:
+            yield x
+
+
+class Raised(object):
+    """
+    Holds an exception raised by the generator of a buffered pipe.
+    """
+    __slots__ = ("error",)
+
+    def __init__(self, error):
+        self.error = error
+
+
+def block(pipe, queue_buffer):
+    """
+    Overload policy that waits for room in the queue.
+    """
+    return queue_buffer.put
+
+
+def drop_newest(pipe, queue_buffer):
+    """
+    Overload policy that drops the chunk being added when the queue
+    is full.
+    """
+    import queue
+
+    metrics = pipe.metrics
+
+    def put(chunk):
+        try:
+            queue_buffer.put_nowait(chunk)
+        except queue.Full:
+            metrics.add("shed", len(chunk))
+
+    return put
+
+
+def drop_oldest(pipe, queue_buffer):
+    """
+    Overload policy that drops the oldest chunk in the queue to make
+    room when the queue is full.
+    """
+    import queue
+
+    metrics = pipe.metrics
+
+    def put(chunk):
+        while True:
+            try:
+                queue_buffer.put_nowait(chunk)
+                return
+            except queue.Full:
+                pass
+
+            try:
+                dropped = queue_buffer.get_nowait()
+            except queue.Empty:
+                # The consumer beat us to it.
+                continue
+
+            metrics.add("shed", len(dropped))
+
+    return put
+
+
+def sampled(pipe, queue_buffer, iterator):
+    """
+    Passes through items of `iterator`, while the queue holds at least
+    `pipe.threshold` of `pipe.buffersize` chunks only `pipe.sample_rate`
+    of the items are kept.
+
+    The queue is checked once for every chunk worth of items.
+    """
+    import random
+
+    rate, chunksize = pipe.sample_rate, pipe.chunksize
+    limit = max(1, int(pipe.buffersize * pipe.threshold))
+    metrics = pipe.metrics
+
+    index = sampling = shed = 0
+    for x in iterator:
+        if index == 0:
+            sampling = queue_buffer.qsize() >= limit
+            if shed:
+                metrics.add("shed", shed)
+                shed = 0
+
+        index = (index + 1) % chunksize
+
+        if sampling and random.random() >= rate:
+            shed += 1
+            continue
+
+        yield x
+
+    if shed:
+        metrics.add("shed", shed)
+
+
+class SpillQueue(object):
+    """
+    A queue holding at most `maxsize` chunks in memory. Chunks put
+    while it is full are pickled to an append-only temporary file in
+    `directory`, and read back in order as the consumer takes chunks.
+
+    Once `spool_size` bytes are written to the file puts block until
+    the consumer has read all of it and the file is emptied.
+
+    Spilled chunks are counted as "spilled", "spilled_items" and
+    "spilled_bytes" in `metrics`, the chunks in the file right now are
+    the "spooled" gauge.
+    """
+    def __init__(self, maxsize, spool_size, directory=None, metrics=None):
+        super(SpillQueue, self).__init__()
+
+        import collections
+        import threading
+
+        self.maxsize = max(1, maxsize)
+        self.spool_size = spool_size
+        self.directory = directory
+        self.metrics = metrics
+
+        self.memory = collections.deque()
+        # Offset and length of spilled chunks, or messages that aren't
+        # chunks such as the end marker kept as they are.
+        self.spooled = collections.deque()
+        self.file = None
+        self.written = 0
+        self.condition = threading.Condition()
+
+        if metrics is not None:
+            metrics.gauge("spooled", self.spooled.__len__)
+
+    def put(self, chunk):
+        with self.condition:
+            while True:
+                if not self.spooled and len(self.memory) < self.maxsize:
+                    self.memory.append(chunk)
+                    break
+                if self.written < self.spool_size:
+                    self._spill(chunk)
+                    break
+                self.condition.wait()
+
+            self.condition.notify_all()
+
+    def get(self):
+        with self.condition:
+            while not self.memory:
+                self.condition.wait()
+
+            chunk = self.memory.popleft()
+            if self.spooled:
+                self.memory.append(self._unspill())
+
+            self.condition.notify_all()
+            return chunk
+
+    def qsize(self):
+        return len(self.memory)
+
+    def _spill(self, chunk):
+        if chunk.__class__ is not list:
+            self.spooled.append(chunk)
+            return
+
+        if self.file is None:
+            import tempfile
+            self.file = tempfile.TemporaryFile(dir=self.directory)
+
+        data = pickle.dumps(chunk, pickle.HIGHEST_PROTOCOL)
+        self.file.write(data)
+        self.spooled.append((self.written, len(data)))
+        self.written += len(data)
+
+        if self.metrics is not None:
+            self.metrics.add("spilled")
+            self.metrics.add("spilled_items", len(chunk))
+            self.metrics.add("spilled_bytes", len(data))
+
+    def _unspill(self):
+        entry = self.spooled.popleft()
+        if entry.__class__ is tuple:
+            offset, length = entry
+            self.file.flush()
+            entry = pickle.loads(os.pread(self.file.fileno(), length, offset))
+
+        if not self.spooled and self.written:
+            # Everything is read back, start the file over.
+            self.file.seek(0)
+            self.file.truncate()
+            self.written = 0
+
+        return entry
+
+
+# Overload policies by their name as passed to `buffered`, "sample"
+# blocks when the queue is full and samples items before that, "spill"
+# puts into a `SpillQueue`.
+overload_policies = {
+    "block": block,
+    "drop-newest": drop_newest,
+    "drop-oldest": drop_oldest,
+    "sample": block,
+    "spill": block,
+}
+
+
+# Kinds of messages send between processes.
+DATA, END, ERROR = b'D', b'E', b'X'
+
+header = struct.Struct('<cI')
+
+
+def send(connection, kind, frames=()):
+    """
+    Sends a message of `kind` made up of `frames` over `connection`.
+    """
+    connection.send_bytes(header.pack(kind, len(frames)))
+    for frame in frames:
+        connection.send_bytes(frame)
+
+
+def receive(connection):
+    """
+    Receives a message send by `send`, returns a (kind, frames) tuple.
+    """
+    kind, count = header.unpack(connection.recv_bytes())
+    return kind, [connection.recv_bytes() for _ in range(count)]
+
+
+class RemoteTraceback(Exception):
+    """
+    Holds the formatted traceback of an exception raised in another
+    process, set as the cause of the re-raised exception.
+    """
+    def __str__(self):
+        return self.args[0]
+
+
+def pickle_error(error):
+    """
+    Returns `error` and its formatted traceback pickled, for
+    `raise_error` to raise in another process or interpreter.
+    """
+    formatted = "".join(traceback.format_exception(type(error), error,
+                                                   error.__traceback__))
+    try:
+        return pickle.dumps((error, formatted))
+    except Exception:
+        return pickle.dumps((RuntimeError(str(error)), formatted))
+
+
+def send_error(connection, error):
+    send(connection, ERROR, [pickle_error(error)])
+
+
+def raise_error(frames):
+    error, formatted = pickle.loads(frames[0])
+    raise error from RemoteTraceback(formatted)
+
+
+def send_chunks(connection, iterator, codec, chunksize, credits=None):
+    """
+    Sends the items of `iterator` in chunks of `chunksize` encoded
+    with `codec`, followed by an END message. Any exception raised
+    by `iterator` is send as an ERROR message instead.
+
+    `credits` is a semaphore acquired before each chunk is send.
+    """
+    try:
+        chunk = []
+        for item in iterator:
+            chunk.append(item)
+
+            if len(chunk) >= chunksize:
+                if credits is not None:
+                    credits.acquire()
+                send(connection, DATA, codec.encode(chunk))
+                chunk = []
+
+        if chunk:
+            if credits is not None:
+                credits.acquire()
+            send(connection, DATA, codec.encode(chunk))
+    except BaseException as error:
+        send_error(connection, error)
+    else:
+        send(connection, END)
+
+
+def receive_chunks(connection, codec, credits=None):
+    """
+    Yields the items send by `send_chunks`, raises any exception
+    that was send.
+
+    `credits` is a semaphore released after each chunk is received.
+    """
+    while True:
+        kind, frames = receive(connection)
+
+        if kind == DATA:
+            if credits is not None:
+                credits.release()
+
+            for item in codec.decode(frames):
+                yield item
+        elif kind == END:
+            return
+        else:
+            raise_error(frames)
+
+
+def process(pipe, function, args, kwargs):
+    """
+    Runs `function` in a new (forked) process. Input and output are
+    moved between the processes in chunks of `pipe.chunksize`, encoded
+    with the default codec and `pipe.codec` respectively.
+
+    At most `pipe.buffersize` chunks of output are in transit at once.
+    """
+    import multiprocessing
+    from . import transport, util
+
+    context = multiprocessing.get_context("fork")
+
+    input_codec = transport.default_codec
+    output_codec = (pipe.codec or transport.default_codec).bind(pipe)
+
+    previous, args = (args[0], args[1:]) if args else (None, ())
+
+    input_reader, input_writer = context.Pipe(duplex=False)
+    output_reader, output_writer = context.Pipe(duplex=False)
+    credits = context.Semaphore(pipe.buffersize)
+
+    def process_main():
+        input_writer.close()
+        output_reader.close()
+
+        upstream = None
+        if previous is not None:
+            upstream = receive_chunks(input_reader, input_codec)
+
+        try:
+            iterator = function(upstream, *args, **kwargs)
+        except BaseException as error:
+            send_error(output_writer, error)
+        else:
+            send_chunks(output_writer, iterator, output_codec,
+                        pipe.chunksize, credits)
+
+    worker = context.Process(target=process_main, daemon=True)
+    worker.start()
+
+    input_reader.close()
+    output_writer.close()
+
+    def feed():
+        try:
+            send_chunks(input_writer, previous, input_codec, pipe.chunksize)
+        except OSError:
+            # The worker went away, it reports its own errors.
+            pass
+        finally:
+            input_writer.close()
+
+    if previous is not None:
+        util.run(feed)
+    else:
+        input_writer.close()
+
+    try:
+        try:
+            for item in receive_chunks(output_reader, output_codec, credits):
+                yield item
+        except EOFError:
+            raise PipeError("Worker process of {:s} exited unexpectedly",
+                            pipe.__name__)
+
+        worker.join()
+    finally:
+        if worker.is_alive():
+            worker.terminate()
+            worker.join()
+
+        output_reader.close()
+
+
+def interpreter(pipe, function, args, kwargs):
+    """
+    Runs `function` in a subinterpreter with its own GIL, so CPU bound
+    pipes run in parallel without forking. Items are moved between the
+    interpreters as pickles in chunks of `pipe.chunksize`, at most
+    `pipe.buffersize` chunks are in transit at once.
+
+    Subinterpreters require `concurrent.interpreters` (Python 3.14) or
+    the `interpreters_backport` package on Python 3.13. On builds
+    without a GIL a thread already runs in parallel, and the thread
+    executor is used instead.
+
+    The thread executor is also used when subinterpreters are not
+    available, or when `function` or its arguments can't be moved to
+    another interpreter. Functions have to be importable by name, so
+    functions defined in `__main__` or inside other functions always
+    run in a thread. Fallbacks are counted as "thread_fallbacks" in
+    the `metrics` of the pipe.
+    """
+    previous, rest = (args[0], args[1:]) if args else (None, ())
+
+    interpreters = interpreters_module()
+    reference = None
+    if interpreters is not None and not free_threaded():
+        reference = function_reference(function)
+
+    arguments = None
+    if reference is not None:
+        import sys
+
+        try:
+            arguments = pickle.dumps((rest, kwargs, list(sys.path)))
+        except Exception:
+            pass
+
+    if arguments is None:
+        if pipe.metrics is not None:
+            pipe.metrics.add("thread_fallbacks")
+        return threaded(pipe, function, args, kwargs)
+
+    return interpreted(pipe, interpreters, reference, arguments, previous)
+
+
+def interpreters_module():
+    """
+    Returns the high level subinterpreter module, or None if it isn't
+    available.
+    """
+    try:
+        from concurrent import interpreters
+    except ImportError:
+        try:
+            from interpreters_backport.concurrent import interpreters
+        except ImportError:
+            return None
+    return interpreters
+
+
+def free_threaded():
+    """
+    Returns True if this is a build of Python running without a GIL.
+    """
+    import sys
+
+    is_gil_enabled = getattr(sys, "_is_gil_enabled", None)
+    return is_gil_enabled is not None and not is_gil_enabled()
+
+
+def function_reference(function):
+    """
+    Returns a (module, qualified name, filename, first line) tuple that
+    `locate_function` finds `function` with in another interpreter, or
+    None if it can't be found by name.
+    """
+    code = getattr(function, "__code__", None)
+    module = getattr(function, "__module__", None)
+    qualname = getattr(function, "__qualname__", "")
+
+    if code is None or module in (None, "__main__") or "<locals>" in qualname:
+        return None
+
+    reference = (module, qualname, code.co_filename, code.co_firstlineno)
+    try:
+        if locate_function(reference) is not function:
+            return None
+    except Exception:
+        return None
+
+    return reference
+
+
+def locate_function(reference):
+    """
+    Imports the function referred to by a `function_reference`. The
+    name can refer to a pipe wrapping the function, such as a pipe
+    decorated with `buffered`, which is unwrapped to the function.
+
+    raises `PipeError` if the function is not found.
+    """
+    import importlib
+
+    module, qualname, filename, firstlineno = reference
+
+    found = importlib.import_module(module)
+    for name in qualname.split("."):
+        found = getattr(found, name)
+
+    seen = set()
+    while found is not None and id(found) not in seen:
+        seen.add(id(found))
+
+        code = getattr(found, "__code__", None)
+        if (code is not None and code.co_filename == filename and
+                code.co_firstlineno == firstlineno):
+            return found
+
+        found = getattr(found, "__wrapped__", None) or getattr(found, "function", None)
+
+    raise PipeError("Can't find {:s}.{:s} by name", module, qualname)
+
+
+def interpreted(pipe, interpreters, reference, arguments, previous):
+    from . import util
+
+    inputs = interpreters.create_queue(maxsize=pipe.buffersize)
+    outputs = interpreters.create_queue(maxsize=pipe.buffersize)
+
+    worker = interpreters.create()
+    thread = worker.call_in_thread(interpreter_main, reference, arguments,
+                                   inputs, outputs, pipe.chunksize,
+                                   previous is not None)
+
+    def feed():
+        put_messages(inputs.put, previous, pipe.chunksize)
+
+    if previous is not None:
+        util.run(feed)
+
+    def finish():
+        thread.join()
+        worker.close()
+
+    finished = False
+    try:
+        for item in get_messages(outputs.get):
+            yield item
+        finished = True
+    finally:
+        if finished:
+            finish()
+        else:
+            # The worker blocks on a full queue until it is emptied.
+            def drain():
+                try:
+                    for _ in get_messages(outputs.get):
+                        pass
+                except BaseException:
+                    pass
+                finish()
+
+            util.run(drain)
+
+
+def interpreter_main(reference, arguments, inputs, outputs, chunksize, has_input):
+    """
+    Runs in the subinterpreter, see `interpreter`.
+    """
+    import sys
+
+    try:
+        args, kwargs, path = pickle.loads(arguments)
+        sys.path.extend(entry for entry in path if entry not in sys.path)
+
+        function = locate_function(reference)
+        upstream = get_messages(inputs.get) if has_input else None
+        iterator = function(upstream, *args, **kwargs)
+    except BaseException as error:
+        outputs.put(error_message(error))
+        return
+
+    put_messages(outputs.put, iterator, chunksize)
+
+
+def put_messages(put, iterator, chunksize):
+    """
+    Puts the items of `iterator` as pickled chunks of `chunksize`
+    with `put`, followed by an END message. Any exception raised by
+    `iterator` is put as an ERROR message instead.
+    """
+    try:
+        chunk = []
+        for item in iterator:
+            chunk.append(item)
+
+            if len(chunk) >= chunksize:
+                put(pickle.dumps((DATA, chunk), pickle.HIGHEST_PROTOCOL))
+                chunk = []
+
+        if chunk:
+            put(pickle.dumps((DATA, chunk), pickle.HIGHEST_PROTOCOL))
+    except BaseException as error:
+        put(error_message(error))
+    else:
+        put(pickle.dumps((END, None)))
+
+
+def get_messages(get):
+    """
+    Yields the items put by `put_messages`, raises any exception that
+    was put.
+    """
+    while True:
+        kind, payload = pickle.loads(get())
+
+        if kind == DATA:
+            for item in payload:
+                yield item
+        elif kind == END:
+            return
+        else:
+            raise_error([payload])
+
+
+def error_message(error):
+    return pickle.dumps((ERROR, pickle_error(error)))
+
+
+# All executors by their name as passed to `buffered`.
+executors = {
+    "thread": threaded,
+    "process": process,
+    "interpreter": interpreter,
+}
@@ -0,0 +1,181 @@
+"""
+Sorting and grouping of streams larger than memory.
+
+`sort` collects items until they take up about `memory_limit` bytes,
+sorts them and writes them to a temporary file as a sorted run. Once
+the input is exhausted the runs are merged lazily with `heapq.merge`:
+
+    for record in pype.pipeline(source, pype.sort(key=by_time, memory_limit=2 ** 28)):
+        ...
+
+`group_by` sorts the same way and yields (key, items) tuples of the
+items sharing a key.
+
+Runs are stored as zlib compressed pickles of chunks of items. The
+amount of runs spilled, items and bytes written are counted in the
+`metrics` of the pipe as "spills", "spilled_items" and "spilled_bytes".
+"""
+import heapq
+import itertools
+import pickle
+import struct
+import sys
+import zlib
+
+from . import metrics
+from .base import Generic
+
+
+# Items per chunk in a run file.
+CHUNK_SIZE = 1024
+chunk_header = struct.Struct("<I")
+
+
+def estimate_size(item):
+    """
+    Returns an estimate of the memory used by `item` in bytes, this
+    includes the direct contents of tuples, lists and dictionaries.
+    """
+    getsizeof = sys.getsizeof
+    size = getsizeof(item)
+
+    if isinstance(item, (tuple, list)):
+        size += sum(getsizeof(value) for value in item)
+    elif isinstance(item, dict):
+        size += sum(getsizeof(key) + getsizeof(value) for key, value in item.items())
+
+    return size
+
+
+def sort(key=None, memory_limit=64 * 1024 * 1024, reverse=False, directory=None):
+    """
+    Returns a pipe that sorts its input by `key` like `sorted`,
+    keeping about `memory_limit` bytes of items in memory. The rest is
+    spilled to temporary files in `directory`. The sort is stable.
+    """
+    sort_metrics = metrics.Metrics()
+
+    def sort(pipe):
+        runs = sorted_runs(pipe, key, memory_limit, reverse, directory, sort_metrics)
+
+        if key is None:
+            merged = heapq.merge(*runs, reverse=reverse)
+        else:
+            merged = (item for _, item in
+                      heapq.merge(*runs, key=first, reverse=reverse))
+
+        for item in merged:
+            yield item
+
+    sort.input_name = Generic()
+    sort.input_type = Generic()
+    sort.output_name = Generic()
+    sort.output_type = Generic()
+    sort.metrics = sort_metrics
+    return sort
+
+
+def group_by(key, memory_limit=64 * 1024 * 1024, directory=None):
+    """
+    Returns a pipe that yields a (key, items) tuple for every value of
+    `key` in its input, in order of the keys. `items` is a list in the
+    order the items came in.
+
+    Only the items of a single group have to fit in memory at once.
+    """
+    group_metrics = metrics.Metrics()
+
+    def group_by(pipe):
+        runs = sorted_runs(pipe, key, memory_limit, False, directory, group_metrics)
+        merged = heapq.merge(*runs, key=first)
+
+        for group, pairs in itertools.groupby(merged, key=first):
+            yield group, [item for _, item in pairs]
+
+    group_by.input_name = Generic()
+    group_by.input_type = Generic()
+    group_by.output_name = Generic()
+    group_by.output_type = Generic()
+    group_by.metrics = group_metrics
+    return group_by
+
+
+def first(pair):
+    return pair[0]
+
+
+def sorted_runs(iterator, key, memory_limit, reverse, directory, run_metrics):
+    """
+    Splits `iterator` into sorted runs of about `memory_limit` bytes,
+    returns a list of iterators over them. Runs are (key, item) pairs
+    if `key` is given, and items otherwise.
+
+    All runs but the last are spilled to disk.
+    """
+    runs = []
+    run = []
+    size = 0
+
+    for item in iterator:
+        if key is None:
+            run.append(item)
+        else:
+            run.append((key(item), item))
+
+        size += estimate_size(item)
+        if size >= memory_limit:
+            runs.append(spill(sort_run(run, key, reverse), directory, run_metrics))
+            run = []
+            size = 0
+
+    runs.append(iter(sort_run(run, key, reverse)))
+    return runs
+
+
+def sort_run(run, key, reverse):
+    if key is None:
+        run.sort(reverse=reverse)
+    else:
+        run.sort(key=first, reverse=reverse)
+    return run
+
+
+def spill(run, directory, run_metrics):
+    """
+    Writes `run` to a temporary file, returns an iterator that reads
+    it back.
+    """
+    import tempfile
+
+    f = tempfile.TemporaryFile(dir=directory)
+
+    written = 0
+    for start in range(0, len(run), CHUNK_SIZE):
+        data = zlib.compress(pickle.dumps(run[start:start + CHUNK_SIZE],
+                                          pickle.HIGHEST_PROTOCOL), 1)
+        f.write(chunk_header.pack(len(data)))
+        f.write(data)
+        written += chunk_header.size + len(data)
+
+    run_metrics.add("spills")
+    run_metrics.add("spilled_items", len(run))
+    run_metrics.add("spilled_bytes", written)
+
+    f.seek(0)
+    return read_run(f)
+
+
+def read_run(f):
+    """
+    Yields the items of a run written by `spill`, and closes the file
+    once they are all read.
+    """
+    with f:
+        while True:
+            header = f.read(chunk_header.size)
+            if len(header) < chunk_header.size:
+                return
+
+            size, = chunk_header.unpack(header)
+            for item in pickle.loads(zlib.decompress(f.read(size))):
+                yield item
@@ -0,0 +1,241 @@
+"""
+Incremental execution of pipelines.
+
+Pipes that are both `deterministic` and `per_item` can have their
+output cached per input item. When the same pipeline is ran again
+over mostly the same input, only items that changed are passed to
+the pipe, the output of all other items is replayed from the cache.
+
+    cache = incremental.Cache.open("nightly.cache")
+    for result in incremental.pipeline(cache, source, parse, enrich):
+        ...
+    cache.prune()
+    cache.close()
+"""
+import hashlib
+import pickle
+import shelve
+import threading
+
+from . import core
+from . import engine
+
+
+# Protocol used for fingerprinting, fixed so that fingerprints are
+# stable between python versions that support it.
+FINGERPRINT_PROTOCOL = 2
+
+
+def pipeline(cache, *pipes, **config):
+    """
+    Equal to `pype.pipeline` except that all cacheable pipes have
+    their output cached in `cache`.
+
+    See `cacheable` for what makes a pipe cacheable.
+    """
+    pipes = engine.resolve_pipeline(pipes)
+
+    last = None
+    for pipe in pipes:
+        if last is not None and cacheable(pipe):
+            last = cached(pipe, cache, config)(last)
+        else:
+            last = engine.call_pipe(pipe, last, config)
+
+    return last
+
+
+def cacheable(pipe):
+    """
+    Returns True if the output of `pipe` can be cached per item.
+    """
+    return (getattr(pipe, "deterministic", False) and
+            getattr(pipe, "per_item", False))
+
+
+def cached(pipe, cache, config):
+    """
+    Wraps `pipe` such that every item passed in is looked up in
+    `cache` first, only items that miss the cache are passed to
+    `pipe` itself.
+    """
+    prefix = stage_key(pipe, config)
+
+    def cached(previous):
+        for item in previous:
+            try:
+                key = prefix + fingerprint(item)
+            except (pickle.PicklingError, TypeError, AttributeError):
+                # Can't fingerprint it, so can't cache it either.
+                key = None
+            else:
+                outputs = cache.get(key)
+                if outputs is not None:
+                    for output in outputs:
+                        yield output
+                    continue
+
+            outputs = list(engine.call_pipe(pipe, iter([item]), config))
+
+            if key is not None:
+                cache.set(key, outputs)
+
+            for output in outputs:
+                yield output
+
+    cached.__name__ = getattr(pipe, "__name__", "cached")
+    return cached
+
+
+def fingerprint(obj):
+    """
+    Returns a content hash of `obj` as a hex string.
+    """
+    data = pickle.dumps(canonical(obj), FINGERPRINT_PROTOCOL)
+    return hashlib.sha1(data).hexdigest()
+
+
+def canonical(obj):
+    """
+    Returns `obj` with the contents of dictionaries and sets sorted,
+    so equal values pickle the same no matter their insertion or hash
+    order, which changes between runs for strings.
+    """
+    if isinstance(obj, dict):
+        items = [(canonical(key), canonical(value)) for key, value in obj.items()]
+        return (type(obj).__qualname__, sorted(items, key=sort_key))
+    if isinstance(obj, (set, frozenset)):
+        return (type(obj).__qualname__, sorted((canonical(item) for item in obj), key=sort_key))
+    if type(obj) in (list, tuple):
+        return type(obj)(canonical(item) for item in obj)
+    return obj
+
+
+def sort_key(obj):
+    return pickle.dumps(obj, FINGERPRINT_PROTOCOL)
+
+
+def code_identity(code):
+    """
+    Returns the bytecode of `code` and its constants, descending into
+    the code objects of nested functions, lambdas and comprehensions.
+    """
+    constants = []
+    for constant in code.co_consts:
+        if hasattr(constant, "co_code"):
+            constants.append(code_identity(constant))
+        else:
+            constants.append(repr(canonical(constant)))
+
+    return [code.co_code, constants]
+
+
+def stage_key(pipe, config):
+    """
+    Returns a key identifying `pipe` with the arguments it would be
+    called with under `config`.
+
+    The key changes when the code of the pipe changes, or when any
+    of its resolved configuration arguments change.
+    """
+    function = pipe
+    arguments = {}
+    if isinstance(pipe, core.config):
+        function = pipe.function
+
+        resolved = dict(config)
+        resolved.update(pipe.config)
+        arguments = pipe.get_arguments(resolved)
+
+        # Shared resources such as connection pools don't change output.
+        arguments = {name: value for name, value in arguments.items()
+                     if name not in pipe.resources}
+
+    # Get at the original function if it was wrapped.
+    while hasattr(function, "__wrapped__"):
+        function = function.__wrapped__
+
+    identity = [
+        getattr(function, "__module__", None),
+        getattr(function, "__qualname__", getattr(function, "__name__", None)),
+    ]
+
+    code = getattr(function, "__code__", None)
+    if code is not None:
+        identity.append(code_identity(code))
+
+    try:
+        arguments = fingerprint(sorted(arguments.items()))
+    except (pickle.PicklingError, TypeError, AttributeError):
+        arguments = repr(sorted(arguments.items()))
+
+    return fingerprint((identity, arguments)) + ":"
+
+
+class Cache(object):
+    """
+    Storage of cached pipe outputs.
+
+    `mapping` can be any mapping that accepts string keys, it defaults
+    to an in-memory dictionary. Use `Cache.open` for a cache that
+    persists between runs.
+    """
+    def __init__(self, mapping=None):
+        super(Cache, self).__init__()
+
+        self.mapping = {} if mapping is None else mapping
+        # Keys used since the cache was created, see `prune`.
+        self.used = set()
+        self.hits = 0
+        self.misses = 0
+
+        # buffered pipes run in their own thread.
+        self.lock = threading.Lock()
+
+    @classmethod
+    def open(cls, filename):
+        """
+        Opens a cache persisted in `filename`.
+        """
+        return cls(shelve.open(filename, protocol=pickle.HIGHEST_PROTOCOL))
+
+    def get(self, key):
+        """
+        Returns the list of outputs stored under `key` or None if
+        there is nothing stored.
+        """
+        with self.lock:
+            self.used.add(key)
+            outputs = self.mapping.get(key)
+
+            if outputs is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+
+            return outputs
+
+    def set(self, key, outputs):
+        with self.lock:
+            self.used.add(key)
+            self.mapping[key] = outputs
+
+    def prune(self):
+        """
+        Removes all entries not used since the cache was created.
+
+        Call this after a full run to drop outputs of items that
+        no longer exist in the input, or of pipes that changed.
+        """
+        with self.lock:
+            for key in list(self.mapping.keys()):
+                if key not in self.used:
+                    del self.mapping[key]
+
+    def close(self):
+        close = getattr(self.mapping, "close", None)
+        if close is not None:
+            close()
+
+    def __len__(self):
+        return len(self.mapping)
@@ -0,0 +1,374 @@
+"""
+Join stages that enrich items with reference data.
+
+`hash_join` looks up the key of every item in an index built once up
+front, either in memory or as a memory-mapped file that processes
+forked after opening it share through the page cache:
+
+    index = joins.DiskIndex.build("users.idx", ((user.id, user) for user in users))
+
+    @pype.output("events", event)
+    def events(pipe):
+        ...
+
+    enrich = joins.hash_join(index, key="user_id", output_type=enriched)
+
+Items are looked up in batches of `batch_size` keys.
+
+`merge_join` joins the items of the pipeline with a second stream,
+both sorted by their keys, while holding only the items of a single
+key of the second stream in memory.
+
+Keys given as a field name are verified against the `Schema` output
+type of the pipe before the join when the pipeline is created, as is
+a `Schema` output type of the join against the index.
+"""
+import array
+import bisect
+import itertools
+import mmap
+import operator
+import pickle
+import struct
+
+from .base import Generic, PipeError
+from .schema import Schema, compatible
+from .util import key_hash
+
+
+class MemoryIndex(object):
+    """
+    An in-memory index of rows by key, built from (key, row) pairs.
+    A key can have several rows.
+
+    `key_type` is the type of the keys, checked against the type of
+    the key field of items joined with the index.
+    """
+    def __init__(self, pairs, key_type=None, row_type=None):
+        super(MemoryIndex, self).__init__()
+
+        self.key_type = key_type
+        self.row_type = row_type
+        self.table = {}
+        for key, row in pairs:
+            self.table.setdefault(key, []).append(row)
+
+    def get_many(self, keys):
+        """
+        Returns a list with the rows of each key in `keys`, keys
+        without rows have an empty sequence.
+        """
+        get = self.table.get
+        return [get(key, ()) for key in keys]
+
+    def __len__(self):
+        return len(self.table)
+
+
+# Magic, amount of keys. The header is followed by a column of the
+# sorted 64 bit key hashes in native byte order, a column of entries
+# and the pickled (key, rows) of every key.
+index_header = struct.Struct("<8sQ")
+# Offset and length of the pickled (key, rows) of a key.
+index_entry = struct.Struct("<QI")
+
+
+class DiskIndex(object):
+    """
+    An index of rows by key in a memory-mapped file, made with
+    `DiskIndex.build`. Keys are found by bisecting the hash column of
+    the mapped file, nothing is read into memory up front.
+
+    Keys should be values that pickle the same when equal, such as
+    strings, bytes, integers and tuples of those.
+    """
+    MAGIC = b"PYPEIDX2"
+
+    def __init__(self, filename, key_type=None, row_type=None):
+        super(DiskIndex, self).__init__()
+
+        self.filename = filename
+        self.key_type = key_type
+        self.row_type = row_type
+
+        with open(filename, "rb") as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, self.count = index_header.unpack_from(self.map, 0)
+        if magic != self.MAGIC:
+            raise PipeError("{:s} is not an index", filename)
+
+        start = index_header.size
+        self.entries = start + 8 * self.count
+        self.column = memoryview(self.map)[start:self.entries].cast('Q')
+
+    @classmethod
+    def build(cls, filename, pairs, key_type=None, row_type=None):
+        """
+        Writes an index of the (key, row) `pairs` to `filename` and
+        returns it opened.
+        """
+        table = {}
+        for key, row in pairs:
+            table.setdefault(key, []).append(row)
+
+        records = sorted(((key_hash(key), pickle.dumps((key, rows), pickle.HIGHEST_PROTOCOL))
+                          for key, rows in table.items()), key=operator.itemgetter(0))
+
+        with open(filename, "wb") as f:
+            f.write(index_header.pack(cls.MAGIC, len(records)))
+            f.write(array.array('Q', [hashed for hashed, _ in records]).tobytes())
+
+            offset = index_header.size + (8 + index_entry.size) * len(records)
+            for _, record in records:
+                f.write(index_entry.pack(offset, len(record)))
+                offset += len(record)
+
+            for _, record in records:
+                f.write(record)
+
+        return cls(filename, key_type, row_type)
+
+    def get_many(self, keys):
+        """
+        Returns a list with the rows of each key in `keys`, keys
+        without rows have an empty sequence.
+        """
+        column, data, entries = self.column, self.map, self.entries
+
+        found = {}
+        # Looking up in order of hash reads the file front to back.
+        for hashed, key in sorted((key_hash(key), key) for key in set(keys)):
+            index = bisect.bisect_left(column, hashed)
+
+            rows = ()
+            while index < self.count and column[index] == hashed:
+                offset, length = index_entry.unpack_from(data, entries + index * index_entry.size)
+                stored, stored_rows = pickle.loads(data[offset:offset + length])
+                if stored == key:
+                    rows = stored_rows
+                    break
+                index += 1
+
+            found[key] = rows
+
+        return [found[key] for key in keys]
+
+    def close(self):
+        self.column.release()
+        self.map.close()
+
+    def __len__(self):
+        return self.count
+
+    def __reduce__(self):
+        return DiskIndex, (self.filename, self.key_type, self.row_type)
+
+
+def key_function(key):
+    """
+    Returns a function that gets `key` from an item, `key` can be a
+    function or a field name.
+    """
+    if callable(key):
+        return key
+    return lambda item: item[key] if isinstance(item, dict) else getattr(item, key)
+
+
+def schema_combine(output_type):
+    """
+    Returns a combine function that creates a record of `output_type`
+    with the fields of the row, or the item for fields the row doesn't
+    have.
+    """
+    make = output_type.record._make
+    names = output_type.names
+
+    def field(item, row, name):
+        for source in (row, item):
+            if source is None:
+                continue
+            if isinstance(source, dict):
+                if name in source:
+                    return source[name]
+            elif hasattr(source, name):
+                return getattr(source, name)
+        return None
+
+    def combine(item, row):
+        return make([field(item, row, name) for name in names])
+
+    return combine
+
+
+def verify_key(join_name, key, key_type, pipe, output_type):
+    """
+    Verifies that the output of `pipe` has the field `key`, with a
+    type compatible with `key_type`.
+    """
+    if callable(key) or not isinstance(output_type, Schema):
+        return
+
+    try:
+        field_type = output_type.field_type(key)
+    except KeyError:
+        raise PipeError("Join key {!r} of {:s} is not a field of {!s} from {:s}",
+                        key, join_name, output_type, pipe.__name__)
+
+    if key_type is not None and not compatible(field_type, key_type):
+        raise PipeError("Join key {!r} of {:s} has type {!s}, expected {!s}",
+                        key, join_name, field_type, key_type)
+
+
+def hash_join(index, key, combine=None, how="inner", batch_size=256,
+              input_name=None, input_type=None, output_name=None, output_type=None):
+    """
+    Returns a pipe that joins each item with the rows of its key in
+    `index`, a `MemoryIndex`, `DiskIndex` or anything with the same
+    `get_many` method.
+
+    :param key: Function returning the key of an item, or the name of
+                the key field.
+    :param combine: Called with (item, row) to make the output, by
+                    default a record if `output_type` is a `Schema`,
+                    otherwise an (item, row) tuple.
+    :param how: "inner" drops items without rows, "left" passes them
+                on with None as row.
+    :param batch_size: Amount of items looked up at once.
+
+    Names and types default to generic.
+    """
+    if how not in ("inner", "left"):
+        raise ValueError("Unknown join {!r}, expected 'inner' or 'left'".format(how))
+
+    get_key = key_function(key)
+    if combine is None:
+        if isinstance(output_type, Schema):
+            combine = schema_combine(output_type)
+        else:
+            combine = lambda item, row: (item, row)
+
+    def hash_join(pipe):
+        get_many = index.get_many
+        iterator = iter(pipe)
+
+        while True:
+            batch = list(itertools.islice(iterator, batch_size))
+            if not batch:
+                return
+
+            for item, rows in zip(batch, get_many([get_key(item) for item in batch])):
+                if rows:
+                    for row in rows:
+                        yield combine(item, row)
+                elif how == "left":
+                    yield combine(item, None)
+
+    def verify_input(pipe):
+        verify_key("hash_join", key, getattr(index, "key_type", None), pipe,
+                   pipe.output_type)
+
+        row_type = getattr(index, "row_type", None)
+        if isinstance(output_type, Schema) and isinstance(row_type, Schema):
+            provided = Schema("joined", list(row_type.fields) + [
+                field for field in (pipe.output_type.fields
+                                    if isinstance(pipe.output_type, Schema) else ())
+                if field[0] not in row_type.names])
+            if not output_type.accepts(provided):
+                raise PipeError("Output type {!s} of hash_join can't be made from {!s}",
+                                output_type, provided)
+
+    hash_join.per_item = True
+    return join_pipe(hash_join, verify_input, input_name, input_type,
+                     output_name, output_type)
+
+
+def merge_join(other, key, other_key=None, combine=None, how="inner",
+               input_name=None, input_type=None, output_name=None, output_type=None):
+    """
+    Returns a pipe that joins its items with the items of the iterable
+    `other`. Both have to be sorted by their key, only the items of
+    `other` with the current key are kept in memory.
+
+    :param key: Function returning the key of an item, or the name of
+                the key field.
+    :param other_key: Same as `key` for the items of `other`, defaults
+                      to `key`.
+    :param combine: Called with (item, other item) to make the output,
+                    by default an (item, other item) tuple.
+    :param how: "inner" drops items without a match, "left" passes them
+                on with None as other item.
+
+    raises `PipeError` while running if either input is not sorted.
+    """
+    if how not in ("inner", "left"):
+        raise ValueError("Unknown join {!r}, expected 'inner' or 'left'".format(how))
+
+    get_key = key_function(key)
+    get_other_key = key_function(other_key if other_key is not None else key)
+    if combine is None:
+        if isinstance(output_type, Schema):
+            combine = schema_combine(output_type)
+        else:
+            combine = lambda item, row: (item, row)
+
+    def merge_join(pipe):
+        others = iter(other)
+        missing = object()
+
+        # The items of `other` with key `group_key`.
+        group, group_key = [], missing
+        # The first item of `other` after the group.
+        pending = next(others, missing)
+
+        last_key = missing
+        for item in pipe:
+            item_key = get_key(item)
+            if last_key is not missing and item_key < last_key:
+                raise PipeError("Input of merge_join is not sorted at key {!r}", item_key)
+            last_key = item_key
+
+            if group_key is missing or group_key < item_key:
+                group, group_key = [], missing
+                # Skip items of `other` before this key.
+                while pending is not missing and get_other_key(pending) < item_key:
+                    pending = advance(others, pending, get_other_key, missing)
+
+                if pending is not missing and get_other_key(pending) == item_key:
+                    group_key = item_key
+                    while pending is not missing and get_other_key(pending) == item_key:
+                        group.append(pending)
+                        pending = advance(others, pending, get_other_key, missing)
+
+            if group_key == item_key and group:
+                for row in group:
+                    yield combine(item, row)
+            elif how == "left":
+                yield combine(item, None)
+
+    def verify_input(pipe):
+        verify_key("merge_join", key, None, pipe, pipe.output_type)
+
+    return join_pipe(merge_join, verify_input, input_name, input_type,
+                     output_name, output_type)
+
+
+def advance(others, current, get_other_key, missing):
+    """
+    Returns the item of `others` after `current`, verifying that
+    they are in order.
+    """
+    following = next(others, missing)
+    if following is not missing and get_other_key(following) < get_other_key(current):
+        raise PipeError("Second input of merge_join is not sorted at key {!r}",
+                        get_other_key(following))
+    return following
+
+
+def join_pipe(pipe, verify_input, input_name, input_type, output_name, output_type):
+    pipe.input_name = Generic() if input_name is None else input_name
+    pipe.input_type = Generic() if input_type is None else input_type
+    pipe.output_name = Generic() if output_name is None else output_name
+    pipe.output_type = Generic() if output_type is None else output_type
+    pipe.verify_input = verify_input
+    return pipe
@@ -0,0 +1,145 @@
+"""
+Counters kept by pipes about their own behaviour.
+
+Pipes that keep metrics have a `metrics` attribute holding a `Metrics`
+instance, a snapshot of all of its values can be taken at any time:
+
+    shedding.metrics.snapshot()
+    {'shed': 1200, 'queued': 10}
+"""
+import threading
+
+
+class Metrics(object):
+    """
+    A thread-safe collection of named counters and gauges.
+
+    Counters are numbers that are added to as things happen, gauges
+    are functions called to get their current value when a snapshot
+    is taken.
+    """
+    def __init__(self):
+        super(Metrics, self).__init__()
+
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.gauges = {}
+
+    def add(self, name, amount=1):
+        """
+        Adds `amount` to the counter `name`.
+        """
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def gauge(self, name, function):
+        """
+        Registers `function` as gauge `name`, it is called without
+        arguments for every snapshot.
+        """
+        with self.lock:
+            self.gauges[name] = function
+
+    def get(self, name, default=0):
+        """
+        Returns the current value of counter or gauge `name`.
+        """
+        with self.lock:
+            if name in self.gauges:
+                return self.gauges[name]()
+            return self.counters.get(name, default)
+
+    def snapshot(self):
+        """
+        Returns a dictionary of all counters and gauges by name.
+        """
+        with self.lock:
+            snapshot = dict(self.counters)
+            gauges = list(self.gauges.items())
+
+        for name, function in gauges:
+            snapshot[name] = function()
+
+        return snapshot
+
+    def reset(self):
+        """
+        Sets all counters back to zero.
+        """
+        with self.lock:
+            self.counters.clear()
+
+    def __repr__(self):
+        return "Metrics({!r})".format(self.snapshot())
+
+
+class collect(object):
+    """
+    Collects the `Metrics` announced with `created` in this thread
+    while in the with block:
+
+        with metrics.collect() as created:
+            output = pipe(previous)
+    """
+    def __enter__(self):
+        stack = getattr(_collecting, "stack", None)
+        if stack is None:
+            stack = _collecting.stack = []
+
+        self.created = []
+        stack.append(self.created)
+        return self.created
+
+    def __exit__(self, *exc_info):
+        _collecting.stack.pop()
+
+
+_collecting = threading.local()
+
+
+def created(metrics):
+    """
+    Announces `metrics` made for a single call of a pipe to the
+    innermost `collect` of this thread, if any.
+    """
+    stack = getattr(_collecting, "stack", None)
+    if stack:
+        stack[-1].append(metrics)
+
+
+def metered(iterator, metrics, flush=1024):
+    """
+    Passes through the items of `iterator` while counting them as
+    "items" in `metrics`, and adding the time spent waiting on the
+    iterator as "time" in seconds.
+
+    The time includes any time spent in pipes before `iterator`.
+    Counters are updated every `flush` items and at the end.
+    """
+    import time
+
+    clock = time.perf_counter
+    next_item = iter(iterator).__next__
+
+    count, spent = 0, 0.0
+    try:
+        while True:
+            start = clock()
+            try:
+                item = next_item()
+            except StopIteration:
+                spent += clock() - start
+                return
+
+            spent += clock() - start
+            count += 1
+
+            if count >= flush:
+                metrics.add("items", count)
+                metrics.add("time", spent)
+                count, spent = 0, 0.0
+
+            yield item
+    finally:
+        metrics.add("items", count)
+        metrics.add("time", spent)
@@ -0,0 +1,345 @@
+"""
+Cost based planning of pipelines.
+
+Pipes can be annotated with how many items they let through per item
+they receive (selectivity), how long they take per item (cost) and
+whether they may be reordered:
+
+    @planner.annotate(selectivity=0.1, cost=2e-6, pure=True, commutative=True)
+    def only_errors(pipe):
+        ...
+
+`plan` reorders runs of adjacent pipes that are both pure and commutative
+to the order with the lowest estimated cost. This runs cheap and selective
+filters first, moves filters ahead of expensive maps and groups pipes that
+use state together so less state handling stages are needed.
+
+    p = planner.plan([source, parse, only_errors, enrich])
+    print(p.explain())
+    for item in p.pipeline(**config):
+        ...
+
+Annotations can also be measured with `profile` and passed to `plan`,
+measured selectivity and cost take precedence over declared ones.
+"""
+import itertools
+
+from . import core
+from . import engine
+from . import metrics
+from .base import PipeError
+
+
+# Cost per item in seconds assumed for pipes without a known cost.
+DEFAULT_COST = 1e-6
+# Cost per item in seconds of a stage inserted for state handling.
+STATE_STAGE_COST = 1e-7
+# Runs of reorderable pipes up to this length are planned by trying
+# every order, longer runs are ordered by rank.
+EXHAUSTIVE_LIMIT = 6
+
+
+class Annotations(object):
+    """
+    Planning information about a single pipe.
+
+    `selectivity`: Items produced per item received.
+    `cost`: Seconds spent per item received, None if unknown.
+    `pure`: The pipe has no side effects.
+    `commutative`: The pipe gives the same result if swapped with
+                   other commutative pipes.
+    """
+    def __init__(self, selectivity=1.0, cost=None, pure=False, commutative=False):
+        super(Annotations, self).__init__()
+
+        self.selectivity = selectivity
+        self.cost = cost
+        self.pure = pure
+        self.commutative = commutative
+
+    @property
+    def reorderable(self):
+        return self.pure and self.commutative
+
+    @property
+    def rank(self):
+        """
+        Pipes with a lower rank should run first. This is the reduction
+        in items per second of cost.
+        """
+        cost = DEFAULT_COST if self.cost is None else self.cost
+        return (self.selectivity - 1.0) / max(cost, 1e-12)
+
+    def measured(self, measured):
+        """
+        Returns a copy with the selectivity and cost of `measured`.
+        """
+        return type(self)(
+            selectivity=measured.selectivity,
+            cost=measured.cost,
+            pure=self.pure,
+            commutative=self.commutative,
+        )
+
+    def __repr__(self):
+        return ("Annotations(selectivity={!r}, cost={!r}, pure={!r}, "
+                "commutative={!r})").format(self.selectivity, self.cost,
+                                            self.pure, self.commutative)
+
+
+def annotate(selectivity=1.0, cost=None, pure=False, commutative=False):
+    """
+    Attaches planning `Annotations` to the decorated generator.
+    """
+    def annotate(function):
+        function.annotations = Annotations(selectivity, cost, pure, commutative)
+        return function
+    return annotate
+
+
+def plan(pipes, measured=None):
+    """
+    Returns a `Plan` for `pipes` with the lowest estimated cost.
+
+    `measured` is an optional dictionary of pipe name to `Annotations`
+    as returned by `profile`.
+
+    raises `PipeError` if the pipes are incompatible.
+    """
+    pipes = list(pipes)
+    for pipe in pipes:
+        engine.initialize_pipe_variables(pipe)
+
+    engine.verify_pipe_types(pipes)
+
+    annotations = {pipe: annotations_for(pipe, measured) for pipe in pipes}
+
+    planned = list(pipes)
+    notes = []
+    for start, end in reorderable_runs(planned, annotations):
+        run = planned[start:end]
+        best = best_order(planned, start, end, annotations)
+
+        if best != run:
+            notes.append("reordered {:s} to {:s}".format(
+                ", ".join(pipe.__name__ for pipe in run),
+                ", ".join(pipe.__name__ for pipe in best),
+            ))
+            planned[start:end] = best
+
+    return Plan(pipes, planned, annotations, notes)
+
+
+def annotations_for(pipe, measured=None):
+    """
+    Returns the `Annotations` of `pipe`, with selectivity and cost
+    taken from `measured` if it has an entry for the pipe.
+    """
+    annotations = pipe.annotations or Annotations()
+
+    if measured and pipe.__name__ in measured:
+        annotations = annotations.measured(measured[pipe.__name__])
+
+    return annotations
+
+
+def reorderable_runs(pipes, annotations):
+    """
+    Yields (start, end) slices of runs of at least two adjacent pipes
+    that can be reordered. The first pipe is never part of a run.
+    """
+    start = None
+    for index in range(1, len(pipes) + 1):
+        if index < len(pipes) and annotations[pipes[index]].reorderable:
+            if start is None:
+                start = index
+            continue
+
+        if start is not None and index - start > 1:
+            yield start, index
+        start = None
+
+
+def best_order(pipes, start, end, annotations):
+    """
+    Returns the order of `pipes[start:end]` with the lowest estimated
+    cost of the whole pipeline. Orders that don't pass type verification
+    are skipped.
+    """
+    run = pipes[start:end]
+
+    if len(run) <= EXHAUSTIVE_LIMIT:
+        candidates = itertools.permutations(run)
+    else:
+        candidates = [run, sorted(run, key=lambda pipe: annotations[pipe].rank)]
+
+    best, best_cost = run, None
+    for candidate in candidates:
+        candidate = list(candidate)
+        order = pipes[:start] + candidate + pipes[end:]
+
+        try:
+            engine.verify_pipe_types(order)
+        except PipeError:
+            continue
+
+        cost = estimate(engine.initialize_pipeline_state_handling(order),
+                        annotations)[0]
+
+        # Only strictly better orders, so ties keep the original order.
+        if best_cost is None or cost < best_cost:
+            best, best_cost = candidate, cost
+
+    return best
+
+
+def estimate(stages, annotations):
+    """
+    Estimates the cost of running `stages` per item produced by the
+    first stage.
+
+    Returns a tuple of the total cost and a list of rows of (stage,
+    annotations, items in, cost) for each stage. Stages without an
+    entry in `annotations` are considered state handling stages.
+    """
+    state_annotations = Annotations(cost=STATE_STAGE_COST)
+
+    rows = []
+    items, total = 1.0, 0.0
+    for stage in stages:
+        stage_annotations = annotations.get(stage, state_annotations)
+
+        cost = stage_annotations.cost
+        cost = items * (DEFAULT_COST if cost is None else cost)
+        rows.append((stage, stage_annotations, items, cost))
+
+        total += cost
+        if rows[0][0] is not stage:
+            items *= stage_annotations.selectivity
+
+    return total, rows
+
+
+class Plan(object):
+    """
+    The result of planning a pipeline.
+
+    `original`: The pipes as passed to `plan`.
+    `pipes`: The pipes in planned order.
+    `notes`: Descriptions of the changes made.
+    """
+    def __init__(self, original, pipes, annotations, notes):
+        super(Plan, self).__init__()
+
+        self.original = original
+        self.pipes = pipes
+        self.annotations = annotations
+        self.notes = notes
+
+    @property
+    def stages(self):
+        """
+        The stages that will be ran, including state handling.
+        """
+        return engine.initialize_pipeline_state_handling(self.pipes)
+
+    @property
+    def cost(self):
+        """
+        Estimated cost per item produced by the first pipe.
+        """
+        return estimate(self.stages, self.annotations)[0]
+
+    def pipeline(self, **config):
+        """
+        Creates the planned pipeline, equal to `pype.pipeline`, returns
+        a `Pipeline`.
+        """
+        return engine.Pipeline(self.pipes, config)
+
+    def explain(self):
+        """
+        Returns a human readable description of the plan.
+        """
+        original_stages = engine.initialize_pipeline_state_handling(self.original)
+        original_cost = estimate(original_stages, self.annotations)[0]
+
+        stages = self.stages
+        cost, rows = estimate(stages, self.annotations)
+
+        lines = ["{:>3s}  {:<24s} {:>12s} {:>11s} {:>10s} {:>12s}".format(
+            "#", "stage", "cost/item", "selectivity", "items", "cost")]
+
+        for index, (stage, annotations, items, stage_cost) in enumerate(rows):
+            name = stage.__name__
+            if stage not in self.annotations:
+                name += " (state)"
+            elif annotations.reorderable:
+                name += " *"
+
+            per_item = annotations.cost
+            lines.append("{:>3d}  {:<24s} {:>12s} {:>11.3g} {:>10.3g} {:>12.3g}".format(
+                index, name,
+                "?" if per_item is None else "{:.3g}".format(per_item),
+                annotations.selectivity, items, stage_cost,
+            ))
+
+        lines.append("")
+        lines.append("estimated cost per source item: {:.3g} (was {:.3g})".format(
+            cost, original_cost))
+        lines.append("state handling stages: {:d} (was {:d})".format(
+            len(stages) - len(self.pipes),
+            len(original_stages) - len(self.original)))
+
+        for note in self.notes:
+            lines.append(note)
+
+        return "\n".join(lines)
+
+
+def profile(*pipes, **config):
+    """
+    Runs the pipeline of `pipes` to completion and measures the
+    selectivity and cost of each pipe.
+
+    Returns a dictionary of pipe name to `Annotations`, suitable for
+    the `measured` argument of `plan`. The first pipe should produce
+    a representative sample of the input.
+
+    Time spent in `buffered` pipes is counted towards the pipe that
+    waits on them.
+    """
+    stages = engine.resolve_pipeline(pipes)
+
+    meters = []
+    last = None
+    for stage in stages:
+        last = engine.call_pipe(stage, last, config)
+
+        stage_metrics = metrics.Metrics()
+        last = metrics.metered(last, stage_metrics)
+        meters.append((stage, stage_metrics))
+
+    core.consume(last)
+
+    measured = {}
+    previous_items, previous_time = None, 0.0
+    for stage, stage_metrics in meters:
+        items, spent = stage_metrics.get("items"), stage_metrics.get("time")
+        own = max(spent - previous_time, 0.0)
+
+        if stage in pipes:
+            if previous_items is None:
+                selectivity, received = 1.0, items
+            else:
+                selectivity = items / previous_items if previous_items else 1.0
+                received = previous_items
+
+            measured[stage.__name__] = Annotations(
+                selectivity=selectivity,
+                cost=own / received if received else 0.0,
+            )
+
+        previous_items, previous_time = items, spent
+
+    return measured
@@ -0,0 +1,90 @@
+"""
+Push based execution of pipelines.
+
+`pype.pipeline` pulls items through the pipes from the first pipe.
+For sources that deliver items through callbacks (socket readers,
+file watchers, ...) a push based pipeline avoids a thread and queue
+between the callback and the pipeline:
+
+    plan = push.pipeline(parse, enrich, **config)
+
+    def on_message(message):
+        for result in plan.push(message):
+            ...
+
+Pushed items are the input of the first pipe. A generator can't wait
+for the next push without a thread, so every push calls the pipes
+again on only the pushed items. Pipes must therefore be `per_item` and
+keep nothing between items: anything a pipe sets up before its loop,
+such as counters or caches, starts over on every push. Keep what has
+to outlive a push in a resource (see `pype.resources`) or in the
+state of the items. Buffered pipes are not allowed, they would start
+their executor on every push.
+
+Pushing many items at once with `push_many` is cheaper per item than
+pushing them one by one, and pipes see the items of one push in a
+single call.
+"""
+import threading
+
+from . import engine
+from .base import PipeError
+
+
+def pipeline(*pipes, **config):
+    """
+    Creates a `PushPlan` of `pipes`, configured with `config` like
+    `pype.pipeline`.
+
+    raises `PipeError` if the pipes are incompatible, or if any of
+    them is not `per_item` or is buffered.
+    """
+    stages = engine.resolve_pipeline(pipes)
+
+    not_per_item = [pipe.__name__ for pipe in pipes if not pipe.per_item]
+    if not_per_item:
+        raise PipeError("Push pipelines require per item pipes, not: {:s}",
+                        ", ".join(not_per_item))
+
+    buffered = [pipe.__name__ for pipe in pipes if pipe.buffered]
+    if buffered:
+        raise PipeError("Push pipelines can't run buffered pipes: {:s}",
+                        ", ".join(buffered))
+
+    return PushPlan([engine.bind_pipe(stage, config) for stage in stages])
+
+
+class PushPlan(object):
+    """
+    A pipeline that items are pushed into, see `pipeline`.
+
+    Pushing is serialized, it is safe to push from several threads.
+    """
+    def __init__(self, stages):
+        super(PushPlan, self).__init__()
+
+        self.stages = stages
+        self.lock = threading.Lock()
+
+    def push(self, item):
+        """
+        Pushes a single item through the pipeline, returns a list of
+        the items that came out of the last pipe.
+        """
+        return self.push_many((item,))
+
+    def push_many(self, items):
+        """
+        Pushes all `items` through the pipeline, returns a list of
+        the items that came out of the last pipe.
+        """
+        with self.lock:
+            # The pipes are called again for every push, see the module
+            # documentation. Connected lazily like a normal pipeline,
+            # state handling relies on items passing through one at a
+            # time.
+            last = iter(items)
+            for stage in self.stages:
+                last = stage(last)
+
+            return list(last)
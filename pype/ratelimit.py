@@ -0,0 +1,125 @@
+"""
+Rate limiting of pipelines.
+
+`rate_limit` returns a pipe that passes items through at most at a
+given rate, for pipelines that feed rate limited APIs:
+
+    for response in pype.pipeline(requests, pype.rate_limit(10, burst=20), send):
+        ...
+
+Pipes of several pipelines can share the same limit by passing them
+the same limiter. A `TokenBucket` is shared between threads, a
+`SharedTokenBucket` between processes forked after it was made, such
+as the ones of `buffered(..., executor="process")`:
+
+    limiter = ratelimit.SharedTokenBucket(10, burst=20)
+    limited = pype.rate_limit(limiter=limiter)
+
+Waiting is done by sleeping until a token is available, time spent
+waiting is kept in the `metrics` of the pipe as "throttled" seconds.
+"""
+import threading
+import time
+
+from . import metrics
+from .base import Generic
+
+
+class TokenBucket(object):
+    """
+    A token bucket that fills with `rate` tokens per second, up to
+    `burst` tokens. Thread-safe.
+    """
+    def __init__(self, rate, burst=1):
+        super(TokenBucket, self).__init__()
+
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+
+        self.rate = float(rate)
+        self.burst = float(max(burst, 1))
+        self.lock = threading.Lock()
+        self.state = [self.burst, time.monotonic()]
+
+    def reserve(self, tokens=1):
+        """
+        Takes `tokens` from the bucket, returns the seconds to wait
+        before they may be used.
+
+        Tokens can be reserved ahead of time, the bucket goes below
+        zero and later callers wait for the tokens before theirs.
+        """
+        with self.lock:
+            return self._reserve(self.state, tokens)
+
+    def _reserve(self, state, tokens):
+        now = time.monotonic()
+        available = min(self.burst, state[0] + (now - state[1]) * self.rate)
+
+        available -= tokens
+        state[0], state[1] = available, now
+
+        if available >= 0:
+            return 0.0
+        return -available / self.rate
+
+    def acquire(self, tokens=1):
+        """
+        Takes `tokens` from the bucket, sleeping until they are
+        available. Returns the seconds waited.
+        """
+        wait = self.reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+class SharedTokenBucket(TokenBucket):
+    """
+    A `TokenBucket` kept in shared memory, it is shared with processes
+    forked after it was created.
+    """
+    def __init__(self, rate, burst=1):
+        super(SharedTokenBucket, self).__init__(rate, burst)
+
+        import multiprocessing
+
+        context = multiprocessing.get_context("fork")
+        self.lock = context.Lock()
+        self.state = context.RawArray('d', self.state)
+
+
+def rate_limit(items_per_sec=None, burst=1, limiter=None):
+    """
+    Returns a pipe that passes items through at no more than
+    `items_per_sec`, allowing bursts of up to `burst` items.
+
+    :param limiter: A `TokenBucket` to use instead of creating one,
+                    pipes given the same limiter share its rate.
+    """
+    if limiter is None:
+        if items_per_sec is None:
+            raise ValueError("rate_limit requires items_per_sec or a limiter")
+        limiter = TokenBucket(items_per_sec, burst)
+
+    limit_metrics = metrics.Metrics()
+
+    def rate_limit(pipe):
+        acquire = limiter.acquire
+        add = limit_metrics.add
+
+        for item in pipe:
+            waited = acquire()
+            if waited:
+                add("throttled", waited)
+                add("throttled_items")
+            yield item
+
+    rate_limit.input_name = Generic()
+    rate_limit.input_type = Generic()
+    rate_limit.output_name = Generic()
+    rate_limit.output_type = Generic()
+    rate_limit.per_item = True
+    rate_limit.limiter = limiter
+    rate_limit.metrics = limit_metrics
+    return rate_limit
@@ -0,0 +1,162 @@
+"""
+Recording and replaying the items that flow through a pipeline.
+
+A recorder placed between two pipes writes every item, together with
+its state and the time it passed, to a log file:
+
+    pype.pipeline(source, parse, replay.recorder("parse.log"), enrich)
+
+A player is a source that replays such a log, either as fast as
+possible or at the original timing:
+
+    pype.pipeline(replay.player("parse.log", speed=1.0), enrich)
+
+`benchmark` replays a log through a single stage in isolation and
+reports its throughput, to compare a stage against real traffic across
+library versions.
+
+The log is a sequence of zlib compressed chunks of pickled
+(seconds since the first item, state, item) tuples.
+"""
+import pickle
+import struct
+import time
+import zlib
+
+from .base import Generic, PipeError
+
+
+MAGIC = b"PYPEREC1"
+# Compressed size and amount of records of a chunk.
+chunk_header = struct.Struct("<II")
+
+
+def recorder(filename, chunk_size=1024, level=1):
+    """
+    Returns a pipe that passes its items through and records them,
+    with their state, to `filename`.
+
+    :param chunk_size: Amount of records compressed and written at once.
+    :param level: The zlib compression level.
+    """
+    def recorder(pipe):
+        now = time.monotonic
+        chunk = []
+
+        with open(filename, "wb") as f:
+            f.write(MAGIC)
+
+            def flush():
+                data = zlib.compress(pickle.dumps(chunk, pickle.HIGHEST_PROTOCOL), level)
+                f.write(chunk_header.pack(len(data), len(chunk)))
+                f.write(data)
+                del chunk[:]
+
+            start = None
+            try:
+                for state, item in pipe:
+                    if start is None:
+                        start = now()
+
+                    chunk.append((now() - start, state, item))
+                    if len(chunk) >= chunk_size:
+                        flush()
+
+                    yield state, item
+            finally:
+                if chunk:
+                    flush()
+
+    recorder.input_name = Generic()
+    recorder.input_type = Generic()
+    recorder.output_name = Generic()
+    recorder.output_type = Generic()
+    recorder.pass_state = True
+    recorder.per_item = True
+    return recorder
+
+
+def read(filename):
+    """
+    Yields the (seconds since the first item, state, item) records of
+    the log `filename`.
+
+    raises `PipeError` if the file is not a log.
+    """
+    with open(filename, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise PipeError("{:s} is not a pipeline recording", filename)
+
+        while True:
+            header = f.read(chunk_header.size)
+            if len(header) < chunk_header.size:
+                return
+
+            size, _ = chunk_header.unpack(header)
+            for record in pickle.loads(zlib.decompress(f.read(size))):
+                yield record
+
+
+def player(filename, speed=None):
+    """
+    Returns a source pipe that replays the log `filename`.
+
+    :param speed: None to replay as fast as possible, otherwise the
+                  items are replayed at the original timing sped up by
+                  `speed`, 1.0 being the original speed.
+    """
+    def player(pipe):
+        if speed is None:
+            for _, state, item in read(filename):
+                yield state, item
+            return
+
+        now, sleep = time.monotonic, time.sleep
+        start = now()
+        for offset, state, item in read(filename):
+            wait = start + offset / speed - now()
+            if wait > 0:
+                sleep(wait)
+            yield state, item
+
+    player.output_name = Generic()
+    player.output_type = Generic()
+    player.pass_state = True
+    return player
+
+
+def benchmark(filename, *pipes, **config):
+    """
+    Replays the log `filename` through `pipes` as fast as possible and
+    returns a dictionary with the amount of "items" replayed, the
+    amount "produced" by the last pipe, the "seconds" it took and
+    "items_per_sec".
+
+    The log is read into memory before timing starts, so only the
+    pipes are measured.
+    """
+    from . import engine
+
+    records = [(state, item) for _, state, item in read(filename)]
+
+    def recorded(pipe):
+        return iter(records)
+
+    recorded.output_name = Generic()
+    recorded.output_type = Generic()
+    recorded.pass_state = True
+
+    stages = engine.resolve_pipeline((recorded,) + pipes)
+
+    start = time.perf_counter()
+    produced = 0
+    for _ in engine.connect_pipeline(stages, config):
+        produced += 1
+    seconds = time.perf_counter() - start
+
+    return {
+        "items": len(records),
+        "produced": produced,
+        "seconds": seconds,
+        "items_per_sec": len(records) / seconds if seconds else float("inf"),
+    }
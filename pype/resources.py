@@ -0,0 +1,228 @@
+"""
+Shared resources such as connection pools for pipes.
+
+Pipes declare the resources they need through the `config` decorator,
+the argument is filled with a `Pool` of the resource when the pipe is
+called:
+
+    @pype.config(resources={"pool": resources.resource(connect, size=4)})
+    def fetch(pipe, pool):
+        for url in pipe:
+            with pool.lease() as connection:
+                yield get(connection, url)
+
+All pipelines created while a `Scope` is active share the same pool of
+each resource, and the pools are closed when the scope exits:
+
+    with resources.Scope():
+        for item in pype.pipeline(source, fetch):
+            ...
+
+Pipelines created outside of any scope use a default scope that is
+closed when the interpreter exits.
+"""
+import contextlib
+import os
+import threading
+
+from . import metrics
+from .base import PipeError
+
+
+class resource(object):
+    """
+    Declaration of a pooled resource.
+
+    :param factory: Called without arguments to create a resource.
+    :param size: The maximum amount of resources in the pool.
+    :param close: Called with a resource when the pool is closed.
+    """
+    def __init__(self, factory, size=1, close=None):
+        super(resource, self).__init__()
+
+        self.factory = factory
+        self.size = size
+        self.close = close
+
+    def create(self):
+        return Pool(self.factory, self.size, self.close)
+
+    def __repr__(self):
+        return "resource({!r}, size={!r})".format(self.factory, self.size)
+
+
+class Pool(object):
+    """
+    A pool of at most `size` resources created by `factory`.
+
+    Resources are created on demand, and are thread-safe to lease.
+    When used from a forked process the pool starts over with new
+    resources, the ones of the parent process are left alone.
+    """
+    def __init__(self, factory, size=1, close=None):
+        super(Pool, self).__init__()
+
+        self.factory = factory
+        self.size = size
+        self.closer = close
+        self.metrics = metrics.Metrics()
+
+        self.condition = threading.Condition()
+        self._reset()
+
+    def _reset(self):
+        self.pid = os.getpid()
+        self.idle = []
+        self.created = 0
+        self.closed = False
+
+    def acquire(self):
+        """
+        Returns a resource from the pool, waits if all of them are in use.
+
+        raises `PipeError` if the pool was closed.
+        """
+        with self.condition:
+            if self.pid != os.getpid():
+                self._reset()
+
+            while not self.idle and self.created >= self.size and not self.closed:
+                self.metrics.add("waits")
+                self.condition.wait()
+
+            if self.closed:
+                raise PipeError("Pool of {!r} is closed", self.factory)
+
+            if self.idle:
+                return self.idle.pop()
+
+            self.created += 1
+
+        try:
+            created = self.factory()
+        except BaseException:
+            with self.condition:
+                self.created -= 1
+                self.condition.notify()
+            raise
+
+        self.metrics.add("created")
+        return created
+
+    def release(self, leased):
+        """
+        Returns a resource acquired with `acquire` to the pool.
+        """
+        with self.condition:
+            if self.pid != os.getpid():
+                return
+
+            if self.closed:
+                self.created -= 1
+                self._close(leased)
+                return
+
+            self.idle.append(leased)
+            self.condition.notify()
+
+    @contextlib.contextmanager
+    def lease(self):
+        """
+        Context manager that acquires a resource and releases it on exit.
+        """
+        leased = self.acquire()
+        try:
+            yield leased
+        finally:
+            self.release(leased)
+
+    def close(self):
+        """
+        Closes all idle resources, resources in use are closed when
+        they are released.
+        """
+        with self.condition:
+            if self.pid != os.getpid():
+                return
+
+            self.closed = True
+            idle, self.idle = self.idle, []
+            self.created -= len(idle)
+            self.condition.notify_all()
+
+        for leased in idle:
+            self._close(leased)
+
+    def _close(self, leased):
+        if self.closer is not None:
+            self.closer(leased)
+
+
+class Scope(object):
+    """
+    Holds the pools of all resources used by pipelines created while
+    the scope is active. Scopes can be nested, the innermost one is
+    used.
+    """
+    def __init__(self):
+        super(Scope, self).__init__()
+
+        self.lock = threading.Lock()
+        self.pools = {}
+
+    def get(self, declaration):
+        """
+        Returns the pool of the resource `declaration`, creating it
+        the first time.
+        """
+        with self.lock:
+            try:
+                return self.pools[declaration]
+            except KeyError:
+                pool = self.pools[declaration] = declaration.create()
+                return pool
+
+    def close(self):
+        """
+        Closes all pools of this scope.
+        """
+        with self.lock:
+            pools, self.pools = list(self.pools.values()), {}
+
+        for pool in pools:
+            pool.close()
+
+    def __enter__(self):
+        with scopes_lock:
+            scopes.append(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        with scopes_lock:
+            scopes.remove(self)
+        self.close()
+
+
+# Active scopes, the last one is used.
+scopes = []
+scopes_lock = threading.Lock()
+default_scope = None
+
+
+def current():
+    """
+    Returns the active `Scope`.
+    """
+    global default_scope
+
+    with scopes_lock:
+        if scopes:
+            return scopes[-1]
+
+        if default_scope is None:
+            import atexit
+
+            default_scope = Scope()
+            atexit.register(default_scope.close)
+
+        return default_scope
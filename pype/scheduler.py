@@ -0,0 +1,311 @@
+"""
+Running many small pipelines on a fixed amount of threads.
+
+A `Scheduler` steps the pipelines submitted to it in time slices on a
+pool of worker threads, so the amount of threads stays the same no
+matter how many pipelines run at once:
+
+    with scheduler.Scheduler(workers=4) as s:
+        tasks = [s.submit(source, parse, name=tenant, weight=plan.weight,
+                          sink=outputs[tenant].append, config={"tenant": tenant})
+                 for tenant, plan in tenants.items()]
+
+        for task in tasks:
+            task.result()
+
+Each slice takes up to `slice_items` items from a pipeline, or as many
+as fit in `slice_time` seconds. With the "fair" policy the pipeline
+that received the least run time relative to its `weight` goes next,
+pipelines with a higher `priority` always go before lower ones. The
+"round-robin" policy runs the pipelines in turn.
+
+Pipes run this way should not block for long, a blocked pipe holds
+on to a worker thread. Pipes using `buffered` start threads of their
+own and defeat the purpose.
+
+Every task keeps "slices", "items", "run_time" and "wait_time" in its
+`metrics`, `Scheduler.snapshot` returns them for all unfinished tasks
+together with the fairness of the run time given out.
+"""
+import heapq
+import itertools
+import threading
+import time
+
+from . import engine
+from . import metrics
+
+
+class Task(object):
+    """
+    A pipeline submitted to a `Scheduler`.
+
+    `status` is one of "ready", "running", "done", "failed", "quota"
+    or "cancelled".
+    """
+    def __init__(self, pipeline, name, weight, priority, quota_items,
+                 quota_seconds, sink):
+        super(Task, self).__init__()
+
+        self.pipeline = pipeline
+        self.iterator = iter(pipeline)
+        self.name = name
+        self.weight = float(weight)
+        self.priority = priority
+        self.quota_items = quota_items
+        self.quota_seconds = quota_seconds
+
+        self.outputs = [] if sink is None else None
+        self.sink = self.outputs.append if sink is None else sink
+
+        self.status = "ready"
+        self.error = None
+        self.finished = threading.Event()
+
+        self.metrics = metrics.Metrics()
+        self.items = 0
+        self.run_time = 0.0
+        self.max_wait = 0.0
+        self.metrics.gauge("max_wait", lambda: self.max_wait)
+
+        # Virtual time, run time divided by weight, used by the fair policy.
+        self.virtual_time = 0.0
+        self.enqueued = time.perf_counter()
+        self.cancelled = False
+
+    def run_slice(self, slice_items, slice_time):
+        """
+        Takes up to `slice_items` items from the pipeline, or as many as
+        fit in `slice_time` seconds, and passes them to the sink.
+        """
+        clock = time.perf_counter
+        start = clock()
+
+        waited = start - self.enqueued
+        self.max_wait = max(self.max_wait, waited)
+        self.metrics.add("wait_time", waited)
+
+        if self.cancelled:
+            self._finish("cancelled")
+            return
+
+        self.status = "running"
+        next_item, sink = self.iterator.__next__, self.sink
+
+        limit = slice_items
+        if self.quota_items is not None:
+            limit = min(limit, self.quota_items - self.items)
+
+        deadline = start + slice_time if slice_time is not None else None
+
+        count = 0
+        try:
+            while count < limit:
+                sink(next_item())
+                count += 1
+
+                if deadline is not None and clock() >= deadline:
+                    break
+        except StopIteration:
+            self._finish("done")
+        except BaseException as error:
+            self.error = error
+            self._finish("failed")
+
+        elapsed = clock() - start
+        self.items += count
+        self.run_time += elapsed
+        self.virtual_time += elapsed / self.weight
+
+        self.metrics.add("slices")
+        self.metrics.add("items", count)
+        self.metrics.add("run_time", elapsed)
+
+        if self.status == "running":
+            if self.quota_items is not None and self.items >= self.quota_items:
+                self._finish("quota")
+            elif self.quota_seconds is not None and self.run_time >= self.quota_seconds:
+                self._finish("quota")
+            else:
+                self.status = "ready"
+                self.enqueued = clock()
+
+    def _finish(self, status):
+        self.status = status
+        if status != "done":
+            self.pipeline.close()
+        self.finished.set()
+
+    @property
+    def done(self):
+        return self.finished.is_set()
+
+    def cancel(self):
+        """
+        Stops the task before its next slice.
+        """
+        self.cancelled = True
+
+    def result(self, timeout=None):
+        """
+        Waits for the task to finish, returns the list of outputs if
+        no sink was given.
+
+        raises the exception of the pipeline if it failed, and
+        `TimeoutError` if it didn't finish within `timeout` seconds.
+        """
+        if not self.finished.wait(timeout):
+            raise TimeoutError("Task {!r} did not finish in time".format(self.name))
+
+        if self.error is not None:
+            raise self.error
+        return self.outputs
+
+    def __repr__(self):
+        return "Task({!r}, {:s})".format(self.name, self.status)
+
+
+class Scheduler(object):
+    """
+    Runs submitted pipelines on `workers` threads in slices.
+
+    :param slice_items: The most items taken from a pipeline per slice.
+    :param slice_time: The most seconds spent on a pipeline per slice,
+                       checked after every item. None for no limit.
+    :param policy: "fair" for weighted fair queuing with priorities,
+                   or "round-robin".
+    """
+    def __init__(self, workers=4, slice_items=64, slice_time=0.01, policy="fair"):
+        super(Scheduler, self).__init__()
+
+        if policy not in ("fair", "round-robin"):
+            raise ValueError("Unknown policy {!r}, expected 'fair' or 'round-robin'".format(policy))
+
+        self.slice_items = slice_items
+        self.slice_time = slice_time
+        self.policy = policy
+
+        self.condition = threading.Condition()
+        self.ready = []
+        self.tasks = []
+        self.closed = False
+        self.order = itertools.count()
+        self.names = itertools.count()
+        # Virtual time of the last task started, new tasks start here
+        # so they don't get to catch up on time before they existed.
+        self.virtual_time = 0.0
+
+        self.threads = []
+        for _ in range(workers):
+            thread = threading.Thread(target=self._work)
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+
+    def submit(self, *pipes, name=None, weight=1.0, priority=0, quota_items=None,
+               quota_seconds=None, sink=None, config=None):
+        """
+        Creates a pipeline of `pipes` configured with the dictionary
+        `config` (see `pype.config`) and schedules it, returns its `Task`.
+
+        :param name: Name of the task in stats, defaults to a number.
+        :param weight: Share of run time relative to other tasks.
+        :param priority: Tasks with a higher priority run first.
+        :param quota_items: Stop the task after this many items.
+        :param quota_seconds: Stop the task after this much run time.
+        :param sink: Called with every output item, by default the outputs
+                     are collected and returned by `Task.result`.
+        """
+        if weight <= 0:
+            raise ValueError("weight must be positive")
+
+        task = Task(engine.Pipeline(pipes, config), name, weight, priority,
+                    quota_items, quota_seconds, sink)
+
+        with self.condition:
+            if self.closed:
+                raise RuntimeError("Scheduler is closed")
+
+            if task.name is None:
+                task.name = str(next(self.names))
+
+            task.virtual_time = self.virtual_time
+            self.tasks.append(task)
+            self._push(task)
+            self.condition.notify()
+
+        return task
+
+    def _push(self, task):
+        if self.policy == "fair":
+            entry = (-task.priority, task.virtual_time, next(self.order), task)
+        else:
+            entry = (-task.priority, next(self.order), 0, task)
+        heapq.heappush(self.ready, entry)
+
+    def _work(self):
+        while True:
+            with self.condition:
+                while not self.ready and not self.closed:
+                    self.condition.wait()
+
+                if not self.ready:
+                    return
+
+                task = heapq.heappop(self.ready)[-1]
+                self.virtual_time = max(self.virtual_time, task.virtual_time)
+
+            task.run_slice(self.slice_items, self.slice_time)
+
+            with self.condition:
+                if task.done:
+                    self.tasks.remove(task)
+                else:
+                    self._push(task)
+                    self.condition.notify()
+
+    def snapshot(self):
+        """
+        Returns the stats of the unfinished tasks by name, and the
+        fairness of the run time given to them relative to their
+        weights as Jain's index, 1.0 being perfectly fair.
+
+        Finished tasks keep their stats in `Task.metrics`.
+        """
+        with self.condition:
+            tasks = list(self.tasks)
+
+        stats = {}
+        for task in tasks:
+            task_stats = task.metrics.snapshot()
+            task_stats.update(status=task.status, weight=task.weight,
+                              priority=task.priority)
+            slices = task_stats.get("slices", 0)
+            task_stats["mean_wait"] = task_stats.get("wait_time", 0.0) / slices if slices else 0.0
+            stats[task.name] = task_stats
+
+        shares = [task.run_time / task.weight for task in tasks]
+        fairness = 1.0
+        if shares and any(shares):
+            fairness = sum(shares) ** 2 / (len(shares) * sum(share ** 2 for share in shares))
+
+        return {"tasks": stats, "fairness": fairness}
+
+    def close(self, wait=True):
+        """
+        Stops accepting tasks, the workers exit once all submitted
+        tasks are finished. Waits for that if `wait` is true.
+        """
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+        if wait:
+            for thread in self.threads:
+                thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
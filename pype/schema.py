@@ -0,0 +1,304 @@
+"""
+Record schemas for pipes.
+
+A `Schema` describes records by their field names and types, and can
+be used as the `output_type` and `input_type` of pipes:
+
+    point = schema.Schema("point", [("x", float), ("y", float)])
+
+    @pype.output("points", point)
+    def points(pipe):
+        for x, y in read():
+            yield point.record(x, y)
+
+Schemas are verified structurally when a pipeline is created, a pipe
+accepts the output of another pipe if every field it asks for exists
+in the output with a compatible type. Extra fields are allowed.
+
+Records made with `Schema.record` use `__slots__`, they take less
+memory than dictionaries and have faster field access. Batches of
+records can be stored per column with `Schema.columns`, which keeps
+numeric fields in `array`s.
+"""
+from .base import Generic
+
+
+# Typecodes used for columns of primitive fields.
+array_typecodes = {
+    int: 'q',
+    float: 'd',
+    bool: 'b',
+}
+
+# Struct formats of primitive fields, see `transport.StructCodec`.
+struct_formats = {
+    int: 'q',
+    float: 'd',
+    bool: '?',
+}
+
+
+class Schema(object):
+    """
+    Describes a record with the ordered `fields`, a sequence of
+    (name, type) tuples.
+
+    Two schemas are equal if they have the same fields, the name is
+    only used for display.
+    """
+    def __init__(self, name, fields):
+        super(Schema, self).__init__()
+
+        self.name = name
+        self.fields = tuple((field, type) for field, type in fields)
+        self.names = tuple(field for field, _ in self.fields)
+
+        if len(set(self.names)) != len(self.names):
+            raise ValueError("Duplicate field names in schema {!r}".format(name))
+
+        self._record = None
+
+    def field_type(self, name):
+        """
+        Returns the type of field `name`, raises `KeyError` if there
+        is no such field.
+        """
+        for field, type in self.fields:
+            if field == name:
+                return type
+        raise KeyError(name)
+
+    def accepts(self, other):
+        """
+        Returns True if records of `other` can be used where records
+        of this schema are expected.
+        """
+        if not isinstance(other, Schema):
+            return False
+
+        provided = dict(other.fields)
+        for field, type in self.fields:
+            try:
+                other_type = provided[field]
+            except KeyError:
+                return False
+
+            if not compatible(other_type, type):
+                return False
+
+        return True
+
+    @property
+    def record(self):
+        """
+        The record class of this schema, created on first use.
+        """
+        if self._record is None:
+            self._record = make_record(self)
+        return self._record
+
+    @property
+    def struct_format(self):
+        """
+        The `struct` format of a record, None if any field is not
+        `int`, `float` or `bool`.
+        """
+        try:
+            return ''.join(struct_formats[type] for _, type in self.fields)
+        except (KeyError, TypeError):
+            return None
+
+    def columns(self, records):
+        """
+        Returns a `Columns` batch holding `records`.
+        """
+        return Columns.from_records(self, records)
+
+    def __eq__(self, other):
+        return isinstance(other, Schema) and self.fields == other.fields
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self.fields)
+
+    def __reduce__(self):
+        return Schema, (self.name, self.fields)
+
+    def __str__(self):
+        return "{:s}({:s})".format(self.name, ", ".join(
+            "{:s}: {:s}".format(field, getattr(type, '__name__', str(type)))
+            for field, type in self.fields))
+
+    def __repr__(self):
+        return "Schema({!r}, {!r})".format(self.name, self.fields)
+
+
+def compatible(provided, expected):
+    """
+    Returns True if a field of type `provided` can be used as a field
+    of type `expected`.
+    """
+    if provided == expected:
+        return True
+
+    if isinstance(provided, Generic) or isinstance(expected, Generic):
+        return True
+
+    if isinstance(expected, Schema):
+        return expected.accepts(provided)
+
+    try:
+        return issubclass(provided, expected)
+    except TypeError:
+        return False
+
+
+class Record(object):
+    """
+    Base class of the record classes made by `Schema.record`.
+    """
+    __slots__ = ()
+
+    _schema = None
+
+    def __init__(self, *values, **named):
+        names = self._schema.names
+        if len(values) > len(names):
+            raise TypeError("{:s} takes {:d} fields, got {:d}".format(
+                self._schema.name, len(names), len(values)))
+
+        for name, value in zip(names, values):
+            object.__setattr__(self, name, value)
+
+        for name in names[len(values):]:
+            try:
+                object.__setattr__(self, name, named.pop(name))
+            except KeyError:
+                raise TypeError("{:s} is missing field {!r}".format(
+                    self._schema.name, name))
+
+        if named:
+            raise TypeError("{:s} has no fields {!r}".format(
+                self._schema.name, sorted(named)))
+
+    @classmethod
+    def _make(cls, values):
+        """
+        Creates a record from an iterable of values in field order.
+        """
+        record = cls.__new__(cls)
+        for name, value in zip(cls._schema.names, values):
+            object.__setattr__(record, name, value)
+        return record
+
+    def _asdict(self):
+        return {name: getattr(self, name) for name in self._schema.names}
+
+    def __iter__(self):
+        for name in self._schema.names:
+            yield getattr(self, name)
+
+    def __len__(self):
+        return len(self._schema.names)
+
+    def __eq__(self, other):
+        if isinstance(other, Record):
+            return self._schema == other._schema and tuple(self) == tuple(other)
+        return NotImplemented
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    __hash__ = None
+
+    def __reduce__(self):
+        return rebuild_record, (self._schema, tuple(self))
+
+    def __repr__(self):
+        return "{:s}({:s})".format(self._schema.name, ", ".join(
+            "{:s}={!r}".format(name, getattr(self, name)) for name in self._schema.names))
+
+
+def make_record(schema):
+    """
+    Returns a new `Record` subclass with slots for the fields of
+    `schema`.
+    """
+    return type(schema.name, (Record,), {
+        '__slots__': schema.names,
+        '_schema': schema,
+    })
+
+
+def rebuild_record(schema, values):
+    return schema.record._make(values)
+
+
+class Columns(object):
+    """
+    A batch of records of `schema` stored per column. Fields of type
+    `int`, `float` or `bool` are kept in an `array`, other fields in
+    a list.
+
+    Iterating gives the records of the batch.
+    """
+    def __init__(self, schema, columns):
+        super(Columns, self).__init__()
+
+        self.schema = schema
+        self.columns = columns
+
+    @classmethod
+    def from_records(cls, schema, records):
+        import array
+
+        columns = {}
+        for field, field_type in schema.fields:
+            try:
+                typecode = array_typecodes.get(field_type)
+            except TypeError:
+                typecode = None
+            columns[field] = array.array(typecode) if typecode else []
+
+        appends = [columns[field].append for field in schema.names]
+        for record in records:
+            for append, value in zip(appends, record):
+                append(value)
+
+        return cls(schema, columns)
+
+    def column(self, name):
+        """
+        Returns the column of field `name`.
+        """
+        return self.columns[name]
+
+    def _record_columns(self):
+        columns = []
+        for field, type in self.schema.fields:
+            column = self.columns[field]
+            if type is bool:
+                column = map(bool, column)
+            columns.append(column)
+        return columns
+
+    def __getitem__(self, index):
+        return self.schema.record._make(
+            bool(self.columns[field][index]) if type is bool else self.columns[field][index]
+            for field, type in self.schema.fields)
+
+    def __iter__(self):
+        make = self.schema.record._make
+        for values in zip(*self._record_columns()):
+            yield make(values)
+
+    def __len__(self):
+        if not self.schema.names:
+            return 0
+        return len(self.columns[self.schema.names[0]])
+
+    def __repr__(self):
+        return "Columns({!s}, {:d} records)".format(self.schema, len(self))
@@ -0,0 +1,195 @@
+"""
+Sinks that write the items of a pipeline in batches.
+
+Writing one item at a time to a database or file is slow, a batched
+sink collects items and hands them to a bulk writer such as
+`executemany` in one go:
+
+    sink = sinks.batched_sink(write_many, batch_size=1000, flush_interval=1.0,
+                              commit=connection.commit)
+
+    for committed in pype.pipeline(source, parse, sink):
+        checkpoint()
+
+The writer runs on a background thread while the next batch is being
+filled, so the pipeline keeps producing while a batch is committed.
+Each time a batch is committed the sink yields the amount of items in
+it; everything passed to the sink before that point is committed.
+"""
+import threading
+
+from . import metrics
+from .base import Generic
+
+
+def batched_sink(write_many, batch_size=1000, flush_interval=None,
+                 commit=None, rollback=None, close=None):
+    """
+    Returns a pipe that passes its input in batches to `write_many`.
+
+    :param write_many: Called with a list of items to write.
+    :param batch_size: The amount of items in a batch.
+    :param flush_interval: Seconds after which a batch is written even
+                           if it isn't full yet. None to only write full batches.
+    :param commit: Called after every successful `write_many`.
+    :param rollback: Called when `write_many` or `commit` raised, or
+                     when the pipeline stopped before its input ran out.
+    :param close: Called once the sink is done.
+
+    Pending items are only written once the input of the sink runs
+    out. If the input raises or the sink is closed early they are
+    dropped and `rollback` is called instead.
+
+    All of these are called from the same background thread.
+    """
+    sink_metrics = metrics.Metrics()
+
+    def batched_sink(pipe):
+        import collections
+
+        condition = threading.Condition()
+        # Items waiting to be written, one batch is filled while the
+        # one before it is written.
+        pending = []
+        committed = collections.deque()
+        done = [False]
+        # Set when the input failed or the sink was closed early.
+        aborted = [False]
+        errors = []
+
+        def writer():
+            import time
+
+            try:
+                while True:
+                    with condition:
+                        while len(pending) < batch_size and not done[0]:
+                            if not condition.wait(flush_interval) and pending:
+                                # Waited the full interval, flush what we have.
+                                break
+
+                        if aborted[0]:
+                            del pending[:]
+                            break
+
+                        if not pending and done[0]:
+                            return
+
+                        batch = pending[:batch_size]
+                        del pending[:batch_size]
+                        condition.notify_all()
+
+                    if not batch:
+                        continue
+
+                    start = time.perf_counter()
+                    try:
+                        write_many(batch)
+                        if commit is not None:
+                            commit()
+                    except BaseException:
+                        if rollback is not None:
+                            rollback()
+                        raise
+
+                    sink_metrics.add("batches")
+                    sink_metrics.add("items", len(batch))
+                    sink_metrics.add("time", time.perf_counter() - start)
+
+                    committed.append(len(batch))
+
+                if rollback is not None:
+                    rollback()
+            except BaseException as error:
+                errors.append(error)
+                with condition:
+                    condition.notify_all()
+            finally:
+                if close is not None:
+                    close()
+
+        thread = threading.Thread(target=writer)
+        thread.daemon = True
+        thread.start()
+
+        exhausted = False
+        try:
+            for item in pipe:
+                with condition:
+                    # Wait when a full batch is already waiting on the writer.
+                    while len(pending) >= 2 * batch_size and not errors:
+                        condition.wait()
+
+                    if errors:
+                        break
+
+                    pending.append(item)
+                    if len(pending) >= batch_size:
+                        condition.notify_all()
+
+                while committed:
+                    yield committed.popleft()
+            else:
+                exhausted = True
+        finally:
+            with condition:
+                done[0] = True
+                if not exhausted:
+                    aborted[0] = True
+                condition.notify_all()
+
+            thread.join()
+
+        if errors:
+            raise errors[0]
+
+        while committed:
+            yield committed.popleft()
+
+    batched_sink.input_name = Generic()
+    batched_sink.input_type = Generic()
+    batched_sink.output_name = "committed"
+    batched_sink.output_type = int
+    batched_sink.metrics = sink_metrics
+    return batched_sink
+
+
+def sqlite_sink(database, table, columns, batch_size=1000, flush_interval=None):
+    """
+    Returns a batched sink that inserts items into `table` of the
+    SQLite `database`. Items are sequences of values for `columns`.
+
+    Every batch is inserted with `executemany` and committed as one
+    transaction.
+    """
+    import sqlite3
+
+    statement = "INSERT INTO {:s} ({:s}) VALUES ({:s})".format(
+        table, ", ".join(columns), ", ".join("?" * len(columns)))
+
+    # sqlite3 connections can only be used by the thread that made
+    # them, so the connection is made by the writer on first use.
+    connection = []
+
+    def connect():
+        if not connection:
+            connection.append(sqlite3.connect(database))
+        return connection[0]
+
+    def write_many(batch):
+        connect().executemany(statement, batch)
+
+    def commit():
+        connect().commit()
+
+    def rollback():
+        connect().rollback()
+
+    def close():
+        if connection:
+            connection.pop().close()
+
+    sink = batched_sink(write_many, batch_size, flush_interval,
+                        commit=commit, rollback=rollback, close=close)
+    sink.__name__ = "sqlite_sink"
+    return sink
@@ -0,0 +1,210 @@
+"""
+Splittable sources and reading them in parallel.
+
+A splittable source is a source pipe that can divide its input into
+splits, such as byte ranges of a file aligned to records or ranges of
+row ids, and read a single split:
+
+    `source.splits(count)`: Returns a list of about `count` picklable
+                            split descriptions.
+    `source.read(split)`: Returns an iterator over the items of `split`.
+
+Used as a normal source it reads all its splits in order. `parallel`
+runs a copy of the pipes after the source for every split, on several
+workers at once, and merges their output:
+
+    log = sources.lines(["a.log", "b.log"])
+
+    for record in sources.parallel(log, parse, enrich, workers=8):
+        ...
+
+`source` makes a splittable source out of two such functions, `lines`
+is a splittable source of the lines of text files.
+"""
+import itertools
+
+from . import engine
+from .base import Generic
+
+
+def source(splits, read, name=Generic(), type=Generic()):
+    """
+    Returns a splittable source pipe, see the module documentation
+    for `splits` and `read`. `name` and `type` are the output name
+    and type of the source.
+    """
+    def source(pipe):
+        for split in splits(1):
+            for item in read(split):
+                yield item
+
+    source.splits = splits
+    source.read = read
+    source.output_name = name
+    source.output_type = type
+    return source
+
+
+def lines(filenames, encoding="utf-8", name="line"):
+    """
+    Returns a splittable source of the lines of the files
+    `filenames`, without line endings.
+
+    Splits are byte ranges, a line belongs to the split its first
+    byte is in. Every file has at least one split.
+    """
+    import os
+
+    if isinstance(filenames, str):
+        filenames = [filenames]
+    filenames = list(filenames)
+
+    def splits(count):
+        sizes = [os.path.getsize(filename) for filename in filenames]
+        split_size = max(1, -(-sum(sizes) // max(1, count)))
+
+        ranges = []
+        for filename, size in zip(filenames, sizes):
+            starts = range(0, size, split_size) if size else [0]
+            ranges.extend((filename, start, min(start + split_size, size))
+                          for start in starts)
+        return ranges
+
+    def read(split):
+        filename, start, end = split
+
+        with open(filename, "rb") as f:
+            position = start
+            if start > 0:
+                # The line started before us belongs to the split before.
+                f.seek(start - 1)
+                position = start - 1 + len(f.readline())
+
+            readline = f.readline
+            while position < end:
+                line = readline()
+                if not line:
+                    return
+
+                position += len(line)
+                yield line.rstrip(b"\r\n").decode(encoding)
+
+    return source(splits, read, name, str)
+
+
+def parallel(source, *pipes, workers=4, ordered=False, executor="thread",
+             buffersize=16, chunksize=256, config=None):
+    """
+    Reads the splittable `source` in `workers` splits, and runs `pipes`
+    on each split in parallel. Returns an iterator over the output of
+    all splits.
+
+    :param ordered: Keep the output in the order of the splits, later
+                    splits wait on earlier ones when their buffer is full.
+    :param executor: "thread" to run the pipes in the worker threads, or
+                     any other executor of `buffered` to run them in,
+                     such as "process".
+    :param buffersize: Chunks of output buffered per split if ordered,
+                       or `buffersize` * `workers` chunks in total.
+    :param chunksize: Items per chunk.
+
+    The dictionary `config` is passed to the pipes like the keyword
+    arguments of `pype.pipeline`, see `pype.config`.
+    """
+    import queue
+    import threading
+    from . import base, executors, util
+
+    config = dict(config or {})
+
+    # Verifies the pipes once for all splits.
+    engine.resolve_pipeline((source,) + pipes)
+
+    splits = list(source.splits(workers))
+
+    def run(split):
+        def read(previous):
+            return source.read(split)
+
+        base.copy_pipe_variables(source, read)
+        read.__name__ = source.__name__
+
+        stages = engine.resolve_pipeline((read,) + pipes)
+        if executor == "thread":
+            return engine.connect_pipeline(stages, config)
+
+        def segment(previous):
+            return engine.connect_pipeline(stages, config)
+
+        base.copy_pipe_variables(stages[-1], segment)
+        segment.__name__ = "segment"
+        return util.buffered(buffersize, chunksize, executor=executor)(segment)(None)
+
+    if ordered:
+        outputs = [queue.Queue(maxsize=buffersize) for _ in splits]
+    else:
+        shared = queue.Queue(maxsize=buffersize * workers)
+        outputs = [shared] * len(splits)
+
+    end = object()
+    stopped = threading.Event()
+    next_split = iter(range(len(splits))).__next__
+    lock = threading.Lock()
+
+    def put(output, message):
+        while not stopped.is_set():
+            try:
+                output.put(message, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def work():
+        while True:
+            with lock:
+                try:
+                    index = next_split()
+                except StopIteration:
+                    return
+
+            output = outputs[index]
+            try:
+                iterator = iter(run(splits[index]))
+                while True:
+                    chunk = list(itertools.islice(iterator, chunksize))
+                    if not chunk:
+                        break
+                    if not put(output, chunk):
+                        return
+            except BaseException as error:
+                put(output, executors.Raised(error))
+                return
+
+            if not put(output, end):
+                return
+
+    for _ in range(min(workers, len(splits))):
+        util.run(work)
+
+    def merged():
+        try:
+            if ordered:
+                pending = [(output, 1) for output in outputs]
+            else:
+                pending = [(shared, len(splits))] if splits else []
+
+            for output, ends in pending:
+                while ends:
+                    chunk = output.get()
+                    if chunk is end:
+                        ends -= 1
+                    elif chunk.__class__ is executors.Raised:
+                        raise chunk.error
+                    else:
+                        for item in chunk:
+                            yield item
+        finally:
+            stopped.set()
+
+    return merged()
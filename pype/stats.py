@@ -0,0 +1,139 @@
+"""
+Stats endpoints for running pipelines.
+
+Pipelines registered with a `Registry` can be inspected by operators
+over HTTP or a Unix socket while they run:
+
+    p = pype.Pipeline((source, parse, sink), config, counters=True)
+    stats.registry.register("ingest", p)
+
+    server = stats.serve_http(("127.0.0.1", 8321))
+
+`GET /` returns the snapshots of all registered pipelines as JSON,
+`GET /<name>` the snapshot of one. The Unix socket server writes the
+JSON of all snapshots to every client that connects.
+
+The servers take any callable returning a JSON encodable value as
+`source`, to publish other stats than those of a registry.
+"""
+import json
+import threading
+import weakref
+
+
+class Registry(object):
+    """
+    Named pipelines to publish stats of. Pipelines are kept by weak
+    reference, and disappear from the registry once they are gone.
+    """
+    def __init__(self):
+        super(Registry, self).__init__()
+
+        self.lock = threading.Lock()
+        self.pipelines = weakref.WeakValueDictionary()
+
+    def register(self, name, pipeline):
+        with self.lock:
+            self.pipelines[name] = pipeline
+
+    def unregister(self, name):
+        with self.lock:
+            self.pipelines.pop(name, None)
+
+    def snapshot(self, name=None):
+        """
+        Returns the snapshots of all pipelines by name, or the snapshot
+        of the pipeline `name`.
+
+        raises `KeyError` if there is no pipeline `name`.
+        """
+        with self.lock:
+            pipelines = dict(self.pipelines)
+
+        if name is not None:
+            return pipelines[name].snapshot()
+
+        return {name: pipeline.snapshot() for name, pipeline in pipelines.items()}
+
+    def __call__(self):
+        return self.snapshot()
+
+
+# The registry used by default.
+registry = Registry()
+
+
+def encode(value):
+    return json.dumps(value, sort_keys=True, default=str).encode("utf-8")
+
+
+def serve_http(address=("127.0.0.1", 0), source=None):
+    """
+    Starts an HTTP server on `address` in a background thread and
+    returns it, the bound address is `server.server_address`. Stop
+    it with `server.shutdown()` and `server.server_close()`.
+
+    :param source: Callable that returns the stats, defaults to the
+                   snapshots of `registry`.
+    """
+    from http import server
+
+    if source is None:
+        source = registry
+
+    class StatsHandler(server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            name = self.path.strip("/")
+            try:
+                if name and isinstance(source, Registry):
+                    body = encode(source.snapshot(name))
+                elif name:
+                    body = encode(source()[name])
+                else:
+                    body = encode(source())
+            except KeyError:
+                self.send_error(404)
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    httpd = server.ThreadingHTTPServer(address, StatsHandler)
+    return _serve(httpd)
+
+
+def serve_unix(path, source=None):
+    """
+    Starts a server on the Unix socket `path` in a background thread
+    and returns it. Every connection gets the JSON encoded stats,
+    after which it is closed.
+
+    :param source: Callable that returns the stats, defaults to the
+                   snapshots of `registry`.
+    """
+    import socketserver
+
+    if source is None:
+        source = registry
+
+    class StatsHandler(socketserver.StreamRequestHandler):
+        def handle(self):
+            self.wfile.write(encode(source()))
+
+    class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        daemon_threads = True
+
+    return _serve(Server(path, StatsHandler))
+
+
+def _serve(server):
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server
@@ -0,0 +1,342 @@
+"""
+Tracing the latency of items through a pipeline.
+
+A `Tracer` passed to `Pipeline` timestamps a sample of the items
+produced by the first pipe, and follows them to the end of the
+pipeline recording how long they spent in each pipe:
+
+    tracer = tracing.Tracer(sample_rate=0.01, export=log_trace)
+
+    for item in pype.Pipeline(pipes, config, tracer=tracer):
+        ...
+
+    tracer.snapshot()
+    {'traces': 120, 'latency': {'p50': 0.0021, 'p99': 0.0134, ...},
+     'stages': {'parse': {'p50': 0.0003, ...}, ...}}
+
+`export` is called with a dictionary for every finished trace, with
+the "latency" from the first pipe to the end and the time spent in
+each pipe as a list of (name, seconds) "stages".
+
+Pipes don't say which of their input items an output belongs to, so
+a trace moves on with the first output of a pipe after the traced
+item went in, like `state` moves from input to output. The trace
+travels next to the items, not inside them or their `State`, and is
+handed over within the thread of a pipe buffered on a thread. Pipes
+buffered on other executors are assumed to produce one output per
+input in order.
+"""
+import collections
+import math
+import threading
+import time
+
+
+class Histogram(object):
+    """
+    A histogram of positive durations in buckets growing by a factor
+    of `1 + precision`, percentiles are accurate to about `precision`
+    relative to their value.
+    """
+    def __init__(self, precision=0.02, minimum=1e-9):
+        super(Histogram, self).__init__()
+
+        self.growth = math.log1p(precision)
+        self.minimum = minimum
+        self.buckets = {}
+        self.count = 0
+        self.total = 0.0
+        self.maximum = 0.0
+
+    def add(self, value):
+        index = int(math.log(max(value, self.minimum) / self.minimum) / self.growth)
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        self.maximum = max(self.maximum, value)
+
+    def percentile(self, percent):
+        """
+        Returns the value below which `percent` of the values are, or
+        0.0 if there are no values.
+        """
+        if not self.count:
+            return 0.0
+
+        rank = percent / 100.0 * self.count
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= rank:
+                # The middle of the bucket.
+                return min(self.minimum * math.exp((index + 0.5) * self.growth), self.maximum)
+        return self.maximum
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else 0.0,
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+            "max": self.maximum,
+        }
+
+
+class Trace(object):
+    """
+    The timestamps of a single traced item.
+    """
+    __slots__ = ("start", "entered", "stages")
+
+    def __init__(self, start):
+        self.start = start
+        self.entered = start
+        self.stages = []
+
+
+class Tracer(object):
+    """
+    Traces `sample_rate` of the items of the pipelines it is passed
+    to, see the module documentation.
+
+    :param export: Called with every finished trace as a dictionary.
+    :param precision: Relative precision of the percentiles.
+    """
+    def __init__(self, sample_rate=0.01, export=None, precision=0.02):
+        super(Tracer, self).__init__()
+
+        if not 0 < sample_rate <= 1:
+            raise ValueError("sample_rate must be above 0 and at most 1")
+
+        # Every `interval`th item is traced, cheaper than a random draw.
+        self.interval = max(1, int(round(1 / sample_rate)))
+        self.export = export
+        self.precision = precision
+
+        self.lock = threading.Lock()
+        self.latency = Histogram(precision)
+        self.stages = collections.OrderedDict()
+
+    def finish(self, trace, end):
+        """
+        Records the finished `trace`, which left the pipeline at `end`.
+        """
+        latency = end - trace.start
+
+        with self.lock:
+            self.latency.add(latency)
+            for name, seconds in trace.stages:
+                histogram = self.stages.get(name)
+                if histogram is None:
+                    histogram = self.stages[name] = Histogram(self.precision)
+                histogram.add(seconds)
+
+        if self.export is not None:
+            self.export({"latency": latency, "stages": trace.stages})
+
+    def snapshot(self):
+        """
+        Returns the amount of traces and the percentiles of their
+        latency and of the time spent in each pipe.
+        """
+        with self.lock:
+            return {
+                "traces": self.latency.count,
+                "latency": self.latency.snapshot(),
+                "stages": {name: histogram.snapshot()
+                           for name, histogram in self.stages.items()},
+            }
+
+    def reset(self):
+        with self.lock:
+            self.latency = Histogram(self.precision)
+            self.stages.clear()
+
+
+class Slot(object):
+    """
+    Holds the trace that went into a pipe and is waiting for the
+    pipe's next output.
+    """
+    __slots__ = ("trace",)
+
+    def __init__(self):
+        self.trace = None
+
+    def put(self, trace):
+        self.trace = trace
+
+    def take(self):
+        trace, self.trace = self.trace, None
+        return trace
+
+
+class OrderedSlot(object):
+    """
+    A `Slot` for pipes whose outputs can't be matched to their inputs
+    as they happen, assumes outputs follow inputs one to one.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.traces = collections.deque()
+        self.inputs = 0
+        self.outputs = 0
+
+    def put(self, trace):
+        with self.lock:
+            self.traces.append((self.inputs, trace))
+
+    def count_input(self):
+        self.inputs += 1
+
+    def take(self):
+        with self.lock:
+            output = self.outputs
+            self.outputs += 1
+
+            traces = self.traces
+            while traces and traces[0][0] < output:
+                traces.popleft()
+            if traces and traces[0][0] == output:
+                return traces.popleft()[1]
+        return None
+
+
+def traced(pipes, stages, call, tracer, counters=None):
+    """
+    Connects the resolved `stages` of `pipes` like
+    `engine.connect_pipeline`, tracing items with `tracer`. Stages are
+    called as `call(index, stage, previous)`.
+
+    `counters` is a list of `Metrics` for every stage to count its
+    items and time in, like `Pipeline` does with counters.
+    """
+    from . import metrics
+
+    # Pipes inserted for state handling have no pipe variables.
+    executors = [getattr(stage, "executor", None) if getattr(stage, "buffered", False)
+                 else None for stage in stages]
+    slots = [Slot() if executor in (None, "thread") else OrderedSlot()
+             for executor in executors]
+
+    # Buffered pipes are replaced by a copy of the same name when
+    # state has to go around them.
+    names = set(pipe.__name__ for pipe in pipes)
+
+    last = None
+    for index, stage in enumerate(stages):
+        name = stage.__name__ if stage in pipes or stage.__name__ in names else None
+        following = slots[index + 1] if index + 1 < len(stages) else None
+
+        if index == 0:
+            last = sampled(call(index, stage, None), tracer, following)
+        elif executors[index] == "thread":
+            last = untag(call(index, tagging(stage, slots[index]), last),
+                         name, following, tracer)
+        else:
+            if slots[index].__class__ is OrderedSlot:
+                last = counted(last, slots[index])
+            last = boundary(call(index, stage, last), slots[index],
+                            name, following, tracer)
+
+        if counters is not None:
+            last = metrics.metered(last, counters[index], flush=128)
+
+    return last
+
+
+def sampled(iterator, tracer, following):
+    """
+    Starts a trace for every `tracer.interval`th item of `iterator`.
+    """
+    clock, interval = time.perf_counter, tracer.interval
+
+    for index, item in enumerate(iterator):
+        if index % interval == 0:
+            trace = Trace(clock())
+            if following is None:
+                tracer.finish(trace, trace.start)
+            else:
+                following.put(trace)
+        yield item
+
+
+def hand_over(trace, name, following, tracer, now):
+    """
+    Records the time `trace` spent in pipe `name`, and puts it into
+    the `following` slot or finishes it at the end of the pipeline.
+    """
+    if name is not None:
+        trace.stages.append((name, now - trace.entered))
+    trace.entered = now
+
+    if following is None:
+        tracer.finish(trace, now)
+    else:
+        following.put(trace)
+
+
+def boundary(iterator, slot, name, following, tracer):
+    """
+    Moves the trace in `slot` on with the next output of `iterator`.
+    """
+    clock, take = time.perf_counter, slot.take
+
+    for item in iterator:
+        trace = take()
+        if trace is not None:
+            hand_over(trace, name, following, tracer, clock())
+        yield item
+
+
+def counted(iterator, slot):
+    """
+    Counts the inputs of a pipe with an `OrderedSlot`.
+    """
+    for item in iterator:
+        slot.count_input()
+        yield item
+
+
+def tagging(stage, slot):
+    """
+    Returns a copy of the thread buffered `stage` that pairs its
+    outputs with the trace in `slot` in the buffering thread, for
+    `untag` to pick up on the other side.
+    """
+    from . import base, core, util
+
+    if isinstance(stage, core.config):
+        copy = stage.copy()
+        copy.function = tagging(stage.function, slot)
+        base.copy_pipe_variables(stage, copy)
+        copy.__name__ = stage.__name__
+        return copy
+
+    function = stage.__wrapped__
+
+    def tagged(previous, *args, **kwargs):
+        take = slot.take
+        for item in function(previous, *args, **kwargs):
+            yield take(), item
+
+    tagged = util.buffered(stage.buffersize, stage.chunksize, executor=stage.executor,
+                           overload=stage.overload, threshold=stage.threshold,
+                           sample_rate=stage.sample_rate, spool_size=stage.spool_size,
+                           spool_directory=stage.spool_directory)(tagged)
+    base.copy_pipe_variables(stage, tagged)
+    tagged.__name__ = stage.__name__
+    return tagged
+
+
+def untag(iterator, name, following, tracer):
+    """
+    Takes the traces off the items made by `tagging`.
+    """
+    clock = time.perf_counter
+
+    for trace, item in iterator:
+        if trace is not None:
+            hand_over(trace, name, following, tracer, clock())
+        yield item
@@ -0,0 +1,216 @@
+"""
+Codecs used to move items between processes.
+
+A codec turns a batch (list) of items into a list of frames, where
+each frame is a bytes-like object, and turns such a list of frames
+back into a batch. Encoding whole batches at once amortizes the cost
+of serialization over many items.
+
+The codec used for the output of a pipe is declared with `pype.codec`:
+
+    @pype.codec(transport.SharedMemoryCodec())
+    @pype.buffered(10, 100, executor="process")
+    def read_blobs(pipe):
+        ...
+
+Codecs are bound to the pipe they are declared on when the pipeline
+is created, codecs that can't handle the output of the pipe raise
+`PipeError` at that point.
+"""
+import io
+import pickle
+import struct
+
+from .base import PipeError
+
+
+class Codec(object):
+    """
+    Base class of codecs.
+    """
+    def bind(self, pipe):
+        """
+        Returns a codec to use for the output of `pipe`, this can be
+        `self` if the codec doesn't depend on the pipe.
+
+        raises `PipeError` if the codec can't be used for `pipe`.
+        """
+        return self
+
+    def encode(self, items):
+        """
+        Returns a list of bytes-like frames representing `items`.
+        """
+        raise NotImplementedError
+
+    def decode(self, frames):
+        """
+        Returns the list of items represented by `frames`.
+        """
+        raise NotImplementedError
+
+
+class PickleCodec(Codec):
+    """
+    Pickles a batch as a whole. Objects that support out-of-band
+    buffers (see `pickle.PickleBuffer`) are moved as separate frames
+    instead of being copied into the pickle stream.
+    """
+    def __init__(self, protocol=5):
+        super(PickleCodec, self).__init__()
+        self.protocol = protocol
+
+    def encode(self, items):
+        if self.protocol < 5:
+            return [pickle.dumps(items, self.protocol)]
+
+        buffers = []
+        data = pickle.dumps(items, self.protocol, buffer_callback=buffers.append)
+        return [data] + [buffer.raw() for buffer in buffers]
+
+    def decode(self, frames):
+        return pickle.loads(frames[0], buffers=frames[1:])
+
+
+class SharedMemoryCodec(PickleCodec):
+    """
+    Pickles a batch as a whole, but moves any bytes-like object of
+    at least `threshold` bytes through `multiprocessing.shared_memory`
+    instead of the pickle stream.
+
+    The shared memory block is released by the decoding side.
+    """
+    def __init__(self, threshold=64 * 1024, protocol=5):
+        super(SharedMemoryCodec, self).__init__(protocol=protocol)
+        self.threshold = threshold
+
+    def encode(self, items):
+        from multiprocessing import shared_memory
+
+        threshold = self.threshold
+
+        def persistent_id(obj):
+            if not isinstance(obj, (bytes, bytearray, memoryview)):
+                return None
+
+            view = memoryview(obj)
+            if view.nbytes < threshold:
+                return None
+
+            block = shared_memory.SharedMemory(create=True, size=view.nbytes)
+            try:
+                block.buf[:view.nbytes] = view.cast('B')
+            finally:
+                block.close()
+
+            return (block.name, view.nbytes, type(obj).__name__)
+
+        stream = io.BytesIO()
+        pickler = pickle.Pickler(stream, self.protocol)
+        pickler.persistent_id = persistent_id
+        pickler.dump(items)
+
+        return [stream.getbuffer()]
+
+    def decode(self, frames):
+        from multiprocessing import shared_memory
+
+        def persistent_load(pid):
+            name, size, kind = pid
+
+            block = shared_memory.SharedMemory(name=name)
+            try:
+                data = bytes(block.buf[:size])
+            finally:
+                block.close()
+                block.unlink()
+
+            if kind == 'bytes':
+                return data
+            elif kind == 'memoryview':
+                return memoryview(data)
+            return bytearray(data)
+
+        unpickler = pickle.Unpickler(io.BytesIO(frames[0]))
+        unpickler.persistent_load = persistent_load
+        return unpickler.load()
+
+
+# Struct format characters for types a `StructCodec` can derive from
+# an `output_type`.
+struct_formats = {
+    int: 'q',
+    float: 'd',
+    bool: '?',
+}
+
+
+class StructCodec(Codec):
+    """
+    Packs items into a fixed size binary layout with `struct`.
+
+    `format` is a struct format of a single item. If omitted it is
+    derived from the `output_type` of the pipe the codec is declared
+    on, which can be one of `int`, `float`, `bool`, a tuple of those
+    or any object with a `struct_format` attribute.
+
+    Items are single values if the format has one field, and tuples
+    otherwise. If `record` is given items are decoded with
+    `record._make`, this is done for `Schema` output types.
+    """
+    def __init__(self, format=None, record=None):
+        super(StructCodec, self).__init__()
+        self.format = format
+        self.record = record
+
+        if format is not None:
+            self.struct = struct.Struct('<' + format.lstrip('<>=!@'))
+            self.single = len(self.struct.unpack(bytes(self.struct.size))) == 1
+
+    def bind(self, pipe):
+        if self.format is not None:
+            return self
+
+        output_type = pipe.output_type
+        format = getattr(output_type, 'struct_format', None)
+        record = getattr(output_type, 'record', None)
+
+        if format is None:
+            types = output_type if isinstance(output_type, tuple) else (output_type,)
+            try:
+                format = ''.join(struct_formats[type] for type in types)
+            except (KeyError, TypeError):
+                raise PipeError(
+                    "Can't derive a struct format from output type {!s} of {:s}",
+                    output_type, pipe.__name__)
+
+        return type(self)(format, record)
+
+    def encode(self, items):
+        if self.format is None:
+            raise PipeError("StructCodec used without a format or binding")
+
+        pack_into, size = self.struct.pack_into, self.struct.size
+        buffer = bytearray(size * len(items))
+
+        if self.single:
+            for offset, item in zip(range(0, len(buffer), size), items):
+                pack_into(buffer, offset, item)
+        else:
+            for offset, item in zip(range(0, len(buffer), size), items):
+                pack_into(buffer, offset, *item)
+
+        return [buffer]
+
+    def decode(self, frames):
+        unpacked = self.struct.iter_unpack(frames[0])
+
+        if self.record is not None:
+            return list(map(self.record._make, unpacked))
+        if self.single:
+            return [item for item, in unpacked]
+        return list(unpacked)
+
+
+# Codec used when a pipe did not declare any.
+default_codec = PickleCodec()
@@ -1,80 +1,96 @@
-from __future__ import absolute_import
-import functools
-import threading
-try:
-    import queue
-except ImportError:
-    import Queue as queue
-
 from . import base
 
 
-def buffered(buffersize, chunksize):
+def buffered(buffersize, chunksize, executor="thread", overload="block",
+             threshold=0.5, sample_rate=0.5, spool_size=2 ** 28, spool_directory=None):
     """
     Buffers the output of the decorated generator.
 
-    This is done with a new thread that executes the generator.
+    This is done by running the generator in the background with an
+    executor, by default a new thread.
 
     :param buffersize: The maximum amount of chunks in the queue used between threads
     :param chunksize: The size of chunks used to move between threads
+    :param executor: The name of the executor to use, see `pype.executors`.
+                     "thread", "process" for a forked process or
+                     "interpreter" for a subinterpreter.
+    :param overload: What to do when the consumer falls behind and the queue is
+                     full, only supported by the "thread" executor:
+                        "block": wait for the consumer (default)
+                        "drop-oldest": drop the oldest chunk in the queue
+                        "drop-newest": drop the chunk that doesn't fit
+                        "sample": like "block", but once the queue holds
+                                  `threshold` * `buffersize` chunks only keep
+                                  a random `sample_rate` of the items.
+                        "spill": keep `buffersize` chunks in memory and
+                                 write the rest to a temporary file in
+                                 `spool_directory`, up to `spool_size` bytes,
+                                 see `executors.SpillQueue`.
 
     To get the total amount of 'yields' that can be put in the buffer you can multiply
     `buffersize` and `chunksize`. It is suggested to fiddle around with the sizes in
     tests to determine the best size to use.
-    """
-    def buffered(function, *args, **kwargs):
-        @functools.wraps(function)
-        def buffered(*args, **kwargs):
-            queue_buffer = queue.Queue(maxsize=buffersize)
-
-            # Create ourself a sentinal to use as StopIteration indicator.
-            exit = object()
-
-            def threaded_generator(function, *args, **kwargs):
-                # Preallocating is slightly faster than resizing
-                chunk = [exit] * chunksize
-                index = 0
-
-                for x in function(*args, **kwargs):
-                    chunk[index] = x
-
-                    index += 1
-
-                    if index >= chunksize:
-                        queue_buffer.put(chunk[:])
-                        index = 0
-
-                queue_buffer.put(chunk[:index])
-                queue_buffer.put(exit)
 
-            run(threaded_generator, function, *args, **kwargs)
+    The amount of items dropped is counted as "shed" in the `metrics` of the pipe,
+    chunks written to disk as "spilled". Every call of the pipe gets new `metrics`,
+    `Pipeline.snapshot` reports those of its own call.
+    """
+    import functools
+    from . import executors, metrics
 
-            cont = True
-            while True:
-                chunk = queue_buffer.get()
+    start = executors.get(executor)
 
-                # The method to detect the sentinal below is faster
-                # than putting an 'if' statement in the for loop
-                # below.
-                if chunk is exit:
-                    break
+    if overload not in executors.overload_policies:
+        raise base.ConfigurationError("Unknown overload policy {!r}", overload)
+    if overload != "block" and executor != "thread":
+        raise base.ConfigurationError("Overload policy {!r} requires the thread executor",
+                                      overload)
 
-                for x in chunk:
-                    yield x
+    def buffered(function, *args, **kwargs):
+        @functools.wraps(function)
+        def buffered(*args, **kwargs):
+            # Every call gets its own metrics, `buffered.metrics` are
+            # those of the latest call.
+            run_metrics = buffered.metrics = metrics.Metrics()
+            metrics.created(run_metrics)
+            return start(executors.Run(buffered, run_metrics), function, args, kwargs)
 
-        buffered.buffered = True
         base.copy_pipe_variables(function, buffered)
+        buffered.buffered   = True
+        buffered.buffersize = buffersize
+        buffered.chunksize  = chunksize
+        buffered.executor   = executor
+        buffered.overload   = overload
+        buffered.threshold  = threshold
+        buffered.sample_rate = sample_rate
+        buffered.spool_size = spool_size
+        buffered.spool_directory = spool_directory
+        buffered.metrics    = metrics.Metrics()
 
         return buffered
     return buffered
 
 
 def run(function, *args, **kwargs):
+    import threading
+
     thread = threading.Thread(target=function, args=args, kwargs=kwargs)
     thread.daemon = True
     thread.start()
 
 
+def key_hash(key):
+    """
+    Returns a 64 bit hash of `key` that is the same in every process,
+    keys that pickle the same hash the same.
+    """
+    import hashlib
+    import pickle
+
+    digest = hashlib.blake2b(pickle.dumps(key, 4), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
 def call(*args, **kwargs):
     """
     Calls the decorated function or class with the arguments given and
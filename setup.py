@@ -13,8 +13,8 @@ setup(
       description=("A lunatics pipeline"),
       license='GPL',
       install_requires=[
-          "future",
       ],
+      python_requires=">=3.8",
       dependency_links = [
       ],
       entry_points={
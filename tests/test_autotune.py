@@ -0,0 +1,145 @@
+import json
+import os
+import time
+
+import pype
+from pype import autotune, sources
+
+import pytest
+
+
+@pype.output("number", int)
+def numbers(pipe):
+    for number in range(100):
+        yield number
+
+
+@pype.io("number", int)
+def slow(pipe):
+    for number in pipe:
+        time.sleep(0.001)
+        yield number
+
+
+@pype.per_item
+@pype.io("number", int)
+def compute(pipe):
+    for number in pipe:
+        total = 0
+        for i in range(20000):
+            total += i
+        yield number + total
+
+
+@pype.io("number", int)
+def cheap(pipe):
+    for number in pipe:
+        yield number
+
+
+def test_tune_buffers_waiting_pipe_on_thread():
+    tuning = autotune.tune(numbers, slow, cheap)
+
+    assert set(tuning.stages) == {"slow"}
+    assert tuning.stages["slow"]["executor"] == "thread"
+    assert tuning.measurements["slow"]["items"] == 100
+    assert tuning.measurements["slow"]["waiting"] > 0.5
+    assert tuning.workers is None
+
+
+def test_tune_buffers_computing_per_item_pipe_on_process():
+    tuning = autotune.tune(numbers, compute, cheap)
+
+    assert tuning.stages["compute"]["executor"] == "process"
+    assert 1 <= tuning.stages["compute"]["chunksize"] <= 4096
+
+
+def test_tune_config():
+    received = []
+
+    @pype.config()
+    @pype.io("number", int)
+    def scaled(pipe, sample, factor=1):
+        received.append((sample, factor))
+        for number in pipe:
+            yield number * factor * sample
+
+    tuning = autotune.tune(numbers, scaled, sample=10, config={"sample": 2, "factor": 3})
+
+    assert tuning.measurements["scaled"]["items"] == 10
+    assert received == [(2, 3)]
+
+
+def test_tune_takes_sample():
+    tuning = autotune.tune(numbers, slow, sample=10)
+
+    assert tuning.measurements["numbers"]["items"] == 10
+    assert tuning.measurements["slow"]["items"] == 10
+
+
+def test_tune_recommends_workers_for_splittable_source():
+    source = sources.source(lambda count: list(range(count)), lambda split: range(50),
+                            "number", int)
+
+    tuning = autotune.tune(source, slow)
+
+    measured = tuning.measurements.values()
+    total = sum(stage["cost"] * stage["items"] for stage in measured)
+    computing = sum(stage["cost"] * stage["items"] * (1 - stage["waiting"])
+                    for stage in measured)
+
+    assert tuning.executor == "thread"
+    assert tuning.workers == min(int(round(total / computing)), autotune.MAX_WORKERS)
+    # Sleeping a millisecond per item takes far more than the computing.
+    assert tuning.workers > 10
+
+
+def test_tune_recommends_process_workers_for_computing_source():
+    source = sources.source(lambda count: list(range(count)), lambda split: range(50),
+                            "number", int)
+
+    tuning = autotune.tune(source, compute)
+
+    assert tuning.executor == "process"
+    assert tuning.workers == min(os.cpu_count() or 1, autotune.MAX_WORKERS)
+
+
+def test_parallel_workers_limited_by_splits():
+    measured = {"compute": {"items": 100, "cost": 0.01, "waiting": 0.0}}
+
+    executor, workers = autotune.parallel_workers(measured, 1.0, 0.5, splits=1)
+
+    assert (executor, workers) == ("process", 1)
+
+
+def test_tuning_saves_and_loads_with_config():
+    tuning = autotune.tune(numbers, slow, cheap)
+
+    config = json.loads(json.dumps(tuning.save({"count": 3})))
+    loaded = autotune.Tuning.load(config)
+
+    assert config["count"] == 3
+    assert loaded.stages == tuning.stages
+    assert autotune.Tuning.load({}) is None
+    assert "slow" in loaded.explain()
+
+
+def test_pipeline_applies_tuning_from_config():
+    @pype.config()
+    @pype.io("number", int)
+    def scaled(pipe, factor=1):
+        for number in pipe:
+            yield number * factor
+
+    tuning = autotune.Tuning({
+        "slow": {"buffersize": 4, "chunksize": 8, "executor": "thread"},
+        "scaled": {"buffersize": 4, "chunksize": 8, "executor": "thread"},
+    })
+
+    p = pype.pipeline(numbers, slow, scaled, **tuning.save({"factor": 2}))
+    stages = {stage["name"]: stage for stage in p.describe()}
+
+    assert list(p) == [number * 2 for number in range(100)]
+    assert stages["slow"]["buffered"]["chunksize"] == 8
+    assert stages["scaled"]["buffered"]["buffersize"] == 4
+    assert not getattr(slow, "buffered", False)
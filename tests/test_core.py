@@ -1,5 +1,3 @@
-from __future__ import absolute_import
-
 import pype
 
 import pytest
@@ -120,3 +118,100 @@ def test_consume_simple():
     pype.core.consume(append_to_res())
 
     assert res == list(range(10))
+
+
+@pype.output("number", int)
+def numbers(pipe):
+    for n in range(6):
+        yield n
+
+
+def test_map_filter_flat_map():
+    @pype.io("number", int)
+    @pype.map
+    def double(n):
+        return n * 2
+
+    @pype.io("number", int)
+    @pype.filter
+    def small(n):
+        return n < 6
+
+    @pype.io("number", int)
+    @pype.flat_map
+    def twice(n):
+        return (n, n)
+
+    assert double.per_item and double.__name__ == "double"
+    assert list(pype.pipeline(numbers, double, small, twice)) == [0, 0, 2, 2, 4, 4]
+
+
+def test_map_with_config():
+    @pype.config()
+    @pype.io("number", int)
+    @pype.map
+    def scale(n, factor):
+        return n * factor
+
+    assert [name for name, _ in scale.possible_arguments] == ["factor"]
+    assert list(pype.pipeline(numbers, scale, factor=3)) == [0, 3, 6, 9, 12, 15]
+
+
+def test_map_with_state():
+    @pype.io("number", int)
+    @pype.state
+    @pype.map
+    def remember(state, n):
+        return state.mutate(original=n), n * 10
+
+    @pype.io("number", int)
+    @pype.state
+    @pype.filter
+    def even(state, n):
+        return state.original % 2 == 0
+
+    @pype.io("number", int)
+    @pype.state
+    def check(pipe):
+        for state, n in pipe:
+            yield state.original, n
+
+    result = list(pype.pipeline(numbers, remember, even, check))
+
+    assert result == [(0, 0), (2, 20), (4, 40)]
+
+
+def test_map_with_state_and_config():
+    @pype.config()
+    @pype.io("number", int)
+    @pype.state
+    @pype.map
+    def scale(state, n, factor):
+        return state.mutate(original=n), n * factor
+
+    @pype.io("number", int)
+    @pype.state
+    def check(pipe):
+        for state, n in pipe:
+            yield state.original, n
+
+    assert [name for name, _ in scale.possible_arguments] == ["factor"]
+    assert list(pype.pipeline(numbers, scale, check, factor=3))[:3] == [(0, 0), (1, 3), (2, 6)]
+
+
+def test_star_import_keeps_builtins():
+    namespace = {}
+    exec("from pype import *", namespace)
+
+    assert "map" not in namespace and "filter" not in namespace
+    assert "flat_map" in namespace
+
+
+def test_map_buffered():
+    @pype.io("number", int)
+    @pype.buffered(4, 2)
+    @pype.map
+    def negate(n):
+        return -n
+
+    assert list(pype.pipeline(numbers, negate)) == [0, -1, -2, -3, -4, -5]
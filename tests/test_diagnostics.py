@@ -0,0 +1,68 @@
+import pype
+from pype import diagnostics
+
+
+@pype.output("number", int)
+def numbers(pipe):
+    for n in range(2000):
+        yield n
+
+
+@pype.io("number", int)
+def passthrough(pipe):
+    for n in pipe:
+        yield n
+
+
+def leaky_pipe():
+    seen = []
+
+    @pype.io("number", int)
+    def leaky(pipe):
+        for n in pipe:
+            seen.append(str(n) * 10)
+            yield n
+
+    return leaky
+
+
+@pype.io("number", int)
+@pype.state
+def stated(pipe):
+    for state, n in pipe:
+        yield state.mutate(n=n), n
+
+
+def test_leaking_stage_is_flagged():
+    profiler = diagnostics.MemoryProfiler(interval=200)
+
+    report = profiler.run(numbers, leaky_pipe(), passthrough)
+
+    assert report.items == 2000
+    assert report.leaking == ["leaky"]
+
+    stages = {stage["name"]: stage for stage in report.stages}
+    assert stages["leaky"]["retained"] > 2000 * 10
+    assert stages["passthrough"]["retained"] < 2000
+
+
+def test_report_roundtrip_and_compare():
+    profiler = diagnostics.MemoryProfiler(interval=400)
+
+    old = profiler.run(numbers, passthrough)
+    new = diagnostics.MemoryReport.from_json(
+        profiler.run(numbers, passthrough).to_json())
+
+    differences = diagnostics.compare(old, new)
+
+    assert [difference["name"] for difference in differences] == ["numbers", "passthrough"]
+
+
+def test_inserted_stages_and_state_objects():
+    report = diagnostics.MemoryProfiler(interval=400).run(numbers, stated, passthrough)
+
+    names = [(stage["name"], stage["inserted"]) for stage in report.stages]
+
+    assert ("_create_state", True) in names
+    assert ("stated", False) in names
+    assert len(report.state_objects) == 6
@@ -0,0 +1,95 @@
+import random
+import time
+
+import pype
+from pype import distinct
+
+
+@pype.output("number", int)
+def repeating(pipe):
+    rng = random.Random(7)
+    for _ in range(20000):
+        yield rng.randrange(1000)
+
+
+def test_dedup_exact():
+    dedup = pype.dedup()
+
+    result = list(pype.pipeline(repeating, dedup))
+
+    assert sorted(result) == sorted(set(repeating(None)))
+    assert dedup.metrics.get("duplicates") == 20000 - len(result)
+
+
+def test_dedup_distinguishes_builtin_hash_collisions():
+    @pype.output("number", int)
+    def colliding(pipe):
+        # hash(-1) == hash(-2) and hash(0) == hash(2 ** 61 - 1).
+        for n in [-1, -2, 0, 2 ** 61 - 1, 5, -2]:
+            yield n
+
+    assert list(pype.pipeline(colliding, pype.dedup())) == [-1, -2, 0, 2 ** 61 - 1, 5]
+
+
+def test_hash_window_keeps_hashes_in_arrays():
+    window = distinct.HashWindow(8)
+
+    assert not window.add(distinct.hash64("a"))
+    assert window.add(distinct.hash64("a"))
+    assert not window.add(distinct.hash64("b"))
+    assert window.ring.typecode == "Q"
+    assert not hasattr(window, "keys")
+
+
+def test_dedup_window():
+    @pype.output("number", int)
+    def cycle(pipe):
+        for _ in range(3):
+            for n in range(10):
+                yield n
+
+    assert list(pype.pipeline(cycle, pype.dedup(window=10))) == list(range(10))
+    assert len(list(pype.pipeline(cycle, pype.dedup(window=9)))) == 30
+
+
+def test_hash_window_removal():
+    window = distinct.HashWindow(64)
+    rng = random.Random(1)
+    hashes = [rng.getrandbits(64) for _ in range(1000)]
+
+    for index, h in enumerate(hashes):
+        assert not window.add(h)
+        recent = hashes[max(0, index - 63):index + 1]
+        assert all(window.add(r) for r in recent[-8:])
+
+    assert len(window) == 64
+
+
+def test_dedup_ttl():
+    window = distinct.HashWindow(100, ttl=0.05)
+
+    assert not window.add(1)
+    assert window.add(1)
+    time.sleep(0.1)
+    assert not window.add(1)
+
+
+def test_bloom_dedup():
+    dedup = distinct.bloom_dedup(key=lambda n: n, capacity=2000, error_rate=0.01)
+
+    result = list(pype.pipeline(repeating, dedup))
+
+    assert len(set(result)) == len(result)
+    assert len(result) >= 0.97 * len(set(repeating(None)))
+
+
+def test_count_distinct():
+    counter = distinct.count_distinct(precision=12)
+
+    assert len(list(pype.pipeline(repeating, counter))) == 20000
+    assert abs(counter.metrics.get("distinct") - 1000) < 60
+
+    large = distinct.HyperLogLog(12)
+    for n in range(100000):
+        large.add(distinct.hash64(n))
+    assert abs(large.count() - 100000) < 5000
@@ -1,6 +1,4 @@
-from __future__ import absolute_import, division
-
-from pype import core, base, engine
+from pype import core, base, engine, util
 
 import pytest
 
@@ -58,4 +56,101 @@ def test_invalid_pipeline(invalid_pipeline):
 
 
 def test_simple_state_pipeline(state_pipeline):
-    assert consume_with_counter(engine.pipeline(*state_pipeline)) == 3921225
\ No newline at end of file
+    assert consume_with_counter(engine.pipeline(*state_pipeline)) == 3921225
+
+def test_buffered_pipe_keeps_state_aligned():
+    @core.output("integer", type=int)
+    def numbers(pipe):
+        for n in range(1000):
+            yield n
+
+    @core.io("integer", type=int)
+    @core.state
+    def remember(pipe):
+        for state, n in pipe:
+            yield core.State(n=n), n
+
+    @core.io("integer", type=int)
+    @util.buffered(2, 10)
+    def double(pipe):
+        for n in pipe:
+            yield n * 2
+
+    @core.io("integer", type=int)
+    @core.state
+    def check(pipe):
+        for state, n in pipe:
+            yield state, state.n * 2 == n
+
+    result = list(engine.pipeline(numbers, remember, double, check))
+
+    assert len(result) == 1000
+    assert all(aligned for state, aligned in result)
+
+
+def test_pipeline_object(state_pipeline):
+    p = engine.Pipeline(state_pipeline, counters=True)
+
+    assert len(p.stages) > len(state_pipeline)
+    inserted = [stage["name"] for stage in p.describe() if stage["inserted"]]
+    assert inserted == ["_create_state", "remove_state", "add_state", "remove_state"]
+
+    next(p)
+    assert consume_with_counter(p) == 3921224
+
+    snapshot = p.snapshot()
+    assert snapshot["stages"][-1]["counters"]["items"] == 3921225
+    assert snapshot["stages"][2]["pass_state"]
+
+
+def test_pipeline_describes_buffered_and_config():
+    @core.output("integer", type=int)
+    def numbers(pipe):
+        yield 1
+
+    @core.config()
+    @core.io("integer", type=int)
+    def scale(pipe, factor):
+        for n in pipe:
+            yield n * factor
+
+    @core.io("integer", type=int)
+    @util.buffered(2, 10)
+    def double(pipe):
+        for n in pipe:
+            yield n * 2
+
+    p = engine.pipeline(numbers, scale, double, factor=2)
+    numbers_description, scale_description, double_description = p.describe()
+
+    assert numbers_description["output_type"] == "int"
+    assert scale_description["config"] == ["factor"]
+    assert double_description["buffered"]["buffersize"] == 2
+    assert list(p) == [4]
+    assert "queued" in p.snapshot()["stages"][2]["metrics"]
+
+
+def test_buffered_metrics_per_pipeline():
+    import time
+
+    @core.output("integer", type=int)
+    def numbers(pipe):
+        for n in range(1000):
+            yield n
+
+    @core.io("integer", type=int)
+    @util.buffered(2, 10, overload="drop-newest")
+    def passing(pipe):
+        for n in pipe:
+            yield n
+
+    first = engine.pipeline(numbers, passing)
+    second = engine.pipeline(numbers, passing)
+
+    next(first)
+    time.sleep(0.2)
+    list(first)
+
+    assert first.snapshot()["stages"][1]["metrics"]["shed"] > 0
+    # Never started, so nothing shed and no queue yet.
+    assert second.snapshot()["stages"][1]["metrics"] == {}
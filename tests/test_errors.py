@@ -0,0 +1,144 @@
+import time
+
+import pype
+from pype import errors
+
+import pytest
+
+
+@pype.output("number", int)
+def numbers(pipe):
+    for n in range(10):
+        yield n
+
+
+def test_dead_letters():
+    dead = errors.DeadLetters()
+
+    @errors.policy(dead_letter=dead)
+    @pype.io("number", int)
+    def no_threes(pipe):
+        for n in pipe:
+            if n % 3 == 0:
+                raise ValueError(n)
+            yield n
+
+    result = list(pype.pipeline(numbers, no_threes))
+
+    assert result == [1, 2, 4, 5, 7, 8]
+    assert dead.items() == [0, 3, 6, 9]
+    assert all(isinstance(error, ValueError) for _, _, error in dead)
+    assert no_threes.metrics.get("errors") == 4
+
+
+def test_retries():
+    attempts = []
+
+    @errors.policy(retries=2, backoff=0.001)
+    @pype.io("number", int)
+    def flaky(pipe):
+        for n in pipe:
+            attempts.append(n)
+            if attempts.count(n) < 3:
+                raise IOError("try again")
+            yield n
+
+    assert list(pype.pipeline(numbers, flaky)) == list(range(10))
+    assert flaky.metrics.get("retries") == 20
+
+
+def test_retries_stop_at_total_backoff():
+    dead = errors.DeadLetters()
+
+    @errors.policy(retries=10, backoff=0.01, max_total_backoff=0.05, dead_letter=dead)
+    @pype.io("number", int)
+    def failing(pipe):
+        for n in pipe:
+            raise IOError(n)
+            yield n
+
+    assert list(pype.pipeline(numbers, failing)) == []
+    # Waits of 0.01, 0.02 fit, the next one of 0.04 would not.
+    assert failing.metrics.get("retries") == 20
+    assert len(dead) == 10
+
+
+def test_config_reads_policy_pipe_arguments():
+    dead = errors.DeadLetters()
+
+    @pype.config()
+    @errors.policy(dead_letter=dead)
+    @pype.io("number", int)
+    def add(pipe, amount):
+        for n in pipe:
+            yield n + amount
+
+    assert list(pype.pipeline(numbers, add, amount=100)) == list(range(100, 110))
+    assert len(dead) == 0
+
+
+def test_no_dead_letter_raises():
+    @errors.policy(retries=1, backoff=0.001)
+    @pype.io("number", int)
+    def failing(pipe):
+        for n in pipe:
+            raise KeyError(n)
+            yield n
+
+    with pytest.raises(KeyError):
+        list(pype.pipeline(numbers, failing))
+
+
+def test_timeout():
+    dead = errors.DeadLetters()
+
+    @errors.policy(timeout=0.1, dead_letter=dead)
+    @pype.io("number", int)
+    def slow_five(pipe):
+        for n in pipe:
+            if n == 5:
+                time.sleep(1)
+            yield n
+
+    result = list(pype.pipeline(numbers, slow_five))
+
+    assert result == [0, 1, 2, 3, 4, 6, 7, 8, 9]
+    (state, item, error), = dead
+    assert item == 5
+    assert isinstance(error, pype.ItemTimeout)
+    assert slow_five.metrics.get("timeouts") == 1
+
+
+def test_dead_letter_keeps_state(tmpdir):
+    dead = errors.DeadLetterFile(str(tmpdir.join("dead")))
+
+    @pype.io("number", int)
+    @pype.state
+    def remember(pipe):
+        for state, n in pipe:
+            yield state.mutate(original=n), n
+
+    @pype.state
+    @errors.policy(dead_letter=dead)
+    @pype.io("number", int)
+    def failing(pipe):
+        for state, n in pipe:
+            if n == 4:
+                raise ValueError(n)
+            yield state, n
+
+    result = list(pype.pipeline(numbers, remember, failing))
+
+    assert len(result) == 9
+    (state, item, error), = list(dead)
+    assert item == 4 and state.original == 4
+
+
+def test_buffered_error_is_raised():
+    @pype.buffered(2, 2)
+    def failing(pipe):
+        yield 1
+        raise ValueError("failure")
+
+    with pytest.raises(ValueError):
+        list(failing(None))
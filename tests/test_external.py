@@ -0,0 +1,52 @@
+import random
+
+import pype
+from pype import external
+
+
+@pype.output("word", str)
+def words(pipe):
+    rng = random.Random(42)
+    for n in range(5000):
+        yield "{:d}-{:d}".format(rng.randrange(100), n)
+
+
+def test_sort_spills():
+    expected = sorted(words(None))
+    sort = pype.sort(memory_limit=20000)
+
+    assert list(pype.pipeline(words, sort)) == expected
+    assert sort.metrics.get("spills") > 1
+    assert sort.metrics.get("spilled_items") < 5000
+    assert sort.metrics.get("spilled_bytes") > 0
+
+
+def test_sort_key_is_stable():
+    by_prefix = lambda word: int(word.split("-")[0])
+    expected = sorted(words(None), key=by_prefix, reverse=True)
+
+    result = list(pype.pipeline(words, pype.sort(key=by_prefix, reverse=True,
+                                                 memory_limit=20000)))
+
+    assert result == expected
+
+
+def test_sort_in_memory():
+    sort = pype.sort()
+
+    assert list(pype.pipeline(words, sort)) == sorted(words(None))
+    assert sort.metrics.get("spills") == 0
+
+
+def test_group_by(tmpdir):
+    by_prefix = lambda word: int(word.split("-")[0])
+    group_by = external.group_by(by_prefix, memory_limit=20000, directory=str(tmpdir))
+
+    groups = list(pype.pipeline(words, group_by))
+
+    assert [key for key, _ in groups] == sorted({by_prefix(w) for w in words(None)})
+    for key, items in groups:
+        assert items == [w for w in words(None) if by_prefix(w) == key]
+    assert group_by.metrics.get("spills") > 1
+    # Spilled runs leave no files behind.
+    assert tmpdir.listdir() == []
@@ -0,0 +1,68 @@
+import os
+import subprocess
+import sys
+
+
+# Budget for the cumulative time of `import pype` in microseconds. This
+# is far above what the import takes, to keep slow test machines from
+# failing while still catching heavy modules sneaking back in.
+IMPORT_TIME_BUDGET = 50000
+
+# Modules that `import pype` should not need to import.
+LAZY_MODULES = ('threading', 'queue', 'inspect', 'functools', 'collections')
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_python(*args):
+    return subprocess.run([sys.executable] + list(args), cwd=ROOT, check=True,
+                          stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                          universal_newlines=True)
+
+
+def import_times():
+    """
+    Returns a dictionary of module name to cumulative import time
+    in microseconds for `import pype`.
+    """
+    result = run_python('-X', 'importtime', '-c', 'import pype')
+
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+
+        _, cumulative, name = line[len('import time:'):].split('|')
+        try:
+            times[name.strip()] = int(cumulative)
+        except ValueError:
+            # The header line.
+            pass
+
+    return times
+
+
+def test_import_time():
+    # First run to make sure byte compilation is not measured.
+    import_times()
+
+    assert import_times()['pype'] < IMPORT_TIME_BUDGET
+
+
+def test_import_is_lazy():
+    result = run_python('-c', 'import sys, pype; print(" ".join(sys.modules))')
+
+    imported = set(result.stdout.split())
+    for module in LAZY_MODULES:
+        assert module not in imported
+
+
+def test_lazy_attributes():
+    import pype
+
+    assert pype.buffered is pype.util.buffered
+    assert pype.incremental.Cache
+
+    import pytest
+    with pytest.raises(AttributeError):
+        pype.does_not_exist
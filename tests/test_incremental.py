@@ -0,0 +1,144 @@
+import pype
+from pype import incremental
+
+import pytest
+
+
+@pytest.fixture
+def calls():
+    return []
+
+
+@pytest.fixture
+def doubler(calls):
+    @pype.io("number")
+    @pype.deterministic
+    @pype.per_item
+    def doubler(pipe):
+        for n in pipe:
+            calls.append(n)
+            yield n * 2
+    return doubler
+
+
+def source_of(items):
+    @pype.output("number")
+    def source(pipe):
+        for item in items:
+            yield item
+    return source
+
+
+def test_cacheable(doubler):
+    assert incremental.cacheable(doubler)
+    assert not incremental.cacheable(pype.deterministic(source_of([])))
+    assert not incremental.cacheable(pype.per_item(source_of([])))
+
+
+def test_rerun_only_changed_items(doubler, calls):
+    cache = incremental.Cache()
+
+    first = list(incremental.pipeline(cache, source_of([1, 2, 3]), doubler))
+    assert first == [2, 4, 6]
+    assert calls == [1, 2, 3]
+
+    del calls[:]
+    second = list(incremental.pipeline(cache, source_of([1, 5, 3]), doubler))
+
+    assert second == [2, 10, 6]
+    assert calls == [5]
+    assert cache.hits == 2
+
+
+def test_config_invalidates(calls):
+    @pype.config()
+    @pype.io("number")
+    @pype.deterministic
+    @pype.per_item
+    def multiplier(pipe, factor=2):
+        for n in pipe:
+            calls.append(n)
+            yield n * factor
+
+    cache = incremental.Cache()
+
+    list(incremental.pipeline(cache, source_of([1, 2]), multiplier))
+    del calls[:]
+
+    result = list(incremental.pipeline(cache, source_of([1, 2]), multiplier,
+                                       factor=3))
+
+    assert result == [3, 6]
+    assert calls == [1, 2]
+
+
+def test_state_is_fingerprinted(calls):
+    @pype.io("number")
+    @pype.state
+    @pype.deterministic
+    @pype.per_item
+    def stater(pipe):
+        for state, n in pipe:
+            calls.append(n)
+            yield state.mutate(seen=n), n
+
+    cache = incremental.Cache()
+
+    for _ in range(2):
+        result = list(incremental.pipeline(cache, source_of([1, 2]), stater))
+
+    assert [data for state, data in result] == [1, 2]
+    assert [state.seen for state, data in result] == [1, 2]
+    assert calls == [1, 2]
+
+
+def test_comprehension_in_pipe(calls):
+    @pype.io("number")
+    @pype.deterministic
+    @pype.per_item
+    def comprehender(pipe):
+        for x in pipe:
+            calls.append(x)
+            for y in [y * 2 for y in [x]]:
+                yield y
+
+    cache = incremental.Cache()
+
+    for _ in range(2):
+        result = list(incremental.pipeline(cache, source_of([1, 2]), comprehender))
+
+    assert result == [2, 4]
+    assert calls == [1, 2]
+
+
+def test_fingerprint_ignores_order():
+    assert (incremental.fingerprint({"a": 1, "b": {"x", "y", "z"}}) ==
+            incremental.fingerprint({"b": {"z", "y", "x"}, "a": 1}))
+    assert incremental.fingerprint({1, 2}) != incremental.fingerprint(frozenset([1, 2]))
+    assert incremental.fingerprint([1, 2]) != incremental.fingerprint([2, 1])
+
+
+def test_prune(doubler):
+    cache = incremental.Cache()
+    list(incremental.pipeline(cache, source_of([1, 2, 3]), doubler))
+
+    cache = incremental.Cache(cache.mapping)
+    list(incremental.pipeline(cache, source_of([1]), doubler))
+    cache.prune()
+
+    assert len(cache) == 1
+
+
+def test_persisted_cache(doubler, calls, tmpdir):
+    filename = str(tmpdir.join("cache"))
+
+    cache = incremental.Cache.open(filename)
+    list(incremental.pipeline(cache, source_of([1, 2]), doubler))
+    cache.close()
+
+    del calls[:]
+    cache = incremental.Cache.open(filename)
+    assert list(incremental.pipeline(cache, source_of([1, 2]), doubler)) == [2, 4]
+    cache.close()
+
+    assert calls == []
@@ -0,0 +1,98 @@
+import pype
+from pype import joins, schema
+
+import pytest
+
+
+event = schema.Schema("event", [("user_id", int), ("action", str)])
+user = schema.Schema("user", [("user_id", int), ("name", str)])
+enriched = schema.Schema("enriched", [("user_id", int), ("action", str), ("name", str)])
+
+users = [user.record(n, "user{:d}".format(n)) for n in range(0, 100, 2)]
+
+
+@pype.output("events", event)
+def events(pipe):
+    for n in range(20):
+        yield event.record(n, "click")
+
+
+@pytest.fixture(params=["memory", "disk"])
+def index(request, tmpdir):
+    pairs = ((u.user_id, u) for u in users)
+    if request.param == "memory":
+        return joins.MemoryIndex(pairs, key_type=int, row_type=user)
+    return joins.DiskIndex.build(str(tmpdir.join("users.idx")), pairs,
+                                 key_type=int, row_type=user)
+
+
+def test_hash_join(index):
+    join = joins.hash_join(index, "user_id", batch_size=3, output_type=enriched)
+
+    result = list(pype.pipeline(events, join))
+
+    assert [(r.user_id, r.action, r.name) for r in result] == [
+        (n, "click", "user{:d}".format(n)) for n in range(0, 20, 2)]
+
+
+def test_hash_join_left(index):
+    join = joins.hash_join(index, lambda e: e.user_id, how="left")
+
+    result = list(pype.pipeline(events, join))
+
+    assert len(result) == 20
+    assert result[1] == (event.record(1, "click"), None)
+    assert result[2][1] == users[1]
+
+
+def test_hash_join_verifies_key(index):
+    with pytest.raises(pype.PipeError):
+        pype.pipeline(events, joins.hash_join(index, "id"))
+
+    strings = joins.MemoryIndex([], key_type=str)
+    with pytest.raises(pype.PipeError):
+        pype.pipeline(events, joins.hash_join(strings, "user_id"))
+
+    needs_email = schema.Schema("needs_email", [("name", str), ("email", str)])
+    with pytest.raises(pype.PipeError):
+        pype.pipeline(events, joins.hash_join(index, "user_id", output_type=needs_email))
+
+
+def test_disk_index_pickles(tmpdir):
+    import pickle
+
+    index = joins.DiskIndex.build(str(tmpdir.join("idx")), [("a", 1), ("a", 2), ("b", 3)])
+    copy = pickle.loads(pickle.dumps(index))
+
+    assert copy.get_many(["a", "c", "b"]) == [[1, 2], (), [3]]
+
+
+def test_disk_index_bisects_mapped_column(tmpdir):
+    pairs = [("key{:d}".format(n), n) for n in range(5000)]
+    index = joins.DiskIndex.build(str(tmpdir.join("large")), pairs)
+
+    assert isinstance(index.column, memoryview)
+    assert list(index.column) == sorted(index.column)
+    assert index.get_many(["key17", "key4999", "missing"]) == [[17], [4999], ()]
+
+    index.close()
+
+
+def test_merge_join():
+    others = [user.record(n // 2, "u{:d}".format(n)) for n in range(0, 30)]
+
+    join = joins.merge_join(others, "user_id")
+    result = [(e.user_id, u.name) for e, u in pype.pipeline(events, join)]
+
+    assert result == [(n // 2, "u{:d}".format(n)) for n in range(0, 30)]
+
+
+def test_merge_join_left_and_unsorted():
+    others = [user.record(n, "u") for n in (3, 5)]
+
+    result = list(pype.pipeline(events, joins.merge_join(others, "user_id", how="left")))
+    assert [u is not None for _, u in result] == [n in (3, 5) for n in range(20)]
+
+    unsorted = [user.record(n, "u") for n in (5, 3)]
+    with pytest.raises(pype.PipeError):
+        list(pype.pipeline(events, joins.merge_join(unsorted, "user_id")))
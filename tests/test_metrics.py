@@ -0,0 +1,26 @@
+from pype import metrics
+
+
+def test_counters():
+    m = metrics.Metrics()
+
+    m.add("items")
+    m.add("items", 10)
+
+    assert m.get("items") == 11
+    assert m.get("missing") == 0
+    assert m.snapshot() == {"items": 11}
+
+    m.reset()
+    assert m.snapshot() == {}
+
+
+def test_gauges():
+    m = metrics.Metrics()
+    values = [1]
+
+    m.gauge("value", lambda: values[0])
+    values[0] = 5
+
+    assert m.get("value") == 5
+    assert m.snapshot() == {"value": 5}
@@ -1,6 +1,4 @@
-from __future__ import unicode_literals
 import pytest
-from future.builtins import str, bytes, isinstance
 
 import pype
 import pype.engine
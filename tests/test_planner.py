@@ -0,0 +1,138 @@
+import time
+
+import pype
+from pype import planner
+
+import pytest
+
+
+@pype.output("number", int)
+def numbers(pipe):
+    for n in range(1000):
+        yield n
+
+
+@planner.annotate(cost=1e-3, pure=True, commutative=True)
+@pype.io("number", int)
+def expensive(pipe):
+    for n in pipe:
+        yield n
+
+
+@planner.annotate(selectivity=0.1, cost=1e-6, pure=True, commutative=True)
+@pype.io("number", int)
+def tenth(pipe):
+    for n in pipe:
+        if n % 10 == 0:
+            yield n
+
+
+@planner.annotate(pure=True, commutative=True)
+@pype.io("number", int)
+@pype.state
+def first_state(pipe):
+    for state, n in pipe:
+        yield state.mutate(first=n), n
+
+
+@planner.annotate(pure=True, commutative=True)
+@pype.io("number", int)
+def plain(pipe):
+    for n in pipe:
+        yield n
+
+
+@planner.annotate(pure=True, commutative=True)
+@pype.io("number", int)
+@pype.state
+def second_state(pipe):
+    for state, n in pipe:
+        yield state.mutate(second=n), n
+
+
+def names(pipes):
+    return [pipe.__name__ for pipe in pipes]
+
+
+def test_filter_moved_before_expensive_map():
+    p = planner.plan([numbers, expensive, tenth])
+
+    assert names(p.pipes) == ["numbers", "tenth", "expensive"]
+    assert list(p.pipeline()) == list(range(0, 1000, 10))
+    assert p.notes
+
+
+def test_plan_pipeline_is_pipeline():
+    p = planner.plan([numbers, expensive, tenth])
+
+    pipeline = p.pipeline()
+
+    assert isinstance(pipeline, pype.Pipeline)
+    assert names(pipeline.pipes) == ["numbers", "tenth", "expensive"]
+    assert next(pipeline) == 0
+    pipeline.close()
+
+
+def test_plan_pipeline_config():
+    @pype.config()
+    @pype.io("number", int)
+    def scale(pipe, factor):
+        for n in pipe:
+            yield n * factor
+
+    p = planner.plan([numbers, scale])
+
+    assert list(p.pipeline(factor=3))[:3] == [0, 3, 6]
+
+
+def test_state_pipes_grouped():
+    p = planner.plan([numbers, first_state, plain, second_state])
+
+    assert names(p.stages) == ["numbers", "plain", "_create_state",
+                               "first_state", "second_state"]
+
+    explain = p.explain()
+    assert "state handling stages: 1 (was 3)" in explain
+
+
+def test_unannotated_pipes_keep_order():
+    @pype.io("number", int)
+    def other(pipe):
+        return pipe
+
+    p = planner.plan([numbers, expensive, other, tenth])
+
+    assert names(p.pipes) == ["numbers", "expensive", "other", "tenth"]
+    assert not p.notes
+
+
+def test_measured_annotations():
+    @planner.annotate(pure=True, commutative=True)
+    @pype.io("number", int)
+    def slow(pipe):
+        for n in pipe:
+            time.sleep(1e-4)
+            yield n
+
+    @planner.annotate(pure=True, commutative=True)
+    @pype.io("number", int)
+    def half(pipe):
+        for n in pipe:
+            if n % 2:
+                yield n
+
+    measured = planner.profile(numbers, slow, half)
+
+    assert measured["half"].selectivity == pytest.approx(0.5)
+    assert measured["slow"].selectivity == 1.0
+    assert measured["slow"].cost > measured["half"].cost
+
+    p = planner.plan([numbers, slow, half], measured)
+    assert names(p.pipes) == ["numbers", "half", "slow"]
+
+
+def test_explain_lists_stages():
+    explain = planner.plan([numbers, expensive, tenth]).explain()
+
+    for name in ("numbers", "expensive", "tenth"):
+        assert name in explain
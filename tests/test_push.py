@@ -0,0 +1,103 @@
+import pype
+from pype import push
+
+import pytest
+
+
+@pype.io("number", int)
+@pype.per_item
+def double(pipe):
+    for n in pipe:
+        yield n * 2
+
+
+@pype.io("number", int)
+@pype.per_item
+def odd(pipe):
+    for n in pipe:
+        if n % 2:
+            yield n
+
+
+@pype.config()
+@pype.io("number", int)
+@pype.per_item
+def add(pipe, amount=1):
+    for n in pipe:
+        yield n + amount
+
+
+@pype.io("number", int)
+@pype.state
+@pype.per_item
+def remember(pipe):
+    for state, n in pipe:
+        yield state.mutate(original=n), n
+
+
+@pype.io("number", int)
+@pype.state
+@pype.per_item
+def restore(pipe):
+    for state, n in pipe:
+        yield state, (state.original, n)
+
+
+def test_push():
+    plan = push.pipeline(odd, double)
+
+    assert plan.push(1) == [2]
+    assert plan.push(2) == []
+    assert plan.push_many([1, 2, 3]) == [2, 6]
+
+
+def test_push_config():
+    plan = push.pipeline(add, double, amount=10)
+
+    assert plan.push(1) == [22]
+
+
+def test_push_state():
+    plan = push.pipeline(remember, add, double, restore)
+
+    result = plan.push_many([1, 2])
+
+    assert [data for state, data in result] == [(1, 4), (2, 6)]
+
+
+def test_push_requires_per_item():
+    @pype.io("number", int)
+    def total(pipe):
+        yield sum(pipe)
+
+    with pytest.raises(pype.PipeError):
+        push.pipeline(double, total)
+
+
+def test_push_restarts_pipes():
+    @pype.io("number", int)
+    @pype.per_item
+    def numbered(pipe):
+        # Not per item in spirit, the count starts over on every push.
+        count = 0
+        for n in pipe:
+            count += 1
+            yield count
+
+    plan = push.pipeline(numbered)
+
+    assert plan.push_many([5, 6, 7]) == [1, 2, 3]
+    assert plan.push(8) == [1]
+    assert plan.push(9) == [1]
+
+
+def test_push_rejects_buffered():
+    @pype.io("number", int)
+    @pype.per_item
+    @pype.buffered(2, 2)
+    def buffered(pipe):
+        for n in pipe:
+            yield n
+
+    with pytest.raises(pype.PipeError):
+        push.pipeline(double, buffered)
@@ -0,0 +1,57 @@
+import multiprocessing
+import time
+
+import pype
+from pype import ratelimit
+
+
+@pype.output("number", int)
+def numbers(pipe):
+    for n in range(20):
+        yield n
+
+
+def test_rate_limit():
+    limited = pype.rate_limit(100, burst=10)
+
+    start = time.monotonic()
+    result = list(pype.pipeline(numbers, limited))
+    elapsed = time.monotonic() - start
+
+    assert result == list(range(20))
+    # The first 10 items are a burst, the other 10 are paced.
+    assert 0.08 <= elapsed < 0.5
+    assert limited.metrics.get("throttled") > 0.05
+    assert limited.metrics.get("throttled_items") == 10
+
+
+def test_shared_limiter():
+    limiter = ratelimit.TokenBucket(200, burst=1)
+    first = pype.rate_limit(limiter=limiter)
+    second = pype.rate_limit(limiter=limiter)
+
+    start = time.monotonic()
+    list(pype.pipeline(numbers, first))
+    list(pype.pipeline(numbers, second))
+
+    assert time.monotonic() - start >= 0.19
+
+
+def test_shared_token_bucket_across_processes():
+    limiter = ratelimit.SharedTokenBucket(100, burst=1)
+
+    def take():
+        for _ in range(5):
+            limiter.acquire()
+
+    context = multiprocessing.get_context("fork")
+    processes = [context.Process(target=take) for _ in range(2)]
+
+    start = time.monotonic()
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+    assert time.monotonic() - start >= 0.09
+    assert limiter.reserve() > 0
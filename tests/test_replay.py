@@ -0,0 +1,73 @@
+import time
+
+import pype
+from pype import replay
+
+import pytest
+
+
+@pype.output("number", int)
+def numbers(pipe):
+    for n in range(100):
+        yield n
+
+
+@pype.io("number", int)
+@pype.state
+def tag(pipe):
+    for state, n in pipe:
+        yield state.mutate(tag=n % 3), n
+
+
+@pype.io("number", int)
+def square(pipe):
+    for n in pipe:
+        yield n * n
+
+
+def test_record_and_play(tmpdir):
+    log = str(tmpdir.join("numbers.log"))
+
+    result = list(pype.pipeline(numbers, tag, replay.recorder(log, chunk_size=7), square))
+
+    assert result == [n * n for n in range(100)]
+
+    records = list(replay.read(log))
+    assert [item for _, _, item in records] == list(range(100))
+    assert [state.tag for _, state, _ in records] == [n % 3 for n in range(100)]
+
+    assert list(pype.pipeline(replay.player(log), square)) == result
+
+
+def test_play_original_timing(tmpdir):
+    log = str(tmpdir.join("slow.log"))
+
+    @pype.output("number", int)
+    def slow(pipe):
+        for n in range(3):
+            time.sleep(0.05)
+            yield n
+
+    list(pype.pipeline(slow, replay.recorder(log)))
+
+    start = time.monotonic()
+    assert [n for _, n in pype.pipeline(replay.player(log, speed=1.0))] == [0, 1, 2]
+    assert time.monotonic() - start >= 0.09
+
+
+def test_benchmark(tmpdir):
+    log = str(tmpdir.join("numbers.log"))
+    list(pype.pipeline(numbers, replay.recorder(log)))
+
+    result = replay.benchmark(log, square)
+
+    assert result["items"] == result["produced"] == 100
+    assert result["items_per_sec"] > 0
+
+
+def test_read_rejects_other_files(tmpdir):
+    other = tmpdir.join("other")
+    other.write("not a log")
+
+    with pytest.raises(pype.PipeError):
+        list(replay.read(str(other)))
@@ -0,0 +1,115 @@
+import http.client
+import http.server
+import threading
+
+import pype
+from pype import resources
+
+import pytest
+
+
+@pytest.fixture
+def server():
+    """
+    A local HTTP server that counts the connections made to it.
+    """
+    connections = []
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def setup(self):
+            connections.append(self.client_address)
+            http.server.BaseHTTPRequestHandler.setup(self)
+
+        def do_GET(self):
+            body = self.path.encode("ascii")
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever)
+    thread.daemon = True
+    thread.start()
+
+    httpd.connections = connections
+    yield httpd
+
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def fetcher(server, closed):
+    host, port = server.server_address
+
+    def connect():
+        return http.client.HTTPConnection(host, port)
+
+    def close(connection):
+        closed.append(connection)
+        connection.close()
+
+    @pype.config(resources={"pool": resources.resource(connect, size=1, close=close)})
+    @pype.io("path")
+    def fetch(pipe, pool):
+        for path in pipe:
+            with pool.lease() as connection:
+                connection.request("GET", path)
+                yield connection.getresponse().read().decode("ascii")
+
+    return fetch
+
+
+@pype.output("path")
+def paths(pipe):
+    for n in range(10):
+        yield "/{:d}".format(n)
+
+
+def test_resource_shared_between_pipelines(server):
+    closed = []
+    fetch = fetcher(server, closed)
+
+    with resources.Scope():
+        first = list(pype.pipeline(paths, fetch))
+        second = list(pype.pipeline(paths, fetch))
+
+        assert closed == []
+
+    assert first == second == ["/{:d}".format(n) for n in range(10)]
+    assert len(server.connections) == 1
+    assert len(closed) == 1
+
+
+def test_resource_can_be_configured():
+    class Fake(object):
+        def lease(self):
+            raise AssertionError("configured value should be used")
+
+    @pype.config(resources={"pool": resources.resource(Fake)})
+    @pype.io("path")
+    def uses(pipe, pool):
+        yield pool
+
+    fake = Fake()
+    assert list(pype.pipeline(paths, uses, pool=fake)) == [fake]
+
+
+def test_pool_limits_and_close():
+    created = []
+    pool = resources.Pool(lambda: created.append(1) or len(created), size=2)
+
+    first, second = pool.acquire(), pool.acquire()
+    pool.release(first)
+
+    assert pool.acquire() == first
+    assert len(created) == 2
+
+    pool.close()
+    with pytest.raises(pype.PipeError):
+        pool.acquire()
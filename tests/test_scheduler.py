@@ -0,0 +1,120 @@
+import threading
+import time
+
+import pype
+from pype import scheduler
+
+import pytest
+
+
+@pype.config()
+@pype.output("number", int)
+def numbers(pipe, count=100):
+    for n in range(count):
+        yield n
+
+
+@pype.config()
+@pype.io("number", int)
+def busy(pipe, delay=0.0005):
+    for n in pipe:
+        end = time.perf_counter() + delay
+        while time.perf_counter() < end:
+            pass
+        yield n
+
+
+def test_config_keeps_option_names():
+    @pype.config()
+    @pype.output("label", str)
+    def labels(pipe, name, sink="stdout"):
+        yield name
+        yield sink
+
+    with scheduler.Scheduler(workers=1) as s:
+        task = s.submit(labels, name="task", config={"name": "a", "sink": "db"})
+
+    assert task.name == "task"
+    assert task.result(timeout=5) == ["a", "db"]
+
+
+def test_many_pipelines_few_threads():
+    before = threading.active_count()
+
+    with scheduler.Scheduler(workers=2, slice_items=8) as s:
+        tasks = [s.submit(numbers, name="tenant{:d}".format(n)) for n in range(200)]
+
+        for task in tasks:
+            assert task.result(timeout=10) == list(range(100))
+
+        assert threading.active_count() <= before + 2
+
+    assert all(task.status == "done" for task in tasks)
+    assert tasks[0].metrics.get("items") == 100
+
+
+def test_weights_share_run_time():
+    with scheduler.Scheduler(workers=1, slice_items=4, slice_time=None) as s:
+        light = s.submit(numbers, busy, weight=1.0, config={"count": 10000})
+        heavy = s.submit(numbers, busy, weight=3.0, config={"count": 10000})
+
+        time.sleep(0.5)
+        light_items, heavy_items = light.items, heavy.items
+        snapshot = s.snapshot()
+
+        light.cancel()
+        heavy.cancel()
+
+    assert 2.0 < heavy_items / light_items < 4.5
+    assert snapshot["fairness"] > 0.9
+    assert snapshot["tasks"][light.name]["slices"] > 0
+    assert light.status == heavy.status == "cancelled"
+
+
+def test_priority_runs_first():
+    order = []
+
+    with scheduler.Scheduler(workers=1, slice_items=1000) as s:
+        gate = threading.Event()
+
+        @pype.output("number", int)
+        def wait(pipe):
+            gate.wait()
+            yield 0
+
+        s.submit(wait)
+        low = s.submit(numbers, sink=lambda n: order.append("low"), priority=0,
+                       config={"count": 1})
+        high = s.submit(numbers, sink=lambda n: order.append("high"), priority=5,
+                        config={"count": 1})
+        gate.set()
+
+        low.result(timeout=5)
+        high.result(timeout=5)
+
+    assert order == ["high", "low"]
+
+
+def test_quota_and_errors():
+    @pype.output("number", int)
+    def failing(pipe):
+        yield 1
+        raise ValueError("failure")
+
+    with scheduler.Scheduler(workers=2, slice_items=7) as s:
+        limited = s.submit(numbers, quota_items=20)
+        failed = s.submit(failing)
+
+        assert limited.result(timeout=5) == list(range(20))
+        assert limited.status == "quota"
+
+        with pytest.raises(ValueError):
+            failed.result(timeout=5)
+        assert failed.status == "failed"
+
+
+def test_round_robin():
+    with scheduler.Scheduler(workers=1, slice_items=10, policy="round-robin") as s:
+        tasks = [s.submit(numbers) for _ in range(5)]
+
+    assert [task.result() for task in tasks] == [list(range(100))] * 5
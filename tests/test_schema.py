@@ -0,0 +1,87 @@
+import pickle
+
+import pype
+from pype import engine, schema, transport
+
+import pytest
+
+
+point = schema.Schema("point", [("x", float), ("y", float)])
+labeled = schema.Schema("labeled", [("x", float), ("y", float), ("label", str)])
+
+
+def test_record():
+    p = point.record(1.0, y=2.0)
+
+    assert (p.x, p.y) == (1.0, 2.0)
+    assert tuple(p) == (1.0, 2.0)
+    assert p == point.record._make([1.0, 2.0])
+    assert not hasattr(p, "__dict__")
+
+    with pytest.raises(TypeError):
+        point.record(1.0)
+
+
+def test_record_pickle():
+    p = labeled.record(1.0, 2.0, "a")
+
+    assert pickle.loads(pickle.dumps(p)) == p
+
+
+def test_accepts():
+    assert point.accepts(labeled)
+    assert not labeled.accepts(point)
+    assert schema.Schema("any", [("x", pype.generic)]).accepts(point)
+    assert not schema.Schema("ints", [("x", int)]).accepts(point)
+    assert schema.Schema("ints", [("x", int)]).accepts(schema.Schema("bools", [("x", bool)]))
+
+
+def test_pipeline_verifies_schemas():
+    @pype.output("points", labeled)
+    def source(pipe):
+        yield labeled.record(1.0, 2.0, "a")
+
+    @pype.input("points", point)
+    def xs(pipe):
+        for p in pipe:
+            yield p.x
+
+    @pype.input("points", labeled)
+    def labels(pipe):
+        for p in pipe:
+            yield p.label
+
+    @pype.output("points", point)
+    def points(pipe):
+        yield point.record(1.0, 2.0)
+
+    assert list(engine.pipeline(source, xs)) == [1.0]
+
+    with pytest.raises(pype.PipeError):
+        engine.pipeline(points, labels)
+
+
+def test_columns():
+    records = [labeled.record(float(n), n * 2.0, str(n)) for n in range(5)]
+
+    columns = labeled.columns(records)
+
+    assert len(columns) == 5
+    assert columns.column("x").typecode == "d"
+    assert columns.column("label") == ["0", "1", "2", "3", "4"]
+    assert list(columns) == records
+    assert columns[3] == records[3]
+    assert pickle.loads(pickle.dumps(columns))[4] == records[4]
+
+
+def test_struct_codec_with_schema():
+    flagged = schema.Schema("flagged", [("n", int), ("flag", bool)])
+
+    @pype.output("flagged", flagged)
+    def source(pipe):
+        yield flagged.record(1, True)
+
+    codec = transport.StructCodec().bind(source)
+    records = [flagged.record(n, n % 2 == 0) for n in range(3)]
+
+    assert codec.decode(codec.encode(records)) == records
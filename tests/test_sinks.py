@@ -0,0 +1,114 @@
+import sqlite3
+import time
+
+import pype
+from pype import sinks
+
+import pytest
+
+
+@pype.output("row")
+def rows(pipe):
+    for n in range(2500):
+        yield n, str(n)
+
+
+def test_batched_sink():
+    written = []
+    commits = []
+
+    sink = sinks.batched_sink(written.append, batch_size=1000,
+                              commit=lambda: commits.append(len(written)))
+
+    committed = list(pype.pipeline(rows, sink))
+
+    assert committed == [1000, 1000, 500]
+    assert [len(batch) for batch in written] == [1000, 1000, 500]
+    assert commits == [1, 2, 3]
+    assert sink.metrics.get("items") == 2500
+
+
+def test_batched_sink_flush_interval():
+    written = []
+
+    @pype.output("row")
+    def slow_rows(pipe):
+        yield 1
+        time.sleep(0.3)
+        yield 2
+
+    sink = sinks.batched_sink(written.append, batch_size=100, flush_interval=0.05)
+
+    assert list(pype.pipeline(slow_rows, sink)) == [1, 1]
+    assert written == [[1], [2]]
+
+
+def test_batched_sink_error():
+    rolled_back = []
+    closed = []
+
+    def write_many(batch):
+        raise IOError("disk full")
+
+    sink = sinks.batched_sink(write_many, batch_size=10,
+                              rollback=lambda: rolled_back.append(True),
+                              close=lambda: closed.append(True))
+
+    with pytest.raises(IOError):
+        list(pype.pipeline(rows, sink))
+
+    assert rolled_back == [True]
+    assert closed == [True]
+
+
+def test_batched_sink_input_error_discards_pending():
+    written = []
+    rolled_back = []
+
+    @pype.output("row")
+    def failing_rows(pipe):
+        for n in range(15):
+            yield n
+        raise ValueError("bad row")
+
+    sink = sinks.batched_sink(written.append, batch_size=10,
+                              rollback=lambda: rolled_back.append(True))
+
+    with pytest.raises(ValueError):
+        list(pype.pipeline(failing_rows, sink))
+
+    # The first full batch may have been written, the partial one not.
+    assert all(len(batch) == 10 for batch in written)
+    assert rolled_back == [True]
+
+
+def test_batched_sink_closed_discards_pending():
+    written = []
+    rolled_back = []
+
+    sink = sinks.batched_sink(written.append, batch_size=1000,
+                              rollback=lambda: rolled_back.append(True))
+
+    p = pype.pipeline(rows, sink)
+    assert next(p) == 1000
+    p.close()
+
+    assert sum(len(batch) for batch in written) < 2500
+    assert all(len(batch) == 1000 for batch in written)
+    assert rolled_back == [True]
+
+
+def test_sqlite_sink(tmpdir):
+    database = str(tmpdir.join("test.db"))
+
+    connection = sqlite3.connect(database)
+    connection.execute("CREATE TABLE numbers (n INTEGER, name TEXT)")
+    connection.commit()
+
+    sink = sinks.sqlite_sink(database, "numbers", ["n", "name"], batch_size=1000)
+
+    assert sum(pype.pipeline(rows, sink)) == 2500
+
+    count, total = connection.execute("SELECT COUNT(*), SUM(n) FROM numbers").fetchone()
+    assert count == 2500
+    assert total == sum(range(2500))
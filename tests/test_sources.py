@@ -0,0 +1,94 @@
+import pype
+from pype import sources
+
+import pytest
+
+
+@pytest.fixture
+def files(tmpdir):
+    names = []
+    for index, count in enumerate((1000, 0, 257)):
+        f = tmpdir.join("part{:d}.txt".format(index))
+        f.write("".join("{:d}-{:d} {:s}\n".format(index, n, "x" * (n % 13))
+                        for n in range(count)))
+        names.append(str(f))
+    return names
+
+
+def expected_lines(files):
+    lines = []
+    for filename in files:
+        with open(filename) as f:
+            lines.extend(line.rstrip("\n") for line in f)
+    return lines
+
+
+@pype.io("line", str)
+def prefix(pipe):
+    for line in pipe:
+        yield line.split(" ")[0]
+
+
+@pytest.mark.parametrize("count", [1, 3, 7, 64])
+def test_lines_splits_cover_every_line_once(files, count):
+    log = sources.lines(files)
+
+    splits = log.splits(count)
+    lines = [line for split in splits for line in log.read(split)]
+
+    assert len(splits) >= min(count, 3)
+    assert lines == expected_lines(files)
+
+
+def test_lines_as_normal_source(files):
+    assert list(pype.pipeline(sources.lines(files), prefix)) == \
+        [line.split(" ")[0] for line in expected_lines(files)]
+
+
+@pytest.mark.parametrize("executor", ["thread", "process"])
+def test_parallel_ordered(files, executor):
+    result = list(sources.parallel(sources.lines(files), prefix, workers=4,
+                                   ordered=True, executor=executor, chunksize=16))
+
+    assert result == [line.split(" ")[0] for line in expected_lines(files)]
+
+
+def test_parallel_unordered(files):
+    result = list(pype.parallel(sources.lines(files), prefix, workers=4, chunksize=16))
+
+    assert sorted(result) == sorted(line.split(" ")[0] for line in expected_lines(files))
+
+
+def test_parallel_row_ranges_and_errors():
+    def splits(count):
+        return [(start, start + 10) for start in range(0, 100, 10)]
+
+    def read(split):
+        return iter(range(*split))
+
+    numbers = sources.source(splits, read, "number", int)
+
+    @pype.io("number", int)
+    def check(pipe):
+        for n in pipe:
+            if n == 55:
+                raise ValueError(n)
+            yield n
+
+    assert list(pype.pipeline(numbers)) == list(range(100))
+
+    with pytest.raises(ValueError):
+        list(sources.parallel(numbers, check, workers=3, ordered=True))
+
+
+def test_parallel_config(files):
+    @pype.config()
+    @pype.io("line", str)
+    def tag(pipe, workers, chunksize=0):
+        for line in pipe:
+            yield "{:s}/{:d}/{:d}".format(line.split(" ")[0], workers, chunksize)
+
+    result = list(sources.parallel(sources.lines(files), tag, workers=2, ordered=True,
+                                   config={"workers": 7, "chunksize": 3}))
+
+    assert result == ["{:s}/7/3".format(line.split(" ")[0]) for line in expected_lines(files)]
@@ -0,0 +1,59 @@
+import json
+import socket
+import urllib.request
+
+import pype
+from pype import stats
+
+
+@pype.output("number", int)
+def numbers(pipe):
+    for n in range(10):
+        yield n
+
+
+def test_http_endpoint():
+    registry = stats.Registry()
+    p = pype.Pipeline((numbers,), counters=True)
+    list(p)
+    registry.register("numbers", p)
+
+    server = stats.serve_http(source=registry)
+    try:
+        url = "http://{:s}:{:d}/".format(*server.server_address)
+
+        everything = json.loads(urllib.request.urlopen(url).read())
+        one = json.loads(urllib.request.urlopen(url + "numbers").read())
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert everything["numbers"] == one
+    assert one["stages"][0]["counters"]["items"] == 10
+
+
+def test_unix_endpoint(tmpdir):
+    path = str(tmpdir.join("stats.sock"))
+    server = stats.serve_unix(path, source=lambda: {"ok": True})
+    try:
+        client = socket.socket(socket.AF_UNIX)
+        client.connect(path)
+        data = b""
+        while True:
+            received = client.recv(4096)
+            if not received:
+                break
+            data += received
+        client.close()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert json.loads(data) == {"ok": True}
+
+
+def test_registry_forgets_pipelines():
+    registry = stats.Registry()
+    registry.register("numbers", pype.pipeline(numbers))
+
+    assert registry.snapshot() == {}
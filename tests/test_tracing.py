@@ -0,0 +1,114 @@
+import time
+
+from pype import core, engine, tracing, util
+
+import pytest
+
+
+@core.output("integer", type=int)
+def numbers(pipe):
+    for n in range(200):
+        yield n
+
+
+@core.io("integer", type=int)
+def slow(pipe):
+    for n in pipe:
+        time.sleep(0.001)
+        yield n
+
+
+@core.io("integer", type=int)
+def double(pipe):
+    for n in pipe:
+        yield n * 2
+
+
+@core.io("integer", type=int)
+@core.state
+def remember(pipe):
+    for state, n in pipe:
+        yield core.State(n=n), n
+
+
+@core.io("integer", type=int)
+@core.state
+def check(pipe):
+    for state, n in pipe:
+        yield state, state.n * 2 == n
+
+
+def test_histogram_percentiles():
+    histogram = tracing.Histogram(precision=0.01)
+    for n in range(1, 1001):
+        histogram.add(n / 1000.0)
+
+    snapshot = histogram.snapshot()
+
+    assert snapshot["count"] == 1000
+    assert snapshot["p50"] == pytest.approx(0.5, rel=0.02)
+    assert snapshot["p99"] == pytest.approx(0.99, rel=0.02)
+    assert snapshot["max"] == 1.0
+    assert tracing.Histogram().percentile(50) == 0.0
+
+
+def test_tracer_records_stages_and_latency():
+    traces = []
+    tracer = tracing.Tracer(sample_rate=0.1, export=traces.append)
+
+    p = engine.Pipeline([numbers, slow, double], tracer=tracer)
+    assert list(p) == [n * 2 for n in range(200)]
+
+    snapshot = p.snapshot()["tracing"]
+
+    assert snapshot["traces"] == len(traces) == 20
+    assert list(snapshot["stages"]) == ["slow", "double"]
+    assert snapshot["stages"]["slow"]["p50"] >= 0.0009
+    assert snapshot["latency"]["p50"] >= snapshot["stages"]["slow"]["p50"] * 0.98
+    assert [name for name, _ in traces[0]["stages"]] == ["slow", "double"]
+    assert traces[0]["latency"] >= sum(seconds for _, seconds in traces[0]["stages"])
+
+
+@pytest.mark.parametrize("executor", ["thread", "process"])
+def test_tracing_through_state_and_buffered(executor):
+    @core.io("integer", type=int)
+    @util.buffered(2, 10, executor=executor)
+    def buffered_double(pipe):
+        for n in pipe:
+            yield n * 2
+
+    tracer = tracing.Tracer(sample_rate=0.05)
+    result = list(engine.Pipeline([numbers, remember, buffered_double, check], tracer=tracer))
+
+    assert len(result) == 200
+    assert all(aligned for state, aligned in result)
+
+    snapshot = tracer.snapshot()
+    assert snapshot["traces"] == 10
+    assert list(snapshot["stages"]) == ["remember", "buffered_double", "check"]
+
+
+def test_tracing_with_counters():
+    tracer = tracing.Tracer(sample_rate=0.1)
+
+    p = engine.Pipeline([numbers, slow, double], counters=True, tracer=tracer)
+    core.consume(p)
+
+    snapshot = p.snapshot()
+    assert [stage["counters"]["items"] for stage in snapshot["stages"]] == [200, 200, 200]
+    assert snapshot["stages"][1]["counters"]["time"] >= 0.2
+    assert snapshot["tracing"]["traces"] == 20
+
+
+def test_tracer_sample_rate():
+    with pytest.raises(ValueError):
+        tracing.Tracer(sample_rate=0)
+
+    tracer = tracing.Tracer(sample_rate=1)
+    engine.Pipeline([numbers, double], tracer=tracer).close()
+    core.consume(engine.Pipeline([numbers, double], tracer=tracer))
+
+    assert tracer.snapshot()["traces"] == 200
+
+    tracer.reset()
+    assert tracer.snapshot()["traces"] == 0
@@ -0,0 +1,104 @@
+import pickle
+
+import pype
+from pype import engine, transport
+
+import pytest
+
+
+@pytest.mark.parametrize("codec", [
+    transport.PickleCodec(),
+    transport.PickleCodec(protocol=2),
+    transport.SharedMemoryCodec(threshold=16),
+])
+def test_codec_roundtrip(codec):
+    items = [1, "two", (3.0, None), {"four": [4]}, b"x" * 100, bytearray(b"y" * 100)]
+
+    assert codec.decode(codec.encode(items)) == items
+
+
+def test_pickle_codec_out_of_band():
+    codec = transport.PickleCodec()
+    data = bytearray(b"z" * 1000)
+
+    frames = codec.encode([pickle.PickleBuffer(data)])
+
+    assert len(frames) == 2
+    assert bytes(codec.decode(frames)[0]) == bytes(data)
+
+
+def test_shared_memory_codec_moves_large_items():
+    codec = transport.SharedMemoryCodec(threshold=100)
+    big = b"b" * 1000
+
+    frames = codec.encode([big, b"small"])
+
+    assert len(frames[0]) < len(big)
+    assert codec.decode(frames) == [big, b"small"]
+
+
+def test_struct_codec():
+    codec = transport.StructCodec("qd")
+    items = [(1, 1.5), (2, 2.5)]
+
+    frames = codec.encode(items)
+
+    assert len(frames[0]) == 32
+    assert codec.decode(frames) == items
+
+
+def test_struct_codec_derived_from_output_type():
+    @pype.output("number", int)
+    def numbers(pipe):
+        yield 1
+
+    codec = transport.StructCodec().bind(numbers)
+
+    assert codec.decode(codec.encode([1, 2, 3])) == [1, 2, 3]
+
+
+def test_codec_verified_at_pipeline_creation():
+    @pype.codec(transport.StructCodec())
+    @pype.output("word", str)
+    def words(pipe):
+        yield "word"
+
+    @pype.input("word", str)
+    def reader(pipe):
+        for word in pipe:
+            yield word
+
+    with pytest.raises(pype.PipeError):
+        engine.pipeline(words, reader)
+
+
+def test_process_executor():
+    @pype.codec(transport.StructCodec())
+    @pype.io("number", int)
+    @pype.buffered(4, 10, executor="process")
+    def squares(pipe):
+        for n in pipe:
+            yield n * n
+
+    @pype.output("number", int)
+    def numbers(pipe):
+        return iter(range(100))
+
+    result = list(engine.pipeline(numbers, squares))
+
+    assert result == [n * n for n in range(100)]
+
+
+def test_process_executor_error():
+    @pype.buffered(4, 10, executor="process")
+    def failing(pipe):
+        yield 1
+        raise ValueError("failure")
+
+    with pytest.raises(ValueError):
+        list(failing(None))
+
+
+def test_unknown_executor():
+    with pytest.raises(pype.ConfigurationError):
+        pype.buffered(1, 1, executor="nonexistent")
@@ -1,7 +1,8 @@
-from __future__ import absolute_import
+import queue
+import threading
 import time
 
-from pype import util
+from pype import executors, util
 
 import pytest
 
@@ -46,4 +47,151 @@ def test_error_class():
 
     assert someerr is not othererror
     assert repr(someerr) == "SomeError"
-    assert repr(othererror) == "OtherError"
\ No newline at end of file
+    assert repr(othererror) == "OtherError"
+
+def slow_consume(generator, delay=0.2):
+    """
+    Starts `generator` and waits `delay` seconds before consuming
+    the rest of it, to let the producing side overflow.
+    """
+    res = [next(generator)]
+    time.sleep(delay)
+    res.extend(generator)
+    return res
+
+
+@pytest.mark.parametrize("overload", ["drop-newest", "drop-oldest"])
+def test_buffered_dropping(overload):
+    buffered_range = util.buffered(2, 10, overload=overload)(range)
+
+    res = slow_consume(buffered_range(1000))
+    shed = buffered_range.metrics.get("shed")
+
+    assert shed > 0
+    assert len(res) + shed == 1000
+    assert res == sorted(res)
+
+    if overload == "drop-oldest":
+        assert res[-1] == 999
+    else:
+        assert res[:20] == list(range(20))
+
+
+def test_buffered_sampling():
+    buffered_range = util.buffered(4, 10, overload="sample",
+                                   threshold=0.5, sample_rate=0.1)(range)
+
+    res = slow_consume(buffered_range(10000))
+    shed = buffered_range.metrics.get("shed")
+
+    assert shed > 0
+    assert len(res) + shed == 10000
+
+
+def test_buffered_spilling(tmpdir):
+    produced = threading.Event()
+
+    def numbers(count):
+        for n in range(count):
+            yield n
+        produced.set()
+
+    buffered_numbers = util.buffered(2, 10, overload="spill",
+                                     spool_directory=str(tmpdir))(numbers)
+
+    generator = buffered_numbers(1000)
+    res = [next(generator)]
+    # The producer finishes without waiting for us.
+    assert produced.wait(5)
+    res.extend(generator)
+
+    assert res == list(range(1000))
+    assert buffered_numbers.metrics.get("spilled") > 0
+    assert buffered_numbers.metrics.get("spilled_items") % 10 == 0
+    assert buffered_numbers.metrics.get("spooled") == 0
+
+
+def test_buffered_spilling_limit():
+    queue_buffer = executors.SpillQueue(1, spool_size=1)
+
+    queue_buffer.put([0])
+    queue_buffer.put([1])
+
+    putting = threading.Thread(target=queue_buffer.put, args=([2],))
+    putting.start()
+    putting.join(0.1)
+    # The spool is full until it is read back entirely.
+    assert putting.is_alive()
+
+    assert queue_buffer.get() == [0]
+    putting.join(5)
+    assert [queue_buffer.get(), queue_buffer.get()] == [[1], [2]]
+
+
+def test_buffered_invalid_overload():
+    with pytest.raises(util.base.ConfigurationError):
+        util.buffered(1, 1, overload="unknown")
+
+    with pytest.raises(util.base.ConfigurationError):
+        util.buffered(1, 1, executor="process", overload="drop-newest")
+
+
+def squares(pipe, offset=0):
+    for n in pipe:
+        yield n * n + offset
+
+
+class ThreadInterpreters(object):
+    """
+    Stands in for `concurrent.interpreters`, running calls in threads.
+    """
+    closed = 0
+
+    def create_queue(self, maxsize=0):
+        return queue.Queue(maxsize)
+
+    def create(self):
+        return self
+
+    def call_in_thread(self, function, *args):
+        thread = threading.Thread(target=function, args=args)
+        thread.start()
+        return thread
+
+    def close(self):
+        self.closed += 1
+
+
+def test_buffered_interpreter(monkeypatch):
+    interpreters = ThreadInterpreters()
+    monkeypatch.setattr(executors, "interpreters_module", lambda: interpreters)
+
+    buffered_squares = util.buffered(2, 3, executor="interpreter")(squares)
+
+    assert list(buffered_squares(iter(range(10)), offset=1)) == [n * n + 1 for n in range(10)]
+    assert interpreters.closed == 1
+    assert buffered_squares.metrics.get("thread_fallbacks") == 0
+
+
+def test_buffered_interpreter_error(monkeypatch):
+    monkeypatch.setattr(executors, "interpreters_module", ThreadInterpreters)
+
+    buffered_squares = util.buffered(2, 3, executor="interpreter")(squares)
+
+    with pytest.raises(TypeError):
+        list(buffered_squares(iter(["not a number"])))
+
+
+def test_buffered_interpreter_fallback(monkeypatch):
+    monkeypatch.setattr(executors, "interpreters_module", ThreadInterpreters)
+
+    def local_squares(pipe):
+        for n in pipe:
+            yield n * n
+
+    buffered_squares = util.buffered(2, 3, executor="interpreter")(local_squares)
+
+    assert list(buffered_squares(iter(range(5)))) == [0, 1, 4, 9, 16]
+    assert buffered_squares.metrics.get("thread_fallbacks") == 1
+    assert executors.function_reference(local_squares) is None
+    assert executors.function_reference(squares) is not None